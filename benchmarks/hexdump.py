@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  benchmarks/hexdump.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import argparse
+import functools
+import io
+import os
+import sys
+import time
+
+import boltons.iterutils
+
+get_path = functools.partial(os.path.join, os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(get_path('..', 'lib'))
+
+import protocon.color
+
+def legacy_print_hexdump(data, stream=None):
+	# the hexdump renderer prior to the table driven implementation, kept
+	# here for comparison
+	stream = stream or sys.stdout
+	data = bytearray(data)
+	divider = 8
+	chunk_size = 16
+	for row, chunk in enumerate(boltons.iterutils.chunked(data, chunk_size, fill=-1)):
+		offset_col = "{0:04x}".format(row * chunk_size)
+		ascii_col = ''
+		hex_col = ''
+		pos = 0
+		for pos, byte in enumerate(chunk):
+			hex_col += '   ' if byte == -1 else "{0:02x} ".format(byte)
+			if divider and pos and (pos + 1) % divider == 0:
+				hex_col += ' '
+
+			if byte == -1:
+				ascii_col += ' '
+			elif byte < 32 or byte > 126:
+				ascii_col += '.'
+			else:
+				ascii_col += chr(byte)
+			if divider and pos and (pos + 1) % divider == 0:
+				ascii_col += ' '
+		hex_col = hex_col[:-2 if pos and (pos + 1) % divider == 0 else -1]
+		stream.write('  '.join((offset_col, hex_col, ascii_col)) + os.linesep)
+	stream.flush()
+
+def measure(function, data):
+	stream = io.StringIO()
+	start = time.perf_counter()
+	function(data, stream=stream)
+	return time.perf_counter() - start, stream.getvalue()
+
+def main():
+	parser = argparse.ArgumentParser(description='protocon hexdump benchmark')
+	parser.add_argument('--max-size', type=int, default=0x100000, help='the largest buffer to dump with the legacy renderer')
+	arguments = parser.parse_args()
+
+	print("{0:>12}  {1:>10}  {2:>10}  {3:>8}".format('size', 'legacy', 'current', 'speedup'))
+	for size in (0x400, 0x4000, 0x10000, 0x100000, 0xa00000):
+		data = os.urandom(size)
+		current_time, current_output = measure(protocon.color.print_hexdump, data)
+		if size > arguments.max_size:
+			print("{0:>12,}  {1:>10}  {2:>9.4f}s  {3:>8}".format(size, '-', current_time, '-'))
+			continue
+		legacy_time, legacy_output = measure(legacy_print_hexdump, data)
+		if legacy_output != current_output:
+			raise RuntimeError("the output for {0:,} bytes does not match".format(size))
+		print("{0:>12,}  {1:>9.4f}s  {2:>9.4f}s  {3:>7.1f}x".format(size, legacy_time, current_time, legacy_time / current_time))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  benchmarks/recv_throughput.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import argparse
+import functools
+import os
+import socket
+import sys
+import threading
+import time
+
+import hyperlink
+
+get_path = functools.partial(os.path.join, os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(get_path('..', 'lib'))
+
+import protocon
+
+_inf = float('inf')
+
+def legacy_recv(driver, size, timeout=None):
+	# the byte-at-a-time receive loop that the drivers used prior to the shared
+	# receive engine, kept here for comparison
+	now = time.time()
+	expiration = _inf if timeout is None else time.time() + timeout
+	data = b''
+	while len(data) < size and (driver._select(0) or expiration >= now):
+		if not driver._select(max(expiration - now, 0)):
+			break
+		chunk = driver._connection.recv(1)
+		if not chunk:
+			driver.connected = False
+			break
+		data += chunk
+		now = time.time()
+	return data
+
+def serve(listener, size):
+	payload = os.urandom(0x10000)
+	client, _ = listener.accept()
+	remaining = size
+	while remaining:
+		remaining -= client.send(payload[:remaining])
+	client.close()
+
+def run(plugins, address, size, recv_function):
+	url = "tcp://{0}:{1}".format(*address)
+	driver = plugins.connection_drivers['driver_tcp'](hyperlink.URL.from_text(url))
+	driver.open()
+	start = time.perf_counter()
+	data = recv_function(driver, size)
+	elapsed = time.perf_counter() - start
+	driver.close()
+	if len(data) != size:
+		raise RuntimeError("received {0:,} bytes, expected {1:,}".format(len(data), size))
+	return elapsed
+
+def main():
+	parser = argparse.ArgumentParser(description='protocon receive throughput benchmark')
+	parser.add_argument('--size', type=int, default=0x400000, help='the number of bytes to receive')
+	parser.add_argument('--legacy-size', type=int, default=0x40000, help='the number of bytes to receive with the legacy loop')
+	arguments = parser.parse_args()
+
+	listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	listener.bind(('127.0.0.1', 0))
+	listener.listen(4)
+	address = listener.getsockname()
+	plugins = protocon.PluginManager()
+
+	results = (
+		('legacy', arguments.legacy_size, legacy_recv),
+		('engine', arguments.size, lambda driver, size: driver.recv_size(size)),
+	)
+	for name, size, recv_function in results:
+		thread = threading.Thread(target=serve, args=(listener, size), daemon=True)
+		thread.start()
+		elapsed = run(plugins, address, size, recv_function)
+		print("{0:<8} {1:>12,} bytes in {2:8.4f}s  {3:10.2f} MiB/s".format(name, size, elapsed, (size / elapsed) / 0x100000))
+	listener.close()
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  benchmarks/startup.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import argparse
+import functools
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+get_path = functools.partial(os.path.join, os.path.abspath(os.path.dirname(__file__)))
+
+_CMD2_RUNNER = 'import sys, protocon; protocon.Engine.from_url(\'null:\', quiet=True).entry(sys.argv[1:])'
+
+def run(command, environment, iterations):
+	samples = []
+	for _ in range(iterations):
+		start = time.perf_counter()
+		subprocess.run(command, check=True, env=environment, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+		samples.append(time.perf_counter() - start)
+	return samples
+
+def main():
+	parser = argparse.ArgumentParser(description='protocon start up time benchmark')
+	parser.add_argument('--iterations', type=int, default=10, help='the number of times to run each mode')
+	arguments = parser.parse_args()
+
+	environment = dict(os.environ)
+	environment['PYTHONPATH'] = get_path('..', 'lib')
+	executable = [sys.executable, get_path('..', 'protocon'), '--quiet']
+	with tempfile.NamedTemporaryFile('w', suffix='.txt') as script_file:
+		script_file.write('send "ping"\nexit\n')
+		script_file.flush()
+		modes = (
+			('headless', executable + ['--headless', 'null:', script_file.name]),
+			# the interactive engine exits at the end of the script instead of entering the console
+			('cmd2', [sys.executable, '-c', _CMD2_RUNNER, script_file.name]),
+		)
+		# prime the plugin manifest and the byte code cache before measuring
+		run(modes[0][1], environment, 1)
+		for name, command in modes:
+			samples = run(command, environment, arguments.iterations)
+			print("{0:<10} median {1:8.4f}s  min {2:8.4f}s  max {3:8.4f}s".format(name, statistics.median(samples), min(samples), max(samples)))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  benchmarks/suite.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import argparse
+import collections
+import datetime
+import functools
+import io
+import json
+import os
+import platform
+import shutil
+import socketserver
+import ssl
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import hyperlink
+
+get_path = functools.partial(os.path.join, os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(get_path('..', 'lib'))
+
+import protocon
+import protocon.color
+import protocon.conversion
+import protocon.crc
+
+RESULTS_VERSION = 1
+KiB = 0x400
+MiB = 0x100000
+
+# the examples which finish on their own when run against an echo server,
+# along with the scheme of the server to run them against
+EXAMPLES = (
+	('c1218_get_info.txt', 'tcp'),
+	('cve_2018_0833.txt', 'tcp'),
+	('cyclic_pattern/size_4096.txt', 'tcp'),
+	('dns_query.txt', 'udp'),
+	('gtp_v1_echo.txt', 'udp'),
+	('http_get_robots.txt', 'tcp'),
+	('http_propfind.txt', 'tcp'),
+)
+
+Result = collections.namedtuple('Result', ('value', 'unit', 'better'))
+
+def _rate(size, elapsed):
+	return Result((size / elapsed) / MiB, 'MiB/s', 'higher')
+
+def _seconds(elapsed):
+	return Result(elapsed, 's', 'lower')
+
+def _microseconds(elapsed):
+	return Result(elapsed * 1000000, 'us', 'lower')
+
+def best_of(repeat, function, *args):
+	"""Call *function* *repeat* times and return the shortest elapsed time."""
+	elapsed = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		function(*args)
+		elapsed.append(time.perf_counter() - start)
+	return min(elapsed)
+
+def _recv_exact(sock, size):
+	data = bytearray()
+	while len(data) < size:
+		chunk = sock.recv(min(size - len(data), 0x10000))
+		if not chunk:
+			break
+		data += chunk
+	return bytes(data)
+
+# servers
+class _EchoHandler(socketserver.BaseRequestHandler):
+	def handle(self):
+		while True:
+			try:
+				data = self.request.recv(0x10000)
+			except ConnectionError:
+				break
+			if not data:
+				break
+			self.request.sendall(data)
+
+class _BenchmarkHandler(_EchoHandler):
+	# the first 9 bytes select the mode, E to echo, S to send the specified
+	# number of bytes and D to drain the specified number of bytes and reply
+	# with a single byte once they have been received
+	payload = os.urandom(0x10000)
+	def handle(self):
+		header = _recv_exact(self.request, 9)
+		if len(header) != 9:
+			return
+		mode, size = struct.unpack('!cQ', header)
+		if mode == b'E':
+			super(_BenchmarkHandler, self).handle()
+		elif mode == b'S':
+			view = memoryview(self.payload)
+			while size:
+				size -= self.request.send(view[:min(size, len(view))])
+		elif mode == b'D':
+			while size:
+				chunk = self.request.recv(min(size, 0x10000))
+				if not chunk:
+					return
+				size -= len(chunk)
+			self.request.sendall(b'\x00')
+
+class _UDPEchoHandler(socketserver.BaseRequestHandler):
+	def handle(self):
+		data, sock = self.request
+		sock.sendto(data, self.client_address)
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+	allow_reuse_address = True
+	daemon_threads = True
+
+class _ThreadingSSLServer(_ThreadingTCPServer):
+	def __init__(self, address, handler, context):
+		self.context = context
+		super(_ThreadingSSLServer, self).__init__(address, handler)
+
+	def get_request(self):
+		sock, address = self.socket.accept()
+		return self.context.wrap_socket(sock, server_side=True), address
+
+class _ThreadingUnixServer(socketserver.ThreadingUnixStreamServer):
+	daemon_threads = True
+
+def _serve(server):
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	return server
+
+def _create_ssl_context(directory):
+	# a self-signed certificate is generated with the openssl command
+	if shutil.which('openssl') is None:
+		return None
+	cert_path = os.path.join(directory, 'cert.pem')
+	key_path = os.path.join(directory, 'key.pem')
+	subprocess.run(
+		('openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost', '-keyout', key_path, '-out', cert_path),
+		check=True,
+		stdout=subprocess.DEVNULL,
+		stderr=subprocess.DEVNULL
+	)
+	context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+	context.load_cert_chain(cert_path, key_path)
+	return context
+
+class Servers(object):
+	"""The local loopback servers that the drivers are benchmarked against."""
+	def __init__(self, directory):
+		self.directory = directory
+		self.servers = []
+		self.urls = collections.OrderedDict()
+		self.echo_urls = {}
+
+		server = self._start(_ThreadingTCPServer(('127.0.0.1', 0), _BenchmarkHandler))
+		self.urls['tcp'] = "tcp://127.0.0.1:{0}".format(server.server_address[1])
+		server = self._start(socketserver.ThreadingUDPServer(('127.0.0.1', 0), _UDPEchoHandler))
+		self.urls['udp'] = "udp://127.0.0.1:{0}".format(server.server_address[1])
+		self.echo_urls['udp'] = self.urls['udp']
+		unix_path = os.path.join(directory, 'benchmark.sock')
+		self._start(_ThreadingUnixServer(unix_path, _BenchmarkHandler))
+		self.urls['unix'] = 'unix://' + unix_path
+		context = _create_ssl_context(directory)
+		if context is None:
+			print('[!] openssl was not found, skipping the ssl benchmarks', file=sys.stderr)
+		else:
+			server = self._start(_ThreadingSSLServer(('127.0.0.1', 0), _BenchmarkHandler, context))
+			self.urls['ssl'] = "ssl://127.0.0.1:{0}".format(server.server_address[1])
+		server = self._start(_ThreadingTCPServer(('127.0.0.1', 0), _EchoHandler))
+		self.echo_urls['tcp'] = "tcp://127.0.0.1:{0}".format(server.server_address[1])
+
+	def _start(self, server):
+		self.servers.append(_serve(server))
+		return server
+
+	def close(self):
+		for server in self.servers:
+			server.shutdown()
+			server.server_close()
+
+# benchmarks
+def _open_driver(plugins, url, mode=None, size=0):
+	url = hyperlink.URL.from_text(url)
+	driver = plugins.get_connection_driver(url.scheme)(url)
+	driver.open()
+	if mode is not None:
+		driver.send(struct.pack('!cQ', mode, size))
+	return driver
+
+def bench_stream_driver(plugins, scheme, url, repeat, size, round_trips):
+	results = collections.OrderedDict()
+	driver = _open_driver(plugins, url, b'E')
+	payload = os.urandom(64)
+	latencies = []
+	for _ in range(round_trips):
+		start = time.perf_counter()
+		driver.send(payload)
+		if len(driver.recv_size(len(payload), timeout=5)) != len(payload):
+			raise RuntimeError('the echo server did not respond')
+		latencies.append(time.perf_counter() - start)
+	driver.close()
+	latencies.sort()
+	results['driver/{0}/latency-p50'.format(scheme)] = _microseconds(statistics.median(latencies))
+	results['driver/{0}/latency-p99'.format(scheme)] = _microseconds(latencies[int(len(latencies) * 0.99) - 1])
+
+	def recv():
+		driver = _open_driver(plugins, url, b'S', size)
+		data = driver.recv_size(size, timeout=30)
+		driver.close()
+		if len(data) != size:
+			raise RuntimeError("received {0:,} bytes, expected {1:,}".format(len(data), size))
+	results['driver/{0}/recv'.format(scheme)] = _rate(size, best_of(repeat, recv))
+
+	data = os.urandom(size)
+	def send():
+		driver = _open_driver(plugins, url, b'D', size)
+		driver.send(data)
+		if driver.recv_size(1, timeout=30) != b'\x00':
+			raise RuntimeError('the drain server did not acknowledge the data')
+		driver.close()
+	results['driver/{0}/send'.format(scheme)] = _rate(size, best_of(repeat, send))
+	return results
+
+def bench_udp_driver(plugins, url, repeat, round_trips, datagrams):
+	results = collections.OrderedDict()
+	driver = _open_driver(plugins, url)
+	payload = os.urandom(64)
+	latencies = []
+	for _ in range(round_trips):
+		start = time.perf_counter()
+		driver.send(payload)
+		if len(driver.recv_size(len(payload), timeout=5)) != len(payload):
+			raise RuntimeError('the echo server did not respond')
+		latencies.append(time.perf_counter() - start)
+	latencies.sort()
+	results['driver/udp/latency-p50'] = _microseconds(statistics.median(latencies))
+	results['driver/udp/latency-p99'] = _microseconds(latencies[int(len(latencies) * 0.99) - 1])
+
+	# datagrams are exchanged in windows so the socket buffers do not overflow
+	window = 32
+	messages = [os.urandom(1024)] * window
+	def exchange():
+		received = 0
+		for _ in range(datagrams // window):
+			driver.send_batch(messages)
+			received += len(driver.recv_count(window, timeout=1))
+		return received
+	elapsed = best_of(repeat, exchange)
+	driver.close()
+	results['driver/udp/exchange'] = _rate((datagrams // window) * window * 1024, elapsed)
+	return results
+
+def bench_null_engine(plugins, repeat, commands):
+	results = collections.OrderedDict()
+	with open(os.devnull, 'w') as devnull:
+		engine = protocon.HeadlessEngine.from_url('null:', plugins=plugins, quiet=True, colors=False, stdout=devnull)
+		engine.print_tx = False
+		def onecmd():
+			for _ in range(commands):
+				engine.onecmd('send "ping"')
+		results['driver/null/command'] = _microseconds(best_of(repeat, onecmd) / commands)
+		with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as file_h:
+			file_h.write('send "ping"\n' * commands)
+		try:
+			results['driver/null/script-command'] = _microseconds(best_of(repeat, engine.run_script, file_h.name) / commands)
+		finally:
+			os.unlink(file_h.name)
+	return results
+
+def bench_conversion(repeat, size):
+	results = collections.OrderedDict()
+	data = os.urandom(size)
+	for encoding, string in (('hex', data.hex()), ('base64', __import__('base64').b64encode(data).decode('ascii')), ('utf-8', data.decode('latin-1'))):
+		results['conversion/decode/' + encoding] = _rate(size, best_of(repeat, protocon.conversion.decode, string, encoding))
+	string = 'GET /${path} HTTP/1.1\\r\\nHost: ${host}\\r\\n\\x41\\t' * (size // 48)
+	variables = {'host': 'localhost', 'path': 'index.html'}
+	results['conversion/expand'] = _rate(len(string), best_of(repeat, protocon.conversion.expand, string, variables, 'utf-8'))
+	return results
+
+def bench_hexdump(repeat):
+	results = collections.OrderedDict()
+	for label, size in (('1KiB', KiB), ('64KiB', 64 * KiB), ('1MiB', MiB), ('10MiB', 10 * MiB)):
+		data = os.urandom(size)
+		results['hexdump/' + label] = _rate(size, best_of(repeat, lambda: protocon.color.print_hexdump(data, stream=io.StringIO())))
+	return results
+
+def bench_crc(plugins, repeat, size):
+	results = collections.OrderedDict()
+	data = os.urandom(size)
+	with open(os.devnull, 'w') as devnull:
+		engine = protocon.HeadlessEngine.from_url('null:', plugins=plugins, quiet=True, colors=False, stdout=devnull)
+		for algorithm in protocon.crc.algorithm_names():
+			engine.crc_algorithm = algorithm
+			results['crc/' + algorithm] = _rate(size, best_of(repeat, engine._crc_string, data))
+	return results
+
+def bench_examples(plugins, servers, repeat):
+	results = collections.OrderedDict()
+	with tempfile.TemporaryDirectory() as directory, open(os.devnull, 'w') as devnull:
+		cwd = os.getcwd()
+		# examples like http_get_robots.txt write files to the working directory
+		os.chdir(directory)
+		try:
+			for example, scheme in EXAMPLES:
+				path = get_path('..', 'examples', example)
+				if not os.path.isfile(path):
+					continue
+				def run():
+					engine = protocon.HeadlessEngine.from_url(servers.echo_urls[scheme], plugins=plugins, quiet=True, colors=False, stdout=devnull)
+					engine.entry((path,))
+					if engine.connection.connected:
+						engine.connection.close()
+				results['example/' + os.path.splitext(example)[0]] = _seconds(best_of(repeat, run))
+		finally:
+			os.chdir(cwd)
+	return results
+
+def run_benchmarks(arguments):
+	plugins = protocon.PluginManager()
+	results = collections.OrderedDict()
+	filters = arguments.filter or ()
+	selected = lambda group: not filters or any(name in group or name.startswith(group) for name in filters)
+	# the banners printed by from_url are not part of the results
+	with tempfile.TemporaryDirectory() as directory, _quiet_status():
+		servers = Servers(directory)
+		try:
+			for scheme, url in servers.urls.items():
+				if not selected('driver/' + scheme):
+					continue
+				if scheme == 'udp':
+					results.update(bench_udp_driver(plugins, url, arguments.repeat, arguments.round_trips, 4096))
+				else:
+					results.update(bench_stream_driver(plugins, scheme, url, arguments.repeat, arguments.size, arguments.round_trips))
+			if selected('driver/null'):
+				results.update(bench_null_engine(plugins, arguments.repeat, 10000))
+			if selected('conversion'):
+				results.update(bench_conversion(arguments.repeat, MiB))
+			if selected('hexdump'):
+				results.update(bench_hexdump(arguments.repeat))
+			if selected('crc'):
+				results.update(bench_crc(plugins, arguments.repeat, 256 * KiB))
+			if selected('example') and not arguments.skip_examples:
+				results.update(bench_examples(plugins, servers, 1))
+		finally:
+			servers.close()
+	if filters:
+		results = collections.OrderedDict((name, result) for name, result in results.items() if any(name_filter in name for name_filter in filters))
+	return results
+
+class _quiet_status(object):
+	def __enter__(self):
+		self._print_status = protocon.color.print_status
+		protocon.color.print_status = lambda *args, **kwargs: None
+
+	def __exit__(self, *args):
+		protocon.color.print_status = self._print_status
+
+# results
+def _git_commit():
+	try:
+		process = subprocess.run(('git', 'rev-parse', 'HEAD'), cwd=get_path('..'), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+	except (OSError, subprocess.CalledProcessError):
+		return None
+	return process.stdout.decode('utf-8').strip()
+
+def to_document(results):
+	return {
+		'version': RESULTS_VERSION,
+		'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+		'commit': _git_commit(),
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'results': collections.OrderedDict(
+			(name, {'value': result.value, 'unit': result.unit, 'better': result.better}) for name, result in results.items()
+		),
+	}
+
+def compare(baseline, results, threshold):
+	"""
+	Compare *results* to the *baseline* document and print each change. A
+	result regresses when it is worse than the baseline by more than
+	*threshold*, a fraction of the baseline value.
+
+	:return: The names of the results which regressed.
+	:rtype: list
+	"""
+	regressions = []
+	print("{0:<36} {1:>14} {2:>14} {3:>9}".format('benchmark', 'baseline', 'current', 'change'))
+	for name, result in results.items():
+		previous = baseline['results'].get(name)
+		if previous is None or not previous['value']:
+			print("{0:<36} {1:>14} {2:>10.2f} {3:<3} {4:>9}".format(name, '-', result.value, result.unit, 'new'))
+			continue
+		change = (result.value - previous['value']) / previous['value']
+		worse = -change if result.better == 'higher' else change
+		status = ''
+		if worse > threshold:
+			status = '  REGRESSION'
+			regressions.append(name)
+		print("{0:<36} {1:>10.2f} {2:<3} {3:>10.2f} {4:<3} {5:>+8.1%}{6}".format(name, previous['value'], previous['unit'], result.value, result.unit, change, status))
+	return regressions
+
+def main():
+	parser = argparse.ArgumentParser(description='protocon benchmark suite')
+	parser.add_argument('-o', '--output', metavar='FILE', help='write the results to FILE as JSON')
+	parser.add_argument('-c', '--compare', metavar='FILE', help='compare the results to a previous results FILE')
+	parser.add_argument('-t', '--threshold', type=float, default=0.1, help='the fraction a result may be worse than the baseline by (default: 0.1)')
+	parser.add_argument('-f', '--filter', action='append', help='only run the benchmarks whose names contain this string')
+	parser.add_argument('--repeat', type=int, default=5, help='the number of times to repeat each measurement (default: 5)')
+	parser.add_argument('--round-trips', type=int, default=2000, help='the number of round trips to measure latency with (default: 2000)')
+	parser.add_argument('--size', type=int, default=16 * MiB, help='the number of bytes to measure throughput with (default: 16 MiB)')
+	parser.add_argument('--skip-examples', action='store_true', help='skip running the example scripts')
+	arguments = parser.parse_args()
+
+	baseline = None
+	if arguments.compare:
+		with open(arguments.compare, 'r') as file_h:
+			baseline = json.load(file_h)
+		if baseline.get('version') != RESULTS_VERSION:
+			parser.error('the baseline results are from an incompatible version')
+
+	results = run_benchmarks(arguments)
+	if arguments.output:
+		with open(arguments.output, 'w') as file_h:
+			json.dump(to_document(results), file_h, indent=2)
+	if baseline is None:
+		for name, result in results.items():
+			print("{0:<36} {1:>12.2f} {2}".format(name, result.value, result.unit))
+		return 0
+	regressions = compare(baseline, results, arguments.threshold)
+	if regressions:
+		print("{0:,} of {1:,} benchmarks regressed by more than {2:.0%}".format(len(regressions), len(results), arguments.threshold))
+		return 1
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -32,7 +32,16 @@
 
 __version__ = '1.4.0'
 from .color import print_error, print_good, print_status
-from .connection_driver import ConnectionDriver, ConnectionDriverSetting
-from .engine import Engine
+from .connection_driver import AsyncConnectionDriver, AsyncStreamConnectionDriver, ConnectionDriver, ConnectionDriverSetting
+from .async_engine import AsyncEngine
 from .errors import ProtoconError, ProtoconDriverError
+from .headless import HeadlessEngine
 from .plugin_manager import PluginManager
+
+def __getattr__(name):
+	# the interactive engine is imported on demand because importing cmd2 is
+	# slow and it is unnecessary when scripts are run headless
+	if name == 'Engine':
+		from .engine import Engine
+		return Engine
+	raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
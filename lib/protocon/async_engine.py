@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/async_engine.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import argparse
+import asyncio
+
+import hyperlink
+
+from . import commands
+from . import engine_base
+from . import errors
+from . import plugin_manager
+from . import script
+
+class AsyncEngine(engine_base.EngineBase):
+	"""
+	A non-interactive counterpart to :py:class:`~protocon.engine.Engine` which
+	runs protocon scripts as coroutines over an
+	:py:class:`~protocon.connection_driver.AsyncConnectionDriver`. Any number of
+	engines can run concurrently on a single event loop.
+	"""
+	@classmethod
+	def from_url(cls, url, plugins=None, **kwargs):
+		if plugins is None:
+			plugins = plugin_manager.PluginManager()
+		elif not isinstance(plugins, plugin_manager.PluginManager):
+			raise TypeError('plugins must be an instance of PluginManager')
+
+		if isinstance(url, str):
+			url = hyperlink.URL.from_text(url)
+		driver = plugins.get_async_connection_driver(url.scheme)
+		if driver is None:
+			raise errors.ProtoconDriverError('no asynchronous connection driver for scheme: ' + url.scheme)
+		return cls(driver(url), plugins=plugins, **kwargs)
+
+	async def _execute(self, operation):
+		opts = argparse.Namespace(**operation.arguments)
+		started = self._start_command()
+		try:
+			stop = await getattr(self, '_execute_' + operation.command)(opts)
+		except Exception as error:
+			self._print_exception(error)
+			stop = False
+		self._finish_command(operation.command, started)
+		return self.postcmd(stop, operation.line)
+
+	async def _execute_recv_count(self, opts):
+		self._pre_recv()
+		self._post_recv_count(await self.connection.recv_count(opts.count, timeout=opts.timeout), opts)
+		return False
+
+	async def _execute_recv_size(self, opts):
+		self._pre_recv(opts)
+		self._post_recv(await self.connection.recv_size(opts.size, timeout=opts.timeout), opts)
+		return False
+
+	async def _execute_recv_time(self, opts):
+		self._pre_recv(opts)
+		self._post_recv(await self.connection.recv_timeout(opts.time), opts)
+		return False
+
+	async def _execute_recv_until(self, opts):
+		self._pre_recv(opts)
+		self._post_recv_until(await self.connection.recv_until(opts.data, timeout=opts.timeout), opts)
+		return False
+
+	async def _execute_replay(self, opts):
+		for action, value in self._replay_actions(opts):
+			if action == 'recv':
+				self._pre_recv()
+				self._post_replay_recv(await self.connection.recv_size(value, timeout=opts.timeout), value)
+			elif action == 'sleep':
+				await asyncio.sleep(value)
+			else:
+				await self.connection.send(value)
+				self._post_send(value)
+		return False
+
+	async def _execute_send_file(self, opts):
+		with self._prepare_send_file(opts) as region:
+			if region is None:
+				return False
+			file_h, data, checksum = region
+			if len(data):
+				await self.connection.send_file(file_h, opts.offset, len(data))
+			self._post_send(data, checksum=checksum)
+		return False
+
+	async def _execute_send(self, opts):
+		data, messages = self._prepare_send(opts)
+		if messages is None:
+			await self.connection.send(data)
+		else:
+			await self.connection.send_batch(messages)
+		self._post_send(data, messages=messages)
+		return False
+
+	async def entry(self, scripts=()):
+		"""
+		Open the connection if necessary, run each of the protocon scripts
+		specified in *scripts* and then close the connection.
+		"""
+		if not self.connection.connected:
+			await self.connection.open()
+		self.print_good('Successfully opened connection URL: ' + self.connection.url.to_text())
+		try:
+			for script_path in scripts:
+				if await self.run_script(script_path):
+					break
+		finally:
+			self._stop_capture()
+			if self.connection.connected:
+				await self.connection.close()
+
+	async def onecmd(self, line):
+		"""
+		Execute a single command line.
+
+		:param str line: The command line to execute.
+		:return: Whether or not execution should stop.
+		:rtype: bool
+		"""
+		command = self._get_command(line)
+		if command is None:
+			return False
+		method, name, arguments = command
+		started = self._start_command()
+		try:
+			stop = await method(arguments)
+		except Exception as error:
+			self._print_exception(error)
+			stop = False
+		self._finish_command(name, started)
+		return self.postcmd(stop, line)
+
+	async def run_script(self, path):
+		"""
+		Run the protocon script at *path* from its compiled form (see
+		:py:func:`protocon.script.load`). Lines which could not be compiled are
+		executed as regular commands.
+
+		:param str path: The path to the script to run.
+		:return: Whether or not execution should stop.
+		:rtype: bool
+		"""
+		try:
+			operations = script.load(path, encoding=self.encoding)
+		except OSError as error:
+			self.last_error = error
+			self.print_error("Problem accessing script from '{0}': {1}".format(path, error))
+			return False
+		for operation in operations:
+			if operation.arguments is None:
+				stop = await self.onecmd(operation.line)
+			else:
+				stop = await self._execute(operation)
+			if stop:
+				return True
+		return False
+
+	async def _open_connection(self):
+		try:
+			if self.pool is None:
+				await self.connection.open()
+				self._set_connection(self.connection)
+			else:
+				self._set_connection(await self.pool.get())
+		except OSError as error:
+			self.last_error = error
+			self.print_error("Failed to open the connection: {0}".format(error))
+			return
+		self.print_good('Successfully opened connection URL: ' + self.connection.url.to_text())
+
+	async def do_close(self, arguments):
+		"""Close the connection."""
+		await self.connection.close()
+		self._connection_closed = True
+		self.print_status('The connection has been closed')
+		return self.exit_on_close
+
+	async def do_exit(self, arguments):
+		"""Exit the protocon engine."""
+		return True
+	do_quit = do_exit
+
+	async def do_open(self, arguments):
+		"""Open the connection if it has been closed."""
+		if self.connection.connected:
+			self.print_warning('The connection is already open')
+			return False
+		await self._open_connection()
+		return False
+
+	async def do_reconnect(self, arguments):
+		"""Close the connection and open a new one."""
+		if self.connection.connected:
+			await self.connection.close()
+		self._connection_closed = True
+		await self._open_connection()
+		return False
+
+	@engine_base.with_argparser(commands.recv_count_argparser())
+	async def do_recv_count(self, opts):
+		"""Receive the specified number of messages, such as datagrams, from the endpoint."""
+		if not self._prepare_arguments('recv_count', opts):
+			return False
+		return await self._execute_recv_count(opts)
+
+	@engine_base.with_argparser(commands.recv_size_argparser())
+	async def do_recv_size(self, opts):
+		"""Receive the specified number of bytes from the endpoint."""
+		if not self._prepare_arguments('recv_size', opts):
+			return False
+		return await self._execute_recv_size(opts)
+
+	@engine_base.with_argparser(commands.recv_time_argparser())
+	async def do_recv_time(self, opts):
+		"""Receive data for the specified amount of seconds."""
+		if not self._prepare_arguments('recv_time', opts):
+			return False
+		return await self._execute_recv_time(opts)
+
+	@engine_base.with_argparser(commands.recv_until_argparser())
+	async def do_recv_until(self, opts):
+		"""Receive data until one of the specified terminators is received."""
+		if not self._prepare_arguments('recv_until', opts):
+			return False
+		return await self._execute_recv_until(opts)
+
+	@engine_base.with_argparser(commands.replay_argparser())
+	async def do_replay(self, opts):
+		"""Replay the client side of the first conversation in a capture file."""
+		try:
+			return await self._execute_replay(opts)
+		except OSError as error:
+			self.print_error("Failed to read the capture file: {0}".format(error))
+		return False
+
+	@engine_base.with_argparser(commands.send_file_argparser())
+	async def do_send_file(self, opts):
+		"""Send the contents of a file without loading it into memory."""
+		return await self._execute_send_file(opts)
+
+	@engine_base.with_argparser(commands.send_argparser())
+	async def do_send(self, opts):
+		"""Send the specified data."""
+		self._prepare_arguments('send', opts)
+		return await self._execute_send(opts)
+
+	async def do_set(self, arguments):
+		"""Set a settable parameter.\nUsage:  set <name> <value>"""
+		return self._set_setting(arguments)
+
+	@engine_base.with_argparser(commands.stats_argparser())
+	async def do_stats(self, opts):
+		"""Print the timing statistics of the commands and connection operations."""
+		return self._report_statistics(opts)
+
+	async def do_sleep(self, arguments):
+		"""Sleep for the specified duration in seconds.\nUsage:  sleep <time>"""
+		duration = self._parse_sleep(arguments)
+		if duration is not None:
+			await asyncio.sleep(duration)
+		return False
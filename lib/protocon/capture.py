@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/capture.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import itertools
+import queue
+import socket
+import struct
+import threading
+import time
+
+from . import __version__
+
+# see: https://www.tcpdump.org/linktypes.html
+LINKTYPE_ETHERNET = 1
+LINKTYPE_USER0 = 147
+
+_BLOCK_SHB = 0x0a0d0d0a
+_BLOCK_IDB = 0x00000001
+_BLOCK_EPB = 0x00000006
+_EPB_FLAGS = {'rx': 0x01, 'tx': 0x02}
+
+_LOCAL_MAC = b'\x02\x00\x00\x00\x00\x01'
+_REMOTE_MAC = b'\x02\x00\x00\x00\x00\x02'
+# the largest payload that fits in a single synthesized IP packet
+_MAX_SEGMENT = 0xffff - 60
+# the number of chunks that can be waiting for the background thread, this
+# bounds the memory used when large regions are captured
+_MAX_QUEUED = 256
+
+def _pad(data):
+	return data + b'\x00' * (-len(data) % 4)
+
+def _option(code, value):
+	return struct.pack('<HH', code, len(value)) + _pad(value)
+
+def _block(block_type, body):
+	length = len(body) + 12
+	return struct.pack('<II', block_type, length) + body + struct.pack('<I', length)
+
+def _ip_checksum(header):
+	total = sum(struct.unpack('!10H', header))
+	total = (total & 0xffff) + (total >> 16)
+	total = (total & 0xffff) + (total >> 16)
+	return ~total & 0xffff
+
+def _pack_address(address):
+	if address is None:
+		return socket.AF_INET, b'\x00' * 4, 0
+	host, port = address[:2]
+	host = host.split('%', 1)[0]
+	if ':' in host:
+		return socket.AF_INET6, socket.inet_pton(socket.AF_INET6, host), port
+	return socket.AF_INET, socket.inet_pton(socket.AF_INET, host), port
+
+def _get_route_source(remote_address):
+	# get the local host that the kernel would send packets to remote_address from
+	family = socket.AF_INET6 if ':' in remote_address[0] else socket.AF_INET
+	with socket.socket(family, socket.SOCK_DGRAM) as probe:
+		try:
+			probe.connect(remote_address)
+		except OSError:
+			return '::' if family == socket.AF_INET6 else '0.0.0.0'
+		return probe.getsockname()[0]
+
+class Framer(object):
+	"""
+	Converts the data that is sent and received into the frames that are
+	written to a capture file. This base class writes the data as-is using
+	*link_type*, which is appropriate for drivers that exchange complete
+	frames.
+	"""
+	def __init__(self, link_type=LINKTYPE_USER0):
+		self.link_type = link_type
+
+	def frames(self, direction, data):
+		"""
+		Get the frames for a chunk of *data*.
+
+		:param str direction: The direction of the data, either ``rx`` or ``tx``.
+		:param bytes data: The data that was sent or received.
+		:return: The frames to write.
+		:rtype: list
+		"""
+		return [data]
+
+class EthernetFramer(Framer):
+	"""Prefixes the data with an Ethernet header."""
+	def __init__(self, local_mac, remote_mac, ether_type):
+		super(EthernetFramer, self).__init__(LINKTYPE_ETHERNET)
+		self._headers = {
+			'rx': remote_mac + local_mac + struct.pack('!H', ether_type),
+			'tx': local_mac + remote_mac + struct.pack('!H', ether_type)
+		}
+
+	def frames(self, direction, data):
+		return [self._headers[direction] + data]
+
+class _IPFramer(Framer):
+	protocol = None
+	def __init__(self, local_address, remote_address):
+		super(_IPFramer, self).__init__(LINKTYPE_ETHERNET)
+		family, local_host, local_port = _pack_address(local_address)
+		remote_family, remote_host, remote_port = _pack_address(remote_address)
+		if family != remote_family:
+			# the addresses are unavailable or inconsistent so fall back to placeholders
+			family = socket.AF_INET
+			local_host = remote_host = b'\x00' * 4
+		self.family = family
+		self._ip_id = itertools.count()
+		self._endpoints = {
+			'rx': (_REMOTE_MAC + _LOCAL_MAC, remote_host, local_host, remote_port, local_port),
+			'tx': (_LOCAL_MAC + _REMOTE_MAC, local_host, remote_host, local_port, remote_port)
+		}
+
+	def _ip_packet(self, macs, source, destination, payload):
+		if self.family == socket.AF_INET6:
+			header = struct.pack('!IHBB', 0x60000000, len(payload), self.protocol, 64) + source + destination
+			return macs + b'\x86\xdd' + header + payload
+		header = struct.pack('!BBHHHBBH', 0x45, 0, 20 + len(payload), next(self._ip_id) & 0xffff, 0x4000, 64, self.protocol, 0) + source + destination
+		header = header[:10] + struct.pack('!H', _ip_checksum(header)) + header[12:]
+		return macs + b'\x08\x00' + header + payload
+
+class TCPFramer(_IPFramer):
+	"""
+	Synthesizes Ethernet, IP and TCP headers with consistent sequence numbers
+	so the conversation can be followed as a TCP stream.
+	"""
+	protocol = socket.IPPROTO_TCP
+	def __init__(self, local_address, remote_address):
+		super(TCPFramer, self).__init__(local_address, remote_address)
+		self._sequence = {'rx': 0, 'tx': 0}
+
+	def frames(self, direction, data):
+		macs, source, destination, source_port, destination_port = self._endpoints[direction]
+		peer = 'tx' if direction == 'rx' else 'rx'
+		frames = []
+		for position in range(0, max(len(data), 1), _MAX_SEGMENT):
+			segment = data[position:position + _MAX_SEGMENT]
+			header = struct.pack(
+				'!HHIIBBHHH',
+				source_port,
+				destination_port,
+				self._sequence[direction],
+				self._sequence[peer],
+				5 << 4,
+				0x18,  # PSH, ACK
+				0xffff,
+				0,
+				0
+			)
+			self._sequence[direction] = (self._sequence[direction] + len(segment)) & 0xffffffff
+			frames.append(self._ip_packet(macs, source, destination, header + segment))
+		return frames
+
+class UDPFramer(_IPFramer):
+	"""Synthesizes Ethernet, IP and UDP headers for each datagram."""
+	protocol = socket.IPPROTO_UDP
+	def __init__(self, local_address, remote_address):
+		if local_address is not None and local_address[0] in ('0.0.0.0', '::'):
+			local_address = (_get_route_source(remote_address),) + tuple(local_address[1:])
+		super(UDPFramer, self).__init__(local_address, remote_address)
+
+	def frames(self, direction, data):
+		macs, source, destination, source_port, destination_port = self._endpoints[direction]
+		data = data[:_MAX_SEGMENT]
+		header = struct.pack('!HHHH', source_port, destination_port, 8 + len(data), 0)
+		return [self._ip_packet(macs, source, destination, header + data)]
+
+class CaptureWriter(object):
+	"""
+	Writes the data that is sent and received to a pcapng file which can be
+	opened with Wireshark. Packets are accumulated and written in batches of
+	at least *batch_size* bytes. When *background* is True, packets are built
+	and written on a separate thread so writing the capture does not block
+	the caller. Data is captured in chunks of a bounded size so large
+	memory-mapped regions are never copied into memory as a whole.
+	"""
+	def __init__(self, path, framer=None, background=True, batch_size=0x100000):
+		"""
+		:param str path: The path of the file to write.
+		:param framer: The framer to use for the captured data.
+		:type framer: :py:class:`.Framer`
+		:param bool background: Whether to write the file on a background thread.
+		:param int batch_size: The number of bytes to buffer before writing.
+		"""
+		self.path = path
+		self.framer = framer or Framer()
+		self.batch_size = batch_size
+		self.packets = 0
+		self._file_h = open(path, 'wb')
+		self._pending = []
+		self._pending_size = 0
+		self._pending_add(self._header_blocks())
+		self._queue = None
+		self._thread = None
+		if background:
+			self._queue = queue.Queue(maxsize=_MAX_QUEUED)
+			self._thread = threading.Thread(target=self._writer, name='protocon-capture', daemon=True)
+			self._thread.start()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def _header_blocks(self):
+		shb = struct.pack('<IHHq', 0x1a2b3c4d, 1, 0, -1)
+		shb += _option(4, "protocon v{0}".format(__version__).encode('utf-8')) + _option(0, b'')
+		idb = struct.pack('<HHI', self.framer.link_type, 0, 0)
+		# if_tsresol, timestamps are in nanoseconds
+		idb += _option(9, b'\x09') + _option(0, b'')
+		return _block(_BLOCK_SHB, shb) + _block(_BLOCK_IDB, idb)
+
+	def _packet_blocks(self, timestamp, direction, data):
+		blocks = []
+		options = _option(2, struct.pack('<I', _EPB_FLAGS[direction])) + _option(0, b'')
+		for frame in self.framer.frames(direction, data):
+			body = struct.pack('<IIIII', 0, timestamp >> 32, timestamp & 0xffffffff, len(frame), len(frame))
+			blocks.append(_block(_BLOCK_EPB, body + _pad(frame) + options))
+		self.packets += len(blocks)
+		return b''.join(blocks)
+
+	def _pending_add(self, data):
+		self._pending.append(data)
+		self._pending_size += len(data)
+		if self._pending_size >= self.batch_size:
+			self._pending_flush()
+
+	def _pending_flush(self):
+		if self._pending:
+			self._file_h.write(b''.join(self._pending))
+			self._pending.clear()
+			self._pending_size = 0
+		self._file_h.flush()
+
+	def _writer(self):
+		while True:
+			item = self._queue.get()
+			if item is None:
+				break
+			if isinstance(item, Framer):
+				self.framer = item
+				continue
+			self._pending_add(self._packet_blocks(*item))
+			if self._queue.empty() and self._pending_size:
+				# write what is available while idle so the file is current
+				self._pending_flush()
+		self._pending_flush()
+
+	def close(self):
+		"""Write any pending packets and close the file."""
+		if self._file_h.closed:
+			return
+		if self._thread is not None:
+			self._queue.put(None)
+			self._thread.join()
+		else:
+			self._pending_flush()
+		self._file_h.close()
+
+	def set_framer(self, framer):
+		"""
+		Use *framer* for the data that is written after this point, such as
+		when the connection is reopened. The new framer must use the same link
+		type.
+
+		:param framer: The framer to use for the captured data.
+		:type framer: :py:class:`.Framer`
+		"""
+		if framer.link_type != self.framer.link_type:
+			raise ValueError('the framer must use the same link type')
+		if self._thread is None:
+			self.framer = framer
+		else:
+			self._queue.put(framer)
+
+	def write(self, direction, data, timestamp=None):
+		"""
+		Add a chunk of data to the capture.
+
+		:param str direction: The direction of the data, either ``rx`` or ``tx``.
+		:param data: The data that was sent or received.
+		:type data: bytes, memoryview
+		:param int timestamp: The time in nanoseconds since the epoch, defaults to now.
+		"""
+		if timestamp is None:
+			timestamp = time.time_ns()
+		with memoryview(data) as view:
+			for position in range(0, max(len(view), 1), _MAX_SEGMENT):
+				with view[position:position + _MAX_SEGMENT] as region:
+					chunk = bytes(region)
+				if self._thread is None:
+					self._pending_add(self._packet_blocks(timestamp, direction, chunk))
+				else:
+					# blocks while the background thread catches up when it is behind
+					self._queue.put((timestamp, direction, chunk))
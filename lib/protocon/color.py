@@ -34,7 +34,6 @@ import functools
 import os
 import sys
 
-import boltons.iterutils
 import boltons.urlutils
 import termcolor
 
@@ -48,31 +47,81 @@ PREFIX_STATUS = colored_prefix(PREFIX_STATUS_RAW, 'blue')
 PREFIX_WARNING_RAW = '[!] '
 PREFIX_WARNING = colored_prefix(PREFIX_WARNING_RAW, 'yellow')
 
-def print_hexdump(data, stream=None):
+_HEXDUMP_ASCII = bytes(byte if 32 <= byte <= 126 else ord('.') for byte in range(256))
+_HEXDUMP_BATCH_ROWS = 4096
+_HEXDUMP_ROW_SIZE = 16
+
+def _hexdump_blocks(data, start, end, collapse):
+	# yield lists of the formatted rows for data[start:end], start must be
+	# aligned to the row size
+	row_size = _HEXDUMP_ROW_SIZE
+	row_format = '%04x  %s  %s  %s %s ' + os.linesep
+	previous = None
+	collapsed = False
+	for block_start in range(start, end, row_size * _HEXDUMP_BATCH_ROWS):
+		block = data[block_start:min(block_start + row_size * _HEXDUMP_BATCH_ROWS, end)]
+		hex_block = block.hex(' ')
+		ascii_block = bytes(block).translate(_HEXDUMP_ASCII).decode('latin-1')
+		full_length = len(block) - (len(block) % row_size)
+		if collapse:
+			lines = []
+			for position in range(0, len(block), row_size):
+				row = block[position:position + row_size]
+				if row == previous and block_start + position + row_size < end:
+					if not collapsed:
+						collapsed = True
+						lines.append('*' + os.linesep)
+					continue
+				previous = row
+				collapsed = False
+				lines.append(_hexdump_row(block_start + position, hex_block, ascii_block, position))
+		else:
+			lines = [row_format % (
+				block_start + position,
+				hex_block[position * 3:position * 3 + 23],
+				hex_block[position * 3 + 24:position * 3 + 47],
+				ascii_block[position:position + 8],
+				ascii_block[position + 8:position + 16]
+			) for position in range(0, full_length, row_size)]
+			if full_length < len(block):
+				lines.append(_hexdump_row(block_start + full_length, hex_block, ascii_block, full_length))
+		yield lines
+
+def _hexdump_row(offset, hex_block, ascii_block, position):
+	hex_col = hex_block[position * 3:position * 3 + 47]
+	ascii_col = ascii_block[position:position + _HEXDUMP_ROW_SIZE]
+	return "{0:04x}  {1:<23}  {2:<23}  {3:<8} {4:<8} {5}".format(offset, hex_col[:23], hex_col[24:], ascii_col[:8], ascii_col[8:], os.linesep)
+
+def print_hexdump(data, stream=None, max_bytes=None, collapse=False):
+	"""
+	Write a hexdump of *data* to *stream*. Rows are rendered in batches using
+	lookup tables and are written in large chunks.
+
+	:param bytes data: The data to dump.
+	:param stream: The stream to write to, defaults to :py:data:`sys.stdout`.
+	:param int max_bytes: When set and *data* is larger, only the beginning and
+		end of the data, about *max_bytes* in total, are dumped.
+	:param bool collapse: Whether or not to replace consecutive identical rows
+		with a single ``*`` line like ``hexdump -C``.
+	"""
 	stream = stream or sys.stdout
-	data = bytearray(data)
-	divider = 8
-	chunk_size = 16
-	for row, chunk in enumerate(boltons.iterutils.chunked(data, chunk_size, fill=-1)):
-		offset_col = "{0:04x}".format(row * chunk_size)
-		ascii_col = ''
-		hex_col = ''
-		pos = 0
-		for pos, byte in enumerate(chunk):
-			hex_col += '   ' if byte == -1 else "{0:02x} ".format(byte)
-			if divider and pos and (pos + 1) % divider == 0:
-				hex_col += ' '
+	data = memoryview(data).cast('B')
+	length = len(data)
+	row_size = _HEXDUMP_ROW_SIZE
+	ranges = ((0, length),)
+	if max_bytes and length > max_bytes:
+		head_end = max((max_bytes // 2) // row_size, 1) * row_size
+		tail_start = max(length - (max_bytes - head_end), head_end)
+		tail_start = tail_start // row_size * row_size
+		# rounding to whole rows can leave nothing to omit
+		if tail_start > head_end:
+			ranges = ((0, head_end), (tail_start, length))
 
-			if byte == -1:
-				ascii_col += ' '
-			elif byte < 32 or byte > 126:
-				ascii_col += '.'
-			else:
-				ascii_col += chr(byte)
-			if divider and pos and (pos + 1) % divider == 0:
-				ascii_col += ' '
-		hex_col = hex_col[:-2 if pos and (pos + 1) % divider == 0 else -1]
-		stream.write('  '.join((offset_col, hex_col, ascii_col)) + os.linesep)
+	for index, (start, end) in enumerate(ranges):
+		if index:
+			stream.write("... {0:,} bytes omitted ...{1}".format(start - ranges[index - 1][1], os.linesep))
+		for lines in _hexdump_blocks(data, start, end, collapse):
+			stream.write(''.join(lines))
 	stream.flush()
 
 def print_error(message, *args, **kwargs):
@@ -86,3 +135,7 @@ def print_good(message, *args, **kwargs):
 def print_status(message, *args, **kwargs):
 	message = PREFIX_STATUS + message
 	print(message, *args, **kwargs)
+
+def print_warning(message, *args, **kwargs):
+	message = PREFIX_WARNING + message
+	print(message, *args, **kwargs)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/commands.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import argparse
+import shlex
+
+# the argument parsers for the commands that take arguments, these are shared
+# by the interactive and the asynchronous engines
+def recv_count_argparser():
+	argparser = argparse.ArgumentParser(prog='recv_count')
+	argparser.add_argument('-a', '--append', action='store_true', default=False, help='append to the file instead of truncating it')
+	argparser.add_argument('-f', '--file', help='write the received data to the file as it arrives')
+	argparser.add_argument('-t', '--timeout', type=int, help='the timeout for the operation')
+	argparser.add_argument('count', help='the number of messages to receive')
+	return argparser
+
+def recv_size_argparser():
+	argparser = argparse.ArgumentParser(prog='recv_size')
+	argparser.add_argument('-a', '--append', action='store_true', default=False, help='append to the file instead of truncating it')
+	argparser.add_argument('-f', '--file', help='write the received data to the file as it arrives')
+	argparser.add_argument('-t', '--timeout', type=int, help='the timeout for the operation')
+	argparser.add_argument('size', help='the number of bytes to receive')
+	return argparser
+
+def recv_time_argparser():
+	argparser = argparse.ArgumentParser(prog='recv_time')
+	argparser.add_argument('-a', '--append', action='store_true', default=False, help='append to the file instead of truncating it')
+	argparser.add_argument('-f', '--file', help='write the received data to the file as it arrives')
+	argparser.add_argument('time', help='the amount of time in seconds to receive data for')
+	return argparser
+
+def recv_until_argparser():
+	argparser = argparse.ArgumentParser(prog='recv_until')
+	argparser.add_argument('-a', '--append', action='store_true', default=False, help='append to the file instead of truncating it')
+	argparser.add_argument('-f', '--file', help='write the received data to the file as it arrives')
+	argparser.add_argument('-t', '--timeout', type=int, help='the timeout for the operation')
+	argparser.add_argument('terminators', metavar='terminator', nargs='+', help='the byte sequence(s) to receive data until')
+	return argparser
+
+def replay_argparser():
+	argparser = argparse.ArgumentParser(prog='replay')
+	argparser.add_argument('-t', '--timeout', type=float, default=5.0, help='the timeout for each expected response (default: 5)')
+	argparser.add_argument('--timing', action='store_true', default=False, help='keep the original time between the sent packets')
+	argparser.add_argument('path', help='the pcap, pcapng or protocon capture file to replay')
+	return argparser
+
+def send_file_argparser():
+	argparser = argparse.ArgumentParser(prog='send_file')
+	argparser.add_argument('-o', '--offset', type=int, default=0, help='the offset in the file to start from')
+	argparser.add_argument('-l', '--length', type=int, help='the number of bytes to send (default: the rest of the file)')
+	argparser.add_argument('path', help='the file to send')
+	return argparser
+
+def send_argparser():
+	argparser = argparse.ArgumentParser(prog='send')
+	argparser.add_argument('data', help='the data to send to the remote end')
+	argparser.add_argument('-r', '--repeat', type=int, default=1, help='repeat the data N times (as N messages for message oriented connections)')
+	return argparser
+
+def stats_argparser():
+	argparser = argparse.ArgumentParser(prog='stats')
+	argparser.add_argument('-j', '--json', metavar='FILE', help='write the statistics to FILE as JSON instead of printing them')
+	argparser.add_argument('-r', '--reset', action='store_true', default=False, help='reset the statistics after they are reported')
+	return argparser
+
+def _strip_quotes(token):
+	if len(token) > 1 and token[0] == token[-1] and token[0] in ('"', '\''):
+		token = token[1:-1]
+	return token
+
+def is_comment(line):
+	line = line.strip()
+	return not line or line.startswith('#')
+
+def split_line(line):
+	"""
+	Split a command line into the command name and its arguments using the
+	same rules as :py:mod:`cmd2`. Quotes around arguments are removed while
+	escape sequences are left intact for :py:func:`~protocon.conversion.expand`.
+
+	:param str line: The line to split.
+	:return: The command name and a list of the arguments.
+	:rtype: tuple
+	"""
+	tokens = shlex.split(line, comments=False, posix=False)
+	if not tokens:
+		return None, []
+	return tokens[0], [_strip_quotes(token) for token in tokens[1:]]
@@ -30,21 +30,18 @@
 #  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 #
 
-import select
+import asyncio
+import socket
 
+from . import capture
 from . import color
 from . import errors
+from . import matcher
+from . import readiness
+from . import utilities
 
 _inf = float('inf')
 
-def _remaining(data, terminator):
-	# get the minimum number of bytes that must be read to ensure that data
-	# endswith terminator
-	original_length = len(terminator)
-	while not data.endswith(terminator):
-		terminator = terminator[:-1]
-	return original_length - len(terminator)
-
 def get_settings_from_url(url, setting_defs):
 	settings = {}
 	query_params = dict(url.query)
@@ -64,10 +61,15 @@ def get_settings_from_url(url, setting_defs):
 		raise ValueError('unknown setting: ' + query_params[0])
 	return settings
 
-class ConnectionDriver(object):
+class _ConnectionDriverBase(object):
 	schemes = ()
 	setting_definitions = ()
 	url_attributes = ()
+	recv_buffer_size = 0x10000
+	send_file_chunk_size = 0x10000
+	# whether the connection preserves message boundaries, when it does
+	# repeated data is sent as separate messages
+	message_oriented = False
 	def __init__(self, url):
 		for attribute in self.url_attributes:
 			if not getattr(url, attribute):
@@ -79,48 +81,466 @@ class ConnectionDriver(object):
 		self.settings = {}
 		if self.setting_definitions:
 			self.set_settings_from_url(self.setting_definitions)
+		self.last_terminator = None
+		self.recv_crc = None
+		# whether the last receive operation ended because its timeout expired
+		# before it was complete
+		self.recv_timed_out = False
+		# the kernel timestamps in nanoseconds since the epoch of the frames read
+		# by the last receive operation, empty when the driver can't provide them
+		self.recv_timestamps = []
+		# when set, received data is passed to this callable as it arrives
+		# instead of being returned
+		self.recv_sink = None
+		self._read_ahead = bytearray()
+		self._recv_digested = 0
+		self._recv_flushed = 0
+
+	def _recv_end(self, data, size, terminator):
+		# get the offset in data at which the pending receive operation is
+		# complete, or None if more data is necessary
+		size -= self._recv_flushed
+		if terminator is not None:
+			position = terminator.search(data)
+			if position is not None:
+				return min(position, size)
+		if len(data) >= size:
+			return size
+		# everything received so far is part of the result, so it can be added
+		# to the CRC while waiting for more
+		self._recv_digest(data, len(data))
+		if self.recv_sink is not None:
+			self._recv_flush(data, len(data) - (0 if terminator is None else terminator.overlap), terminator)
+		return None
+
+	def _recv_digest(self, data, end):
+		if self.recv_crc is not None and end > self._recv_digested:
+			self.recv_crc.update(data[self._recv_digested:end])
+		self._recv_digested = end
+
+	def _recv_finish(self, size, terminator, end):
+		# remove and return the received data, leaving anything past end in the
+		# read-ahead buffer
+		data = self._read_ahead
+		if end is None:
+			end = min(len(data), size - self._recv_flushed)
+		self.last_terminator = None if terminator is None else terminator.terminator
+		self._recv_digest(data, end)
+		self._recv_digested = 0
+		if self.recv_sink is not None:
+			self._recv_flush(data, end)
+			return b''
+		chunk = bytes(data[:end])
+		del data[:end]
+		return chunk
+
+	def _recv_flush(self, data, end, terminator=None):
+		# pass the first end bytes of data, which are part of the result, to the
+		# sink and remove them so memory use does not grow with the result
+		if end <= 0:
+			return
+		with memoryview(data) as view, view[:end] as chunk:
+			self.recv_sink(chunk)
+		del data[:end]
+		self._recv_digested = max(self._recv_digested - end, 0)
+		self._recv_flushed += end
+		if terminator is not None:
+			terminator.discard(end)
+
+	def get_capture_framer(self):
+		"""
+		Get the framer to use when capturing the data sent and received over
+		this connection. Drivers should override this to synthesize the
+		headers of the protocol they use.
+
+		:rtype: :py:class:`~protocon.capture.Framer`
+		"""
+		return capture.Framer()
+
+	def get_statistics(self):
+		"""
+		Get the driver specific counters of the connection, such as the frames
+		dropped by the kernel. This can be called at any time, including while
+		an operation is in progress on another thread.
+
+		:return: A mapping of counter names to their values.
+		:rtype: dict
+		"""
+		return {}
+
+	def is_stale(self):
+		"""
+		Check without blocking whether an idle connection can no longer be
+		used, either because the remote end has closed it or because it has
+		data pending that nothing asked for. Connection pools use this before
+		handing out a connection they have kept open.
+
+		:rtype: bool
+		"""
+		return not self.connected or bool(self._read_ahead)
+
+	def set_settings_from_url(self, setting_defs):
+		self.settings = get_settings_from_url(self.url, setting_defs)
+
+	def print_error(self, msg):
+		return (self.print_driver or color).print_error(msg)
+
+	def print_good(self, msg):
+		return (self.print_driver or color).print_good(msg)
+
+	def print_status(self, msg):
+		return (self.print_driver or color).print_status(msg)
+
+	def print_warning(self, msg):
+		return (self.print_driver or color).print_warning(msg)
+
+class ConnectionDriver(_ConnectionDriverBase):
+	def __init__(self, url):
+		super(ConnectionDriver, self).__init__(url)
+		self._poller = None
+		self._recv_buffer = None
+
+	def _recv(self, size, timeout, terminator=None):
+		"""
+		The shared receive engine used by the ``recv_*`` methods. Data is read
+		in chunks of up to :py:attr:`.recv_buffer_size` bytes using
+		:py:meth:`._recv_into` and any bytes that are read beyond *size* or
+		*terminator* are kept for the next call. *terminator* may be a single
+		byte string or a sequence of them, in which case the first one that is
+		received ends the operation and is stored in :py:attr:`.last_terminator`.
+		When :py:attr:`.recv_sink` is set, the data is passed to it as it arrives
+		and an empty byte string is returned.
+		"""
+		if self._recv_buffer is None:
+			self._recv_buffer = memoryview(bytearray(self.recv_buffer_size))
+		data = self._read_ahead
+		terminator = None if terminator is None else matcher.TerminatorMatcher(terminator)
+		self._recv_flushed = 0
+		self.recv_timed_out = False
+		self.recv_timestamps.clear()
+		deadline = readiness.Deadline(timeout)
+		end = self._recv_end(data, size, terminator)
+		while end is None:
+			if not self._recv_ready(deadline.remaining()):
+				self.recv_timed_out = True
+				break
+			data += self._recv_into(self._recv_buffer)
+			if not self.connected:
+				break
+			end = self._recv_end(data, size, terminator)
+		return self._recv_finish(size, terminator, end)
+
+	def _recv_messages(self, limit):
+		"""
+		Read up to *limit* messages from the connection once it is ready. The
+		default implementation reads a single message with
+		:py:meth:`._recv_into`, drivers can override this to read messages in
+		batches.
+
+		:param int limit: The maximum number of messages to read.
+		:return: The messages that were read.
+		:rtype: list
+		"""
+		data = self._recv_into(self._recv_buffer)
+		return [bytes(data)] if data else []
+
+	def _recv_into(self, buffer):
+		"""
+		Read the data that is available from the connection into *buffer* and
+		return a :py:class:`memoryview` of the bytes that were received. When
+		the remote end closes the connection, :py:attr:`.connected` must be set
+		to False.
+
+		:param memoryview buffer: The buffer to read the data into.
+		:return: The received data.
+		:rtype: memoryview
+		"""
+		size = self._connection.recv_into(buffer)
+		if not size:
+			self.connected = False
+		return buffer[:size]
+
+	def _recv_ready(self, timeout):
+		return bool(self._select(timeout))
 
 	def _select(self, timeout):
 		if self._connection is None:
 			raise RuntimeError('_select can only be used when _connection is not None')
-		timeout = None if timeout == _inf else timeout
-		return select.select([self._connection], [], [], timeout)[0]
+		if self._poller is None:
+			self._poller = readiness.Poller()
+		if self._connection not in self._poller:
+			self._poller.clear()
+			self._poller.register(self._connection)
+		return self._poller.wait(timeout)
 
 	def close(self):
+		if self._poller is not None:
+			self._poller.close()
+			self._poller = None
+		self._read_ahead.clear()
 		self.connected = False
 
-	def set_settings_from_url(self, setting_defs):
-		self.settings = get_settings_from_url(self.url, setting_defs)
+	def fileno(self):
+		"""
+		Get the file descriptor of the underlying connection. This allows
+		drivers to be registered with a :py:class:`~protocon.readiness.Poller`.
+		"""
+		if self._connection is None:
+			raise RuntimeError('fileno can only be used when _connection is not None')
+		return self._connection.fileno()
+
+	def is_stale(self):
+		if super(ConnectionDriver, self).is_stale():
+			return True
+		if self._connection is None or not self._recv_ready(0):
+			return False
+		if isinstance(self._connection, socket.socket):
+			try:
+				# the connection is readable so this does not block
+				self._connection.recv(1, socket.MSG_PEEK)
+			except (BlockingIOError, InterruptedError):
+				return False
+			except OSError:
+				return True
+		# either the end of the stream or data that nothing asked for
+		return True
 
 	def open(self):
 		self.connected = True
 
-	def recv_size(self, size):
-		raise NotImplementedError()
+	def recv_count(self, count, timeout=None):
+		"""
+		Receive *count* messages, such as datagrams. Drivers which are not
+		message oriented treat the data returned by each read as a message.
+
+		:param int count: The number of messages to receive.
+		:param float timeout: The maximum amount of time to wait.
+		:return: The messages that were received.
+		:rtype: list
+		"""
+		if self._recv_buffer is None:
+			self._recv_buffer = memoryview(bytearray(self.recv_buffer_size))
+		messages = []
+		if self._read_ahead:
+			messages.append(bytes(self._read_ahead))
+			self._read_ahead.clear()
+		self.recv_timed_out = False
+		self.recv_timestamps.clear()
+		deadline = readiness.Deadline(timeout)
+		while len(messages) < count and self.connected:
+			if not self._recv_ready(deadline.remaining()):
+				self.recv_timed_out = True
+				break
+			messages.extend(self._recv_messages(count - len(messages)))
+		return messages
+
+	def recv_size(self, size, timeout=None):
+		return self._recv(size, timeout)
 
 	def recv_timeout(self, timeout):
+		data = self._recv(_inf, timeout)
+		# reaching the timeout is how this operation is expected to end
+		self.recv_timed_out = False
+		return data
+
+	def recv_until(self, terminator, timeout=None):
+		return self._recv(_inf, timeout, terminator=terminator)
+
+	def send(self, data):
 		raise NotImplementedError()
 
-	def recv_until(self, terminator):
-		data = b''
-		while not data.endswith(terminator):
-			data += self.recv_size(_remaining(data, terminator))
+	def send_batch(self, messages):
+		"""
+		Send each of the *messages*. Drivers can override this to send them
+		with fewer system calls.
+
+		:param list messages: The messages to send.
+		"""
+		for message in messages:
+			self.send(message)
+
+	def send_file(self, file_h, offset=0, length=None):
+		"""
+		Send a region of a file without reading it into memory. The file is
+		memory-mapped and sent in chunks of up to :py:attr:`.send_file_chunk_size`
+		bytes. Stream drivers override this to use :py:func:`os.sendfile`.
+
+		:param file_h: The open file to send data from.
+		:param int offset: The offset of the first byte to send.
+		:param int length: The number of bytes to send, defaults to the rest of the file.
+		"""
+		chunk_size = self.send_file_chunk_size
+		with utilities.file_view(file_h, offset, length) as view:
+			for position in range(0, len(view), chunk_size):
+				with view[position:position + chunk_size] as chunk:
+					self.send(chunk)
+
+class AsyncConnectionDriver(_ConnectionDriverBase):
+	"""
+	The :py:mod:`asyncio` counterpart to :py:class:`.ConnectionDriver`. The
+	``open``, ``close``, ``send`` and ``recv_*`` methods are coroutines so any
+	number of connections can share a single event loop.
+	"""
+	async def _recv(self, size, timeout, terminator=None):
+		"""
+		The shared receive engine used by the ``recv_*`` coroutines. This has
+		the same semantics as :py:meth:`.ConnectionDriver._recv` but data is
+		read with :py:meth:`._recv_chunk`.
+		"""
+		data = self._read_ahead
+		terminator = None if terminator is None else matcher.TerminatorMatcher(terminator)
+		self._recv_flushed = 0
+		self.recv_timed_out = False
+		self.recv_timestamps.clear()
+		deadline = readiness.Deadline(timeout)
+		end = self._recv_end(data, size, terminator)
+		while end is None:
+			remaining = deadline.remaining()
+			try:
+				chunk = await asyncio.wait_for(self._recv_chunk(), None if remaining == _inf else remaining)
+			except asyncio.TimeoutError:
+				self.recv_timed_out = True
+				break
+			data += chunk
+			if not self.connected:
+				break
+			end = self._recv_end(data, size, terminator)
+		return self._recv_finish(size, terminator, end)
+
+	async def _recv_chunk(self):
+		"""
+		Read the data that is available from the connection, waiting until at
+		least one byte is available. This must be safe to cancel. When the
+		remote end closes the connection, :py:attr:`.connected` must be set to
+		False.
+
+		:return: The received data.
+		:rtype: bytes
+		"""
+		raise NotImplementedError()
+
+	async def close(self):
+		self._read_ahead.clear()
+		self.connected = False
+
+	async def open(self):
+		self.connected = True
+
+	async def recv_count(self, count, timeout=None):
+		"""
+		Receive *count* messages, see :py:meth:`.ConnectionDriver.recv_count`.
+		"""
+		messages = []
+		if self._read_ahead:
+			messages.append(bytes(self._read_ahead))
+			self._read_ahead.clear()
+		self.recv_timed_out = False
+		self.recv_timestamps.clear()
+		deadline = readiness.Deadline(timeout)
+		while len(messages) < count and self.connected:
+			remaining = deadline.remaining()
+			try:
+				chunk = await asyncio.wait_for(self._recv_chunk(), None if remaining == _inf else remaining)
+			except asyncio.TimeoutError:
+				self.recv_timed_out = True
+				break
+			if chunk:
+				messages.append(chunk)
+		return messages
+
+	async def recv_size(self, size, timeout=None):
+		return await self._recv(size, timeout)
+
+	async def recv_timeout(self, timeout):
+		data = await self._recv(_inf, timeout)
+		self.recv_timed_out = False
 		return data
 
-	def send(self, data):
+	async def recv_until(self, terminator, timeout=None):
+		return await self._recv(_inf, timeout, terminator=terminator)
+
+	async def send(self, data):
 		raise NotImplementedError()
 
-	def print_error(self, msg):
-		return (self.print_driver or color).print_error(msg)
+	async def send_batch(self, messages):
+		"""
+		Send each of the *messages*, see :py:meth:`.ConnectionDriver.send_batch`.
+		"""
+		for message in messages:
+			await self.send(message)
 
-	def print_good(self, msg):
-		return (self.print_driver or color).print_good(msg)
+	async def send_file(self, file_h, offset=0, length=None):
+		"""
+		Send a region of a file without reading it into memory, see
+		:py:meth:`.ConnectionDriver.send_file`.
+		"""
+		chunk_size = self.send_file_chunk_size
+		with utilities.file_view(file_h, offset, length) as view:
+			for position in range(0, len(view), chunk_size):
+				with view[position:position + chunk_size] as chunk:
+					await self.send(chunk)
 
-	def print_status(self, msg):
-		return (self.print_driver or color).print_status(msg)
+	async def serve(self, handler, max_clients=None):
+		"""
+		Accept clients until cancelled and call the *handler* coroutine with a
+		new, open driver instance for each one. Up to *max_clients* handlers
+		run concurrently, additional clients wait to be accepted until one of
+		them completes. Not all drivers support serving clients.
 
-	def print_warning(self, msg):
-		return (self.print_driver or color).print_warning(msg)
+		:param handler: The coroutine function to call with each client.
+		:param int max_clients: The maximum number of concurrent clients.
+		"""
+		raise errors.ProtoconDriverError("{0} does not support serving clients".format(self.url.scheme))
+
+class AsyncStreamConnectionDriver(AsyncConnectionDriver):
+	"""
+	A base class for asynchronous drivers that are backed by an
+	:py:class:`asyncio.StreamReader` and :py:class:`asyncio.StreamWriter`
+	pair. Subclasses must set :py:attr:`._connection` to the pair when opened.
+	"""
+	def is_stale(self):
+		if super(AsyncStreamConnectionDriver, self).is_stale():
+			return True
+		if self._connection is None:
+			return False
+		reader, writer = self._connection
+		# the event loop reads from the socket while the connection is idle so
+		# the end of the stream and any data are already in the reader, which
+		# has no public way to check for the latter
+		if reader.at_eof() or reader.exception() is not None or writer.is_closing():
+			return True
+		return bool(reader._buffer)
+
+	async def _recv_chunk(self):
+		reader, _ = self._connection
+		chunk = await reader.read(self.recv_buffer_size)
+		if not chunk:
+			self.connected = False
+		return chunk
+
+	async def close(self):
+		if self._connection is not None:
+			_, writer = self._connection
+			writer.close()
+			try:
+				await writer.wait_closed()
+			except (ConnectionError, OSError):
+				pass
+		await super(AsyncStreamConnectionDriver, self).close()
+
+	async def send(self, data):
+		_, writer = self._connection
+		writer.write(data)
+		await writer.drain()
+
+	async def send_file(self, file_h, offset=0, length=None):
+		if length == 0:
+			return
+		_, writer = self._connection
+		await writer.drain()
+		# the event loop uses os.sendfile when the transport supports it and
+		# falls back to reading the file in chunks otherwise, such as for ssl
+		await asyncio.get_running_loop().sendfile(writer.transport, file_h, offset, length)
 
 class ConnectionDriverSetting(object):
 	__slots__ = ('name', 'default_value', 'type', 'choices')
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/crc.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import binascii
+import functools
+import zlib
+
+import crcelk
+
+_REFLECT_BYTE = bytes(int("{0:08b}".format(byte)[::-1], 2) for byte in range(256))
+
+def _get_algorithm(name):
+	for algorithm_name, algorithm in crcelk.algorithms.items():
+		if algorithm_name.lower() == name.lower():
+			return algorithm
+	raise ValueError('unknown CRC algorithm: ' + name)
+
+def _poly_mask(algorithm):
+	mask = 0
+	for exponent in algorithm.polynomial:
+		mask |= 1 << exponent
+	return mask & ((1 << algorithm.width) - 1)
+
+def _reflect(value, width):
+	return int("{0:0{1}b}".format(value, width)[::-1], 2)
+
+def _data_lsb_first(algorithm):
+	return algorithm.lsb_first if algorithm.lsb_first_data is None else algorithm.lsb_first_data
+
+def _update_crc32(register, data):
+	return zlib.crc32(data, register ^ 0xffffffff) ^ 0xffffffff
+
+def _update_crc_hqx(register, data):
+	return binascii.crc_hqx(data, register)
+
+def _update_reflected(table, register, data):
+	for byte in data:
+		register = table[(register ^ byte) & 0xff] ^ (register >> 8)
+	return register
+
+def _update_unreflected(table, shift, mask, register, data):
+	for byte in data:
+		register = table[((register >> shift) ^ byte) & 0xff] ^ ((register << 8) & mask)
+	return register
+
+@functools.lru_cache(maxsize=None)
+def _get_updater(name):
+	# get a function which takes the register value and data and returns the
+	# new register value along with the number of bits the register is shifted
+	# to the left for algorithms narrower than a byte
+	algorithm = _get_algorithm(name)
+	width = algorithm.width
+	poly_mask = _poly_mask(algorithm)
+	if algorithm.lsb_first:
+		if width == 32 and poly_mask == 0x04c11db7 and _data_lsb_first(algorithm):
+			return _update_crc32, 0
+		poly_mask = _reflect(poly_mask, width)
+		table = []
+		for byte in range(256):
+			value = byte
+			for _ in range(8):
+				value = (value >> 1) ^ poly_mask if value & 1 else value >> 1
+			table.append(value)
+		return functools.partial(_update_reflected, tuple(table)), 0
+
+	if width == 16 and poly_mask == 0x1021 and not _data_lsb_first(algorithm):
+		return _update_crc_hqx, 0
+	# algorithms narrower than a byte are processed with the register aligned
+	# to the most significant bit of a byte
+	align = max(8 - width, 0)
+	width += align
+	poly_mask <<= align
+	mask = (1 << width) - 1
+	top_bit = 1 << (width - 1)
+	table = []
+	for byte in range(256):
+		value = byte << (width - 8)
+		for _ in range(8):
+			value = ((value << 1) ^ poly_mask) if value & top_bit else (value << 1)
+		table.append(value & mask)
+	return functools.partial(_update_unreflected, tuple(table), width - 8, mask), align
+
+class Crc(object):
+	"""
+	An incremental CRC calculation using one of the algorithms from
+	:py:data:`crcelk.algorithms`. CRC-32 is calculated using :py:func:`zlib.crc32`,
+	CRC-CCITT and CRC-XModem using :py:func:`binascii.crc_hqx` and the remaining
+	algorithms using precomputed tables. The results are identical to those of
+	:py:meth:`crcelk.CrcAlgorithm.calc_bytes`.
+	"""
+	__slots__ = ('algorithm', 'length', '_align', '_register', '_reflect_data', '_update')
+	def __init__(self, name, data=None):
+		"""
+		:param str name: The case-insensitive name of the algorithm to use.
+		:param bytes data: Optional data to initialize the CRC with.
+		"""
+		self.algorithm = _get_algorithm(name)
+		self._update, self._align = _get_updater(self.algorithm.name.lower())
+		self._reflect_data = _data_lsb_first(self.algorithm) != self.algorithm.lsb_first
+		self.reset()
+		if data is not None:
+			self.update(data)
+
+	def __repr__(self):
+		return "<{0} algorithm={1!r} length={2} value={3} >".format(self.__class__.__name__, self.algorithm.name, self.length, self.hexdigest())
+
+	def copy(self):
+		"""
+		Get a copy of this instance which can be updated independently.
+
+		:rtype: :py:class:`.Crc`
+		"""
+		other = self.__class__.__new__(self.__class__)
+		for name in self.__slots__:
+			setattr(other, name, getattr(self, name))
+		return other
+
+	def hexdigest(self):
+		"""
+		Get the current value formatted as a zero-padded hex string.
+
+		:rtype: str
+		"""
+		return "0x{value:0{width:}x}".format(value=self.value, width=self.algorithm.width // 4)
+
+	def reset(self):
+		"""Reset the calculation to the algorithm's seed value."""
+		self.length = 0
+		self._register = int(self.algorithm.seed) << self._align
+
+	def update(self, data):
+		"""
+		Update the CRC with the next chunk of *data*.
+
+		:param bytes data: The data to add to the calculation.
+		"""
+		if not data:
+			return
+		if self._reflect_data:
+			data = bytes(data).translate(_REFLECT_BYTE)
+		self._register = self._update(self._register, data)
+		self.length += len(data)
+
+	@property
+	def value(self):
+		"""The final CRC value of the data processed so far."""
+		return (self._register >> self._align) ^ self.algorithm.xor_mask
+
+def algorithm_names():
+	"""
+	Get the lower-case names of all of the supported algorithms.
+
+	:rtype: tuple
+	"""
+	return tuple(name.lower() for name in crcelk.algorithms.keys())
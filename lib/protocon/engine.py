@@ -30,81 +30,54 @@
 #  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 #
 
-import argparse
-import ast
-import collections
+import copy
 import datetime
-import functools
 import sys
 import textwrap
-import time
 import traceback
-import weakref
 
 import cmd2
-import crcelk
-import hyperlink
 
 from . import __version__
 from . import color
-from . import conversion
-from . import errors
+from . import engine_base
 from . import plugin_manager
 
+def _with_argparser(method):
+	# wrap a command of the engine base with cmd2's argument parsing so it is
+	# integrated with help and completion
+	return cmd2.with_argparser(copy.deepcopy(method.argparser))(method.__wrapped__)
+
 # this class includes both cmd2 style p* and generic style print_* methods for
 # compatibility with cmd2.Cmd and the ConnectionDriver interface
-class Engine(cmd2.Cmd):
-	IOHistory = collections.namedtuple('IOHistory', ('rx', 'tx'))
+class Engine(engine_base.SyncEngineBase, cmd2.Cmd):
 	allow_cli_args = False
 	prompt = 'pro > '
-	def __init__(self, connection, plugins=None, quiet=False, **kwargs):
+	def __init__(self, connection, plugins=None, quiet=False, pool=None, statistics=None, metrics=None, **kwargs):
 		self.exclude_from_help = ['do_eof', 'do_eos', 'do_quit']
-		self.connection = connection
 		if plugins is None:
 			plugins = plugin_manager.PluginManager()
-		elif not isinstance(plugins, plugin_manager.PluginManager):
-			raise TypeError('plugins must be an instance of PluginManager')
-		self.plugins = plugins
-		super(Engine, self).__init__(include_ipy=True, allow_cli_args=False, **kwargs)
-		self.colors = True
-		# variables
+		cmd2.Cmd.__init__(self, include_ipy=True, allow_cli_args=False, **kwargs)
+		engine_base.SyncEngineBase.__init__(self, connection, plugins=plugins, quiet=quiet, colors=True, stdout=self.stdout, pool=pool, statistics=statistics, metrics=metrics)
 		self.feedback_to_output = True
-
-		self.crc_algorithm = 'crc-16'
-		self.add_settable(
-			cmd2.Settable('crc_algorithm', str, 'The CRC algorithm to use', self, onchange_cb=functools.partial(
-				self._set_enumeration,
-				choices=tuple(name.lower() for name in crcelk.algorithms.keys())
-			))
-		)
-		self.encoding = 'utf-8'
-		self.add_settable(
-			cmd2.Settable('encoding', str, 'The data encoding to use', self, onchange_cb=functools.partial(
-				self._set_enumeration,
-				choices=conversion.ENCODINGS
-			))
-		)
-
-		self.print_rx = True
-		self.add_settable(cmd2.Settable('print_rx', bool, 'Print received data', self))
-
-		self.print_tx = True
-		self.add_settable(cmd2.Settable('print_tx', bool, 'Print sent data', self))
-
-		self.io_history = self.IOHistory(rx=collections.deque(), tx=collections.deque())
-		self.settables['quiet'].set_value(quiet)
+		for name, (type_, description) in engine_base.SETTINGS.items():
+			if name == 'quiet':
+				# this one is provided by cmd2
+				continue
+			choices = engine_base.setting_choices(name)
+			onchange_cb = None if choices is None else self._set_enumeration
+			self.add_settable(cmd2.Settable(name, type_, description, self, onchange_cb=onchange_cb))
 
 		self.exclude_from_help.append('do__relative_load')
 		self.pgood("Initialized protocon engine v{0} at {1:%Y-%m-%d %H:%M:%S}".format(__version__, datetime.datetime.now()))
 
-		self.connection.print_driver = weakref.proxy(self)
 		if not self.connection.connected:
 			self.connection.open()
 		self.pgood('Successfully opened connection URL: ' + self.connection.url.to_text())
 
-	def _set_enumeration(self, name, old, new, choices):
+	def _set_enumeration(self, name, old, new):
+		choices = engine_base.setting_choices(name)
 		if new in choices:
-			setattr(self, name, new)
 			return
 		setattr(self, name, old)
 		self.perror("Invalid value: {0!r} for option: {1}, choose one of:".format(new, name), traceback_war=False)
@@ -112,144 +85,55 @@ class Engine(cmd2.Cmd):
 		for choice_line in textwrap.wrap(', '.join(choices), 69, break_long_words=False, break_on_hyphens=False):
 			sys.stderr.write(prefix + choice_line + '\n')
 
-	def _crc_string(self, data):
-		algo = crcelk.algorithms[self.crc_algorithm.upper()]
-		return "0x{value:0{width:}x}".format(value=algo.calc_bytes(data), width=algo.width // 4)
-
-	def _post_recv(self, data, opts=None):
-		self.io_history.rx.append(data)
-		self.pstatus("RX: {0: 6} bytes (CRC: {1})".format(len(data), self._crc_string(data)))
-		if self.print_rx:
-			color.print_hexdump(data)
-
-		if opts and opts.file:
-			with open(opts.file, 'wb') as file_h:
-				file_h.write(data)
-
-	def _post_send(self, data):
-		self.io_history.tx.append(data)
-		self.pstatus("TX: {0: 6} bytes (CRC: {1})".format(len(data), self._crc_string(data)))
-		if self.print_tx:
-			color.print_hexdump(data)
-
-	def _pre_send(self, data):
-		return data
-
-	@classmethod
-	def from_url(cls, url, plugins=None, **kwargs):
-		if plugins is None:
-			plugins = plugin_manager.PluginManager()
-		elif not isinstance(plugins, plugin_manager.PluginManager):
-			raise TypeError('plugins must be an instance of PluginManager')
+	def _print_exception(self, error):
+		self.last_error = error
+		self.pexcept(error)
 
-		if isinstance(url, str):
-			url = hyperlink.URL.from_text(url)
-		scheme_count = sum([len(driver.schemes) for driver in plugins.connection_drivers.values()])
-		color.print_status("Loaded {:,} connection drivers, providing {:,} URL schemes".format(len(plugins.connection_drivers), scheme_count))
-		if plugins.transcoders:
-			color.print_status("Loaded {0:,} transcode drivers".format(len(plugins.transcoders)))
-		driver = next((driver for driver in plugins.connection_drivers.values() if url.scheme in driver.schemes), None)
-		if driver is None:
-			raise errors.ProtoconDriverError('no connection driver for scheme: ' + url.scheme)
-
-		driver = driver(url)
-		return cls(driver, plugins=plugins, **kwargs)
+	def _run_operation(self, operation):
+		if self.echo:
+			self.poutput(self.prompt + operation.line)
+		if operation.arguments is None:
+			return self.onecmd_plus_hooks(operation.line)
+		return self._execute(operation)
 
 	def entry(self, scripts=()):
 		"""
 		Run each of the protocon scripts specified in *scripts* and then enter
 		:py:meth:`.cmdloop` unless the engine is set to exit.
 		"""
-		for script in scripts:
-			if self.do_run_script(script):
-				break
-		else:
-			self.cmdloop()
-
-	def do_close(self, opts):
-		"""Close the connection."""
-		self.connection.close()
-		self.pstatus('The connection has been closed')
-		return True
+		try:
+			for path in scripts:
+				if self.run_script(path):
+					break
+			else:
+				self.cmdloop()
+		finally:
+			self._close_session()
 
 	def do_exit(self, arg):
 		"""Exit the protocon engine."""
 		return super(Engine, self).do_quit(arg)
 
-	argparser = argparse.ArgumentParser()
-	argparser.add_argument('-f', '--file', help='write the received data to the file')
-	argparser.add_argument('-t', '--timeout', type=int, help='the timeout for the operation')
-	argparser.add_argument('size', help='the number of bytes to receive')
-	@cmd2.with_argparser(argparser)
-	def do_recv_size(self, opts):
-		"""Receive the specified number of bytes from the endpoint."""
-		size = conversion.eval_token(opts.size)
-		if not isinstance(size, int):
-			self.pwarning('Command Error: recv_size must specify a valid size')
-			return False
-		self._post_recv(self.connection.recv_size(size, timeout=opts.timeout), opts)
-		return False
-
-	argparser = argparse.ArgumentParser()
-	argparser.add_argument('-f', '--file', help='write the received data to the file')
-	argparser.add_argument('time', help='the amount of time in seconds to receive data for')
-	@cmd2.with_argparser(argparser)
-	def do_recv_time(self, opts):
-		"""Receive data for the specified amount of seconds."""
-		timeout = conversion.eval_token(opts.time)
-		if not isinstance(timeout, (float, int)):
-			self.pwarning('Command Error: recv_time must specify a valid timeout')
-			return False
-		self._post_recv(self.connection.recv_timeout(timeout), opts)
-		return False
-
-	argparser = argparse.ArgumentParser()
-	argparser.add_argument('-f', '--file', help='write the received data to the file')
-	argparser.add_argument('-t', '--timeout', type=int, help='the timeout for the operation')
-	argparser.add_argument('terminator', help='the byte sequence to receive data until')
-	@cmd2.with_argparser(argparser)
-	def do_recv_until(self, opts):
-		"""Receive data until the specified terminator is received."""
-		terminator = self.decode(opts.terminator)
-		if not terminator:
-			self.pwarning('Command Error: recv_until must specify a valid terminator')
-			return False
-		self._post_recv(self.connection.recv_until(terminator, timeout=opts.timeout), opts)
-		return False
-
-	argparser = argparse.ArgumentParser()
-	argparser.add_argument('data', help='the data to send to the remote end')
-	argparser.add_argument('-r', '--repeat', type=int, default=1, help='repeat the data N times')
-	@cmd2.with_argparser(argparser)
-	def do_send(self, opts):
-		"""Send the specified data."""
-		data = self.decode(opts.data) * opts.repeat
-		data = self._pre_send(data)
-		self.connection.send(data)
-		self._post_send(data)
-		return False
-
-	def do_sleep(self, arguments):
-		"""Sleep for the specified duration in seconds.\nUsage:  sleep <time>"""
-		duration = ast.literal_eval(arguments) if arguments else None
-		if not isinstance(duration, (float, int)):
-			self.pwarning('Command Error: sleep must specify a valid duration')
-			return False
-		time.sleep(duration)
-		return False
-
-	def decode(self, string, encoding=None):
-		username, _, password = self.connection.url.userinfo.partition(':')
-		variables = {
-			'url.host': self.connection.url.host,
-			'url.password': password,
-			'url.port': str(self.connection.url.port or ''),
-			'url.scheme': self.connection.url.scheme,
-			'url.username': username,
-		}
-		encoding = encoding or self.encoding
-		string = conversion.expand(string, variables=variables, encoding=encoding)
-		return conversion.decode(string, encoding=encoding)
+	do_recv_count = _with_argparser(engine_base.SyncEngineBase.do_recv_count)
+	do_recv_size = _with_argparser(engine_base.SyncEngineBase.do_recv_size)
+	do_recv_time = _with_argparser(engine_base.SyncEngineBase.do_recv_time)
+	do_recv_until = _with_argparser(engine_base.SyncEngineBase.do_recv_until)
+	do_replay = _with_argparser(engine_base.SyncEngineBase.do_replay)
+	do_send_file = _with_argparser(engine_base.SyncEngineBase.do_send_file)
+	do_send = _with_argparser(engine_base.SyncEngineBase.do_send)
+	do_stats = _with_argparser(engine_base.SyncEngineBase.do_stats)
+	do_sleep = cmd2.with_argument_list(engine_base.SyncEngineBase.do_sleep)
+
+	def onecmd(self, statement, *, add_to_history=True):
+		started = self._start_command()
+		if started is None:
+			return super(Engine, self).onecmd(statement, add_to_history=add_to_history)
+		if not isinstance(statement, cmd2.Statement):
+			statement = self._input_line_to_statement(statement)
+		stop = super(Engine, self).onecmd(statement, add_to_history=add_to_history)
+		if self.cmd_func(statement.command) is not None:
+			self._finish_command(statement.command, started)
+		return stop
 
 	def perror(self, errmsg, end='\n', exception_type=None, traceback_war=True, **kwargs):
 		errmsg = str(errmsg)
@@ -289,14 +173,6 @@ class Engine(cmd2.Cmd):
 			msg = color.PREFIX_STATUS_RAW + msg
 			sys.stderr.write("{}\n".format(msg))
 
-	def postcmd(self, stop, line):
-		if stop:
-			return True
-		if not self.connection.connected:
-			self.print_error('The remote end has closed the connection')
-			return True
-		return False
-
 	def print_error(self, msg, end='\n'):
 		if self.colors:
 			msg = color.PREFIX_ERROR + msg
@@ -0,0 +1,780 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/engine_base.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import argparse
+import ast
+import collections
+import contextlib
+import functools
+import inspect
+import json
+import os
+import sys
+import time
+import weakref
+
+import hyperlink
+
+from . import capture
+from . import color
+from . import commands
+from . import conversion
+from . import crc
+from . import errors
+from . import history
+from . import instrumentation
+from . import plugin_manager
+from . import pool
+from . import replay
+from . import script
+from . import sink
+from . import utilities
+
+# the settings shared by all of the engines, mapping each name to its type and
+# description
+SETTINGS = collections.OrderedDict((
+	('capture', (str, 'Write sent and received data to this pcapng file (empty to stop)')),
+	('collapse_dump', (bool, 'Collapse repeated rows when printing data')),
+	('collect_stats', (bool, 'Collect timing statistics for commands and connection operations')),
+	('crc_algorithm', (str, 'The CRC algorithm to use, or none to disable it')),
+	('encoding', (str, 'The data encoding to use')),
+	('exit_on_close', (bool, 'Exit when the connection is closed, otherwise it can be opened again')),
+	('history_max_bytes', (int, 'The maximum number of bytes of history to keep in memory (0 for no limit)')),
+	('history_max_entries', (int, 'The maximum number of history entries to keep in memory (0 for no limit)')),
+	('history_spill', (bool, 'Spill history that is evicted from memory to a temporary file')),
+	('max_dump_bytes', (int, 'The maximum number of bytes to print, the rest is truncated (0 for no limit)')),
+	('print_rx', (bool, 'Print received data')),
+	('print_tx', (bool, 'Print sent data')),
+	('quiet', (bool, 'Don\'t print nonessential feedback')),
+))
+
+def setting_choices(name):
+	"""
+	Get the valid values for the setting *name*, or None if it is not limited
+	to a set of values.
+
+	:param str name: The name of the setting.
+	:rtype: tuple
+	"""
+	if name == 'crc_algorithm':
+		return crc.algorithm_names() + ('none',)
+	if name == 'encoding':
+		return conversion.ENCODINGS
+	return None
+
+def with_argparser(argparser):
+	"""
+	A decorator for the command methods of the engines which do not use
+	:py:mod:`cmd2`, it parses the list of arguments with *argparser* similar to
+	:py:func:`cmd2.with_argparser`. Both regular methods and coroutines are
+	supported.
+	"""
+	def decorator(function):
+		if inspect.iscoroutinefunction(function):
+			@functools.wraps(function)
+			async def wrapper(self, arguments):
+				try:
+					opts = argparser.parse_args(arguments)
+				except SystemExit:
+					return False
+				return await function(self, opts)
+		else:
+			@functools.wraps(function)
+			def wrapper(self, arguments):
+				try:
+					opts = argparser.parse_args(arguments)
+				except SystemExit:
+					return False
+				return function(self, opts)
+		wrapper.argparser = argparser
+		return wrapper
+	return decorator
+
+class EngineBase(object):
+	"""
+	The state, settings, output handling and the parts of the commands which do
+	not perform I/O that are shared by all of the engines. Subclasses implement
+	the commands and the execution of scripts on top of it.
+	"""
+	IOHistory = history.IOHistory
+	SEND_FILE_CRC_CHUNK_SIZE = 0x100000
+	settable_types = {name: type_ for name, (type_, _) in SETTINGS.items()}
+	def __init__(self, connection, plugins=None, quiet=False, colors=True, stdout=None, pool=None, statistics=None, metrics=None):
+		self.connection = connection
+		self.pool = pool
+		if plugins is not None and not isinstance(plugins, plugin_manager.PluginManager):
+			raise TypeError('plugins must be an instance of PluginManager')
+		self.plugins = plugins
+		self.colors = colors
+		self.stdout = stdout or sys.stdout
+		# variables
+		self.crc_algorithm = 'crc-16'
+		self._recv_sink = None
+		self._capture_writer = None
+		self.encoding = 'utf-8'
+		self.exit_on_close = True
+		self._connection_closed = False
+		self.collapse_dump = False
+		self.max_dump_bytes = 0
+		self.print_rx = True
+		self.print_tx = True
+		self.quiet = quiet
+		# the last error that was reported while executing a command
+		self.last_error = None
+
+		self.io_history = self.IOHistory(max_bytes=0x1000000)
+		# running totals which unlike the history are never truncated
+		self.rx_bytes = 0
+		self.tx_bytes = 0
+		self.connection.print_driver = weakref.proxy(self)
+		self.statistics = None
+		if statistics is not None:
+			self._start_statistics(statistics)
+		self.metrics = metrics
+		if metrics is not None:
+			metrics.add_engine(self)
+
+	@property
+	def capture(self):
+		return '' if self._capture_writer is None else self._capture_writer.path
+
+	@capture.setter
+	def capture(self, value):
+		self._stop_capture()
+		if value:
+			self._capture_writer = capture.CaptureWriter(value, self.connection.get_capture_framer())
+
+	@property
+	def collect_stats(self):
+		return self.statistics is not None
+
+	@collect_stats.setter
+	def collect_stats(self, value):
+		if value and self.statistics is None:
+			self._start_statistics(instrumentation.SessionStatistics())
+		elif not value and self.statistics is not None:
+			self._stop_statistics()
+
+	@property
+	def history_max_bytes(self):
+		return self.io_history.max_bytes
+
+	@history_max_bytes.setter
+	def history_max_bytes(self, value):
+		self.io_history.max_bytes = value
+
+	@property
+	def history_max_entries(self):
+		return self.io_history.max_entries
+
+	@history_max_entries.setter
+	def history_max_entries(self, value):
+		self.io_history.max_entries = value
+
+	@property
+	def history_spill(self):
+		return self.io_history.spill
+
+	@history_spill.setter
+	def history_spill(self, value):
+		self.io_history.spill = value
+
+	def _set_connection(self, connection):
+		# switch to a newly opened connection, such as one taken from the pool
+		self.connection = connection
+		self.connection.print_driver = weakref.proxy(self)
+		self._connection_closed = False
+		if self._capture_writer is not None:
+			self._capture_writer.set_framer(self.connection.get_capture_framer())
+		if self.statistics is not None:
+			self.statistics.instrument_connection(self.connection)
+		if self.metrics is not None:
+			self.metrics.reconnects += 1
+
+	def _start_command(self):
+		# get the time at which a command started when commands are timed
+		return None if self.statistics is None and self.metrics is None else time.perf_counter()
+
+	def _finish_command(self, name, started):
+		if started is None:
+			return
+		elapsed = time.perf_counter() - started
+		if self.statistics is not None:
+			self.statistics.record_command(name, elapsed)
+		if self.metrics is not None:
+			self.metrics.record_command(name, elapsed)
+
+	def _start_statistics(self, statistics):
+		self.statistics = statistics
+		statistics.instrument_connection(self.connection)
+		statistics.instrument_engine(self)
+
+	def _stop_statistics(self):
+		self.statistics.uninstrument(self.connection)
+		self.statistics.uninstrument(self)
+		self.statistics = None
+
+	def _stop_capture(self):
+		if self._capture_writer is not None:
+			self._capture_writer.close()
+			self._capture_writer = None
+
+	def _crc_string(self, data, checksum=None):
+		if self.crc_algorithm == 'none':
+			return None
+		# use the checksum calculated by the connection as the data was received
+		# when it covers all of the data
+		if checksum is None or checksum.length != len(data):
+			checksum = crc.Crc(self.crc_algorithm, data)
+		return checksum.hexdigest()
+
+	def _io_summary(self, direction, data, crc_string, messages=None):
+		summary = "{0}: {1: 6} bytes".format(direction.upper(), len(data))
+		if messages is not None:
+			summary += " in {0:,} messages".format(len(messages))
+		if crc_string is None:
+			return summary
+		return summary + " (CRC: {0})".format(crc_string)
+
+	def _post_recv(self, data, opts=None, messages=None):
+		file_sink, self._recv_sink = self._recv_sink, None
+		self.connection.recv_sink = None
+		if file_sink is not None:
+			# the data was streamed to the file as it arrived
+			with file_sink, file_sink.view() as data:
+				self._record_recv(data, messages)
+		else:
+			self._record_recv(data, messages)
+			if opts and opts.file:
+				with sink.FileSink(opts.file, append=opts.append) as file_sink:
+					file_sink(data)
+		if file_sink is not None:
+			self.print_status("Wrote {0:,} bytes to {1} (SHA-256: {2})".format(file_sink.size, file_sink.path, file_sink.hexdigest()))
+
+	def _post_recv_count(self, messages, opts):
+		self._post_recv(b''.join(messages), opts, messages=messages)
+		if len(messages) < opts.count:
+			self.print_warning("Received {0} of the {1} expected messages".format(len(messages), opts.count))
+
+	def _post_recv_until(self, data, opts):
+		self._post_recv(data, opts)
+		if len(opts.data) > 1 and self.connection.last_terminator is not None:
+			index = opts.data.index(self.connection.last_terminator)
+			self.print_status("Matched terminator #{0}: {1}".format(index + 1, opts.terminators[index]))
+
+	def _post_replay_recv(self, data, size):
+		self._post_recv(data)
+		if len(data) < size:
+			self.print_warning("Received {0} of the {1} expected bytes".format(len(data), size))
+
+	def _record_recv(self, data, messages=None):
+		checksum, self.connection.recv_crc = self.connection.recv_crc, None
+		crc_string = self._crc_string(data, checksum)
+		# use the kernel timestamps of the frames when the driver provides them
+		timestamps = self.connection.recv_timestamps or (None,)
+		self.io_history.append('rx', data, crc=crc_string, timestamp=None if timestamps[0] is None else timestamps[0] / 1e9)
+		self.rx_bytes += len(data)
+		if self.metrics is not None:
+			self.metrics.record_recv(len(data), self.connection.recv_timed_out)
+		if self._capture_writer is not None:
+			messages = [message for message in (messages or (data,)) if message]
+			if len(timestamps) != len(messages):
+				timestamps = timestamps[:1] * len(messages)
+			for message, timestamp in zip(messages, timestamps):
+				self._capture_writer.write('rx', message, timestamp=timestamp)
+		self.print_status(self._io_summary('rx', data, crc_string, messages))
+		if self.print_rx:
+			self._print_hexdump(data)
+
+	def _post_send(self, data, messages=None, checksum=None):
+		crc_string = self._crc_string(data, checksum)
+		self.io_history.append('tx', data, crc=crc_string)
+		self.tx_bytes += len(data)
+		if self.metrics is not None:
+			self.metrics.record_send(len(data))
+		if self._capture_writer is not None:
+			for message in (messages or (data,)):
+				if message:
+					self._capture_writer.write('tx', message)
+		self.print_status(self._io_summary('tx', data, crc_string, messages))
+		if self.print_tx:
+			self._print_hexdump(data)
+
+	def _print_hexdump(self, data):
+		color.print_hexdump(data, stream=self.stdout, max_bytes=self.max_dump_bytes, collapse=self.collapse_dump)
+
+	def _pre_recv(self, opts=None):
+		self.connection.recv_crc = None if self.crc_algorithm == 'none' else crc.Crc(self.crc_algorithm)
+		if self._recv_sink is not None:
+			# the previous receive operation failed before it was finished
+			self._recv_sink.close()
+		self._recv_sink = None
+		if opts is not None and opts.file:
+			self._recv_sink = sink.FileSink(opts.file, append=opts.append)
+		self.connection.recv_sink = self._recv_sink
+
+	def _pre_send(self, data):
+		return data
+
+	def _prepare_send(self, opts):
+		# get the data for the send command and the messages to send it as when
+		# the connection is message oriented, otherwise None
+		if opts.repeat > 1 and self.connection.message_oriented:
+			messages = [self._pre_send(opts.data)] * opts.repeat
+			return b''.join(messages), messages
+		return self._pre_send(opts.data * opts.repeat), None
+
+	@contextlib.contextmanager
+	def _prepare_send_file(self, opts):
+		# provide the open file, a view of the region to send and its checksum
+		# for the send_file command, or None if it can not be sent
+		try:
+			file_h = open(opts.path, 'rb')
+		except OSError as error:
+			self.print_error("Failed to open the file: {0}".format(error))
+			yield None
+			return
+		with file_h:
+			size = os.fstat(file_h.fileno()).st_size
+			length = size - opts.offset if opts.length is None else opts.length
+			if opts.offset < 0 or length < 0 or opts.offset + length > size:
+				self.print_warning('Command Error: send_file offset and length must be within the file')
+				yield None
+				return
+			with utilities.file_view(file_h, opts.offset, length) as data:
+				checksum = None
+				if self.crc_algorithm != 'none':
+					checksum = crc.Crc(self.crc_algorithm)
+					for position in range(0, length, self.SEND_FILE_CRC_CHUNK_SIZE):
+						with data[position:position + self.SEND_FILE_CRC_CHUNK_SIZE] as chunk:
+							checksum.update(chunk)
+				yield file_h, data, checksum
+
+	def _replay_actions(self, opts):
+		# the I/O free part of the replay command, this yields the actions for
+		# the engine to perform as ('recv', size), ('sleep', seconds) and
+		# ('send', data) tuples
+		expected = 0
+		origin = None
+		for step in replay.open_steps(opts.path):
+			if step.direction == 'rx':
+				expected += len(step.data)
+				continue
+			if expected:
+				yield 'recv', expected
+				expected = 0
+			if opts.timing and step.timestamp is not None:
+				if origin is None:
+					origin = (time.monotonic(), step.timestamp)
+				delay = (step.timestamp - origin[1]) - (time.monotonic() - origin[0])
+				if delay > 0:
+					yield 'sleep', delay
+			if not self.connection.connected:
+				return
+			yield 'send', self._pre_send(step.data)
+		if expected and self.connection.connected:
+			yield 'recv', expected
+
+	def _prepare_arguments(self, command, opts):
+		# convert and validate the parsed arguments of a command that was not
+		# compiled, returning whether or not it can be executed
+		if command == 'send':
+			opts.data = self.decode(opts.data)
+		elif command == 'recv_until':
+			opts.data = tuple(self.decode(terminator) for terminator in opts.terminators)
+			if not all(opts.data):
+				self.print_warning('Command Error: recv_until must specify a valid terminator')
+				return False
+		elif command == 'recv_count':
+			opts.count = conversion.eval_token(opts.count)
+			if not isinstance(opts.count, int):
+				self.print_warning('Command Error: recv_count must specify a valid count')
+				return False
+		elif command == 'recv_size':
+			opts.size = conversion.eval_token(opts.size)
+			if not isinstance(opts.size, int):
+				self.print_warning('Command Error: recv_size must specify a valid size')
+				return False
+		elif command == 'recv_time':
+			opts.time = conversion.eval_token(opts.time)
+			if not isinstance(opts.time, (float, int)):
+				self.print_warning('Command Error: recv_time must specify a valid timeout')
+				return False
+		return True
+
+	def _parse_sleep(self, arguments):
+		# get the duration for the sleep command, or None if it is invalid
+		duration = ast.literal_eval(arguments[0]) if len(arguments) == 1 else None
+		if not isinstance(duration, (float, int)):
+			self.print_warning('Command Error: sleep must specify a valid duration')
+			return None
+		return duration
+
+	def _get_command(self, line):
+		# get the method, name and arguments of the command on line, or None if
+		# there is nothing to execute
+		if commands.is_comment(line):
+			return None
+		try:
+			command, arguments = commands.split_line(line)
+		except ValueError as error:
+			# such as a missing closing quote
+			self._print_exception(error)
+			return None
+		method = getattr(self, 'do_' + command, None)
+		if method is None:
+			self.print_error('Unknown command: ' + command)
+			return None
+		return method, command, arguments
+
+	def _print(self, prefix, prefix_raw, msg, end):
+		self.stdout.write((prefix if self.colors else prefix_raw) + msg + end)
+
+	def _print_exception(self, error):
+		# errors are reported and execution continues with the next command
+		self.last_error = error
+		self.print_error("{0}: {1}".format(error.__class__.__name__, getattr(error, 'message', None) or error))
+
+	def postcmd(self, stop, line):
+		if stop:
+			return True
+		if not self.connection.connected and not self._connection_closed:
+			self._connection_closed = True
+			self.print_error('The remote end has closed the connection')
+			return self.exit_on_close
+		return False
+
+	def _report_statistics(self, opts):
+		# the body of the stats command, returning whether or not execution
+		# should stop, the driver's counters are always available
+		counters = self.connection.get_statistics()
+		for name, value in sorted(counters.items()):
+			self.print_status("Connection {0}: {1:,}".format(name, value))
+		if self.statistics is None:
+			self.print_warning('Statistics are not being collected, enable them with: set collect_stats true')
+			return False
+		if opts.json:
+			data = self.statistics.to_dict()
+			data['connection'] = counters
+			try:
+				with open(opts.json, 'w') as file_h:
+					json.dump(data, file_h, indent=2)
+			except OSError as error:
+				self.print_error("Failed to write the statistics: {0}".format(error))
+				return False
+			self.print_status('Wrote the statistics to ' + opts.json)
+		else:
+			self.statistics.report(self.stdout)
+		if opts.reset:
+			self._stop_statistics()
+			self._start_statistics(instrumentation.SessionStatistics())
+		return False
+
+	def _set_setting(self, arguments):
+		# apply a set command, returning whether or not execution should stop
+		if not arguments:
+			for name in sorted(self.settable_types):
+				self.print_status("{0}: {1!r}".format(name, getattr(self, name)))
+			return False
+		if len(arguments) != 2:
+			self.print_warning('Command Error: set must specify a name and a value')
+			return False
+		name, value = arguments
+		type_ = self.settable_types.get(name)
+		if type_ is None:
+			self.print_warning('Command Error: unknown setting: ' + name)
+			return False
+		try:
+			value = utilities.bool_type(value) if type_ is bool else type_(value)
+		except (TypeError, ValueError) as error:
+			self.print_warning('Command Error: ' + str(error))
+			return False
+		choices = setting_choices(name)
+		if choices is not None and value not in choices:
+			self.print_error("Invalid value: {0!r} for option: {1}".format(value, name))
+			return False
+		old_value = getattr(self, name)
+		try:
+			setattr(self, name, value)
+		except OSError as error:
+			self.print_error("Failed to set {0}: {1}".format(name, error))
+			return False
+		if not self.quiet:
+			self.stdout.write("{0} - was: {1}\nnow: {2}\n".format(name, old_value, value))
+		return False
+
+	def decode(self, string, encoding=None):
+		username, _, password = self.connection.url.userinfo.partition(':')
+		variables = {
+			'url.host': self.connection.url.host,
+			'url.password': password,
+			'url.port': str(self.connection.url.port or ''),
+			'url.scheme': self.connection.url.scheme,
+			'url.username': username,
+		}
+		encoding = encoding or self.encoding
+		string = conversion.expand(string, variables=variables, encoding=encoding)
+		return conversion.decode(string, encoding=encoding)
+
+	def print_error(self, msg, end='\n'):
+		self._print(color.PREFIX_ERROR, color.PREFIX_ERROR_RAW, msg, end)
+
+	def print_good(self, msg, end='\n'):
+		self._print(color.PREFIX_GOOD, color.PREFIX_GOOD_RAW, msg, end)
+
+	def print_status(self, msg, end='\n'):
+		self._print(color.PREFIX_STATUS, color.PREFIX_STATUS_RAW, msg, end)
+
+	def print_warning(self, msg, end='\n'):
+		self._print(color.PREFIX_WARNING, color.PREFIX_WARNING_RAW, msg, end)
+
+class SyncEngineBase(EngineBase):
+	"""
+	The commands shared by the engines which run over a synchronous
+	:py:class:`~protocon.connection_driver.ConnectionDriver`, the interactive
+	:py:class:`~protocon.engine.Engine` and the
+	:py:class:`~protocon.headless.HeadlessEngine`.
+	"""
+	@classmethod
+	def from_url(cls, url, plugins=None, pool_size=None, **kwargs):
+		if plugins is None:
+			plugins = plugin_manager.PluginManager()
+		elif not isinstance(plugins, plugin_manager.PluginManager):
+			raise TypeError('plugins must be an instance of PluginManager')
+
+		if isinstance(url, str):
+			url = hyperlink.URL.from_text(url)
+		driver_schemes = plugins.connection_driver_schemes
+		scheme_count = sum([len(schemes) for schemes in driver_schemes.values()])
+		color.print_status("Loaded {:,} connection drivers, providing {:,} URL schemes".format(len(driver_schemes), scheme_count))
+		if plugins.transcoder_names:
+			color.print_status("Loaded {0:,} transcode drivers".format(len(plugins.transcoder_names)))
+		driver = plugins.get_connection_driver(url.scheme)
+		if driver is None:
+			raise errors.ProtoconDriverError('no connection driver for scheme: ' + url.scheme)
+		if not pool_size:
+			return cls(driver(url), plugins=plugins, **kwargs)
+		connection_pool = pool.ConnectionPool(functools.partial(driver, url), pool_size)
+		try:
+			return cls(connection_pool.get(), plugins=plugins, pool=connection_pool, **kwargs)
+		except BaseException:
+			connection_pool.close()
+			raise
+
+	def _close_session(self):
+		self._stop_capture()
+		if self.pool is not None:
+			self.pool.close()
+
+	def _execute(self, operation):
+		opts = argparse.Namespace(**operation.arguments)
+		started = self._start_command()
+		try:
+			stop = getattr(self, '_execute_' + operation.command)(opts)
+		except Exception as error:
+			self._print_exception(error)
+			stop = False
+		self._finish_command(operation.command, started)
+		return self.postcmd(stop, operation.line)
+
+	def _execute_recv_count(self, opts):
+		self._pre_recv()
+		self._post_recv_count(self.connection.recv_count(opts.count, timeout=opts.timeout), opts)
+		return False
+
+	def _execute_recv_size(self, opts):
+		self._pre_recv(opts)
+		self._post_recv(self.connection.recv_size(opts.size, timeout=opts.timeout), opts)
+		return False
+
+	def _execute_recv_time(self, opts):
+		self._pre_recv(opts)
+		self._post_recv(self.connection.recv_timeout(opts.time), opts)
+		return False
+
+	def _execute_recv_until(self, opts):
+		self._pre_recv(opts)
+		self._post_recv_until(self.connection.recv_until(opts.data, timeout=opts.timeout), opts)
+		return False
+
+	def _execute_replay(self, opts):
+		for action, value in self._replay_actions(opts):
+			if action == 'recv':
+				self._pre_recv()
+				self._post_replay_recv(self.connection.recv_size(value, timeout=opts.timeout), value)
+			elif action == 'sleep':
+				time.sleep(value)
+			else:
+				self.connection.send(value)
+				self._post_send(value)
+		return False
+
+	def _execute_send_file(self, opts):
+		with self._prepare_send_file(opts) as region:
+			if region is None:
+				return False
+			file_h, data, checksum = region
+			if len(data):
+				self.connection.send_file(file_h, opts.offset, len(data))
+			self._post_send(data, checksum=checksum)
+		return False
+
+	def _execute_send(self, opts):
+		data, messages = self._prepare_send(opts)
+		if messages is None:
+			self.connection.send(data)
+		else:
+			self.connection.send_batch(messages)
+		self._post_send(data, messages=messages)
+		return False
+
+	def _open_connection(self):
+		try:
+			if self.pool is None:
+				self.connection.open()
+				self._set_connection(self.connection)
+			else:
+				self._set_connection(self.pool.get())
+		except OSError as error:
+			self.last_error = error
+			self.print_error("Failed to open the connection: {0}".format(error))
+			return
+		self.print_good('Successfully opened connection URL: ' + self.connection.url.to_text())
+
+	def _run_operation(self, operation):
+		if operation.arguments is None:
+			return self.onecmd(operation.line)
+		return self._execute(operation)
+
+	def run_script(self, path):
+		"""
+		Run the protocon script at *path* from its compiled form (see
+		:py:func:`protocon.script.load`). Lines which could not be compiled are
+		executed as regular commands.
+
+		:param str path: The path to the script to run.
+		:return: Whether or not execution should stop.
+		:rtype: bool
+		"""
+		try:
+			operations = script.load(path, encoding=self.encoding)
+		except OSError as error:
+			self.last_error = error
+			self.print_error("Problem accessing script from '{0}': {1}".format(path, error))
+			return False
+		for operation in operations:
+			if self._run_operation(operation):
+				return True
+		return False
+
+	def do_close(self, arguments):
+		"""Close the connection."""
+		self.connection.close()
+		self._connection_closed = True
+		self.print_status('The connection has been closed')
+		return self.exit_on_close
+
+	def do_open(self, arguments):
+		"""Open the connection if it has been closed."""
+		if self.connection.connected:
+			self.print_warning('The connection is already open')
+			return False
+		self._open_connection()
+		return False
+
+	def do_reconnect(self, arguments):
+		"""Close the connection and open a new one."""
+		if self.connection.connected:
+			self.connection.close()
+		self._connection_closed = True
+		self._open_connection()
+		return False
+
+	@with_argparser(commands.recv_count_argparser())
+	def do_recv_count(self, opts):
+		"""Receive the specified number of messages, such as datagrams, from the endpoint."""
+		if not self._prepare_arguments('recv_count', opts):
+			return False
+		return self._execute_recv_count(opts)
+
+	@with_argparser(commands.recv_size_argparser())
+	def do_recv_size(self, opts):
+		"""Receive the specified number of bytes from the endpoint."""
+		if not self._prepare_arguments('recv_size', opts):
+			return False
+		return self._execute_recv_size(opts)
+
+	@with_argparser(commands.recv_time_argparser())
+	def do_recv_time(self, opts):
+		"""Receive data for the specified amount of seconds."""
+		if not self._prepare_arguments('recv_time', opts):
+			return False
+		return self._execute_recv_time(opts)
+
+	@with_argparser(commands.recv_until_argparser())
+	def do_recv_until(self, opts):
+		"""Receive data until one of the specified terminators is received."""
+		if not self._prepare_arguments('recv_until', opts):
+			return False
+		return self._execute_recv_until(opts)
+
+	@with_argparser(commands.replay_argparser())
+	def do_replay(self, opts):
+		"""Replay the client side of the first conversation in a capture file."""
+		try:
+			return self._execute_replay(opts)
+		except OSError as error:
+			self.print_error("Failed to read the capture file: {0}".format(error))
+		return False
+
+	@with_argparser(commands.send_file_argparser())
+	def do_send_file(self, opts):
+		"""Send the contents of a file without loading it into memory."""
+		return self._execute_send_file(opts)
+
+	@with_argparser(commands.send_argparser())
+	def do_send(self, opts):
+		"""Send the specified data."""
+		self._prepare_arguments('send', opts)
+		return self._execute_send(opts)
+
+	@with_argparser(commands.stats_argparser())
+	def do_stats(self, opts):
+		"""Print the timing statistics of the commands and connection operations."""
+		return self._report_statistics(opts)
+
+	def do_sleep(self, arguments):
+		"""Sleep for the specified duration in seconds.\nUsage:  sleep <time>"""
+		duration = self._parse_sleep(arguments)
+		if duration is not None:
+			time.sleep(duration)
+		return False
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/headless.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import datetime
+
+from . import __version__
+from . import engine_base
+
+class HeadlessEngine(engine_base.SyncEngineBase):
+	"""
+	A non-interactive counterpart to :py:class:`~protocon.engine.Engine` which
+	runs protocon scripts over a
+	:py:class:`~protocon.connection_driver.ConnectionDriver` with a lightweight
+	command dispatcher. Unlike the interactive engine, it does not import
+	:py:mod:`cmd2` which keeps the start up time of scripted runs short.
+	"""
+	def __init__(self, connection, plugins=None, quiet=False, colors=True, stdout=None, pool=None, statistics=None, metrics=None):
+		super(HeadlessEngine, self).__init__(connection, plugins=plugins, quiet=quiet, colors=colors, stdout=stdout, pool=pool, statistics=statistics, metrics=metrics)
+		self.print_good("Initialized protocon engine v{0} at {1:%Y-%m-%d %H:%M:%S}".format(__version__, datetime.datetime.now()))
+		if not self.connection.connected:
+			self.connection.open()
+		self.print_good('Successfully opened connection URL: ' + self.connection.url.to_text())
+
+	def entry(self, scripts=(), lines=()):
+		"""
+		Run each of the protocon scripts specified in *scripts* followed by each
+		of the command *lines*, such as those piped to stdin, until one of them
+		stops execution.
+		"""
+		try:
+			for path in scripts:
+				if self.run_script(path):
+					return
+			for line in lines:
+				if self.onecmd(line):
+					return
+		finally:
+			self._close_session()
+
+	def onecmd(self, line):
+		"""
+		Execute a single command line.
+
+		:param str line: The command line to execute.
+		:return: Whether or not execution should stop.
+		:rtype: bool
+		"""
+		command = self._get_command(line)
+		if command is None:
+			return False
+		method, name, arguments = command
+		started = self._start_command()
+		try:
+			stop = method(arguments)
+		except Exception as error:
+			self._print_exception(error)
+			stop = False
+		self._finish_command(name, started)
+		return self.postcmd(stop, line)
+
+	def do_exit(self, arguments):
+		"""Exit the protocon engine."""
+		return True
+	do_quit = do_exit
+
+	def do_set(self, arguments):
+		"""Set a settable parameter.\nUsage:  set <name> <value>"""
+		return self._set_setting(arguments)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/histogram.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import collections
+
+class Histogram(object):
+	"""
+	A compact, log-linear histogram for recording durations. Values are
+	stored as counts in buckets whose width grows with the magnitude of the
+	value so the relative error of each reported percentile is bounded by
+	``1 / 2 ** sub_bucket_bits`` regardless of the number of values recorded.
+	Durations are recorded in seconds and tracked with microsecond resolution.
+	"""
+	__slots__ = ('count', 'max', 'min', 'sub_bucket_bits', 'total', '_buckets')
+	def __init__(self, sub_bucket_bits=7):
+		self.sub_bucket_bits = sub_bucket_bits
+		self.count = 0
+		self.max = None
+		self.min = None
+		self.total = 0.0
+		self._buckets = collections.Counter()
+
+	def __repr__(self):
+		return "<{0} count={1} >".format(self.__class__.__name__, self.count)
+
+	def _index(self, value):
+		magnitude = value.bit_length() - self.sub_bucket_bits - 1
+		if magnitude <= 0:
+			return value
+		return (magnitude << self.sub_bucket_bits) + (value >> magnitude)
+
+	def _upper_bound(self, index):
+		sub_buckets = 1 << self.sub_bucket_bits
+		if index < (sub_buckets << 1):
+			return index
+		magnitude = (index >> self.sub_bucket_bits) - 1
+		sub_bucket = index - (magnitude << self.sub_bucket_bits)
+		return ((sub_bucket + 1) << magnitude) - 1
+
+	@property
+	def mean(self):
+		return (self.total / self.count) if self.count else None
+
+	def merge(self, other):
+		"""Add all of the values that were recorded in *other* to this histogram."""
+		if other.sub_bucket_bits != self.sub_bucket_bits:
+			raise ValueError('can not merge histograms with different precisions')
+		if not other.count:
+			return
+		self._buckets.update(other._buckets)
+		self.count += other.count
+		self.total += other.total
+		self.max = other.max if self.max is None else max(self.max, other.max)
+		self.min = other.min if self.min is None else min(self.min, other.min)
+
+	def percentile(self, percentile):
+		"""
+		Get the value at the specified *percentile* (between 0 and 100) of the
+		recorded values.
+
+		:param float percentile: The percentile to get.
+		:return: The value in seconds, or None if nothing has been recorded.
+		:rtype: float
+		"""
+		if not self.count:
+			return None
+		if percentile >= 100:
+			return self.max
+		threshold = max(self.count * percentile / 100.0, 1)
+		seen = 0
+		for index in sorted(self._buckets):
+			seen += self._buckets[index]
+			if seen >= threshold:
+				return min(self._upper_bound(index) / 1000000.0, self.max)
+		return self.max
+
+	def record(self, value):
+		"""
+		Record a duration.
+
+		:param float value: The duration in seconds.
+		"""
+		value = max(value, 0.0)
+		self._buckets[self._index(int(value * 1000000))] += 1
+		self.count += 1
+		self.total += value
+		if self.max is None or value > self.max:
+			self.max = value
+		if self.min is None or value < self.min:
+			self.min = value
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/history.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import collections
+import itertools
+import mmap
+import tempfile
+import time
+
+IORecord = collections.namedtuple('IORecord', ('direction', 'timestamp', 'crc', 'offset', 'size'))
+IORecord.__doc__ = """
+A single entry in an :py:class:`.IOHistory`. The data is not stored in the
+record itself, it is retrieved from the history using :py:meth:`.IOHistory.get_data`.
+"""
+
+class _DirectionView(object):
+	# a read-only sequence of the data in one direction which is compatible
+	# with the deques that were previously used for the history
+	__slots__ = ('_history', '_direction')
+	def __init__(self, history, direction):
+		self._history = history
+		self._direction = direction
+
+	def __getitem__(self, index):
+		return self._history.get_data(self.records()[index])
+
+	def __iter__(self):
+		for record in self.records():
+			yield self._history.get_data(record)
+
+	def __len__(self):
+		return len(self.records())
+
+	def records(self):
+		return [record for record in self._history if record.direction == self._direction]
+
+class IOHistory(object):
+	"""
+	A record of the data that has been sent and received. The data of every
+	entry is stored in a single backing buffer and the oldest entries are
+	evicted once either *max_bytes* or *max_entries* is exceeded. The most
+	recent entry is always kept unless it is larger than *max_bytes* on its
+	own. When *spill* is enabled, evicted data is
+	written to a temporary memory-mapped file instead so the full history
+	remains available without being held in memory.
+	"""
+	def __init__(self, max_bytes=0, max_entries=0, spill=False):
+		"""
+		:param int max_bytes: The maximum number of bytes to keep in memory, 0 for no limit.
+		:param int max_entries: The maximum number of entries to keep in memory, 0 for no limit.
+		:param bool spill: Whether to spill evicted data to disk.
+		"""
+		self.rx = _DirectionView(self, 'rx')
+		self.tx = _DirectionView(self, 'tx')
+		self.max_bytes = max_bytes
+		self.max_entries = max_entries
+		self._buffer = bytearray()
+		# the offset of the first byte in the buffer, all data before it is
+		# either in the spill file or has been discarded
+		self._base = 0
+		self._resident = collections.deque()
+		self._spilled = collections.deque()
+		self._spill_file = None
+		self._spill_start = 0
+		self._spill_map = None
+		self.spill = spill
+
+	def __iter__(self):
+		return itertools.chain(self._spilled, self._resident)
+
+	def __len__(self):
+		return len(self._spilled) + len(self._resident)
+
+	def __repr__(self):
+		return "<{0} entries={1} memory_bytes={2} spilled_bytes={3} >".format(self.__class__.__name__, len(self), len(self._buffer), self.spilled_bytes)
+
+	def append(self, direction, data, crc=None, timestamp=None):
+		"""
+		Add an entry to the history, evicting the oldest entries as necessary.
+
+		:param str direction: The direction of the data, either ``rx`` or ``tx``.
+		:param bytes data: The data that was sent or received.
+		:param str crc: The formatted CRC of the data, if one was calculated.
+		:param float timestamp: When the data was sent or received in seconds since the epoch, defaults to now.
+		:return: The new record.
+		:rtype: :py:class:`.IORecord`
+		"""
+		record = IORecord(direction, time.time() if timestamp is None else timestamp, crc, self._base + len(self._buffer), len(data))
+		if self.max_bytes and len(data) > self.max_bytes:
+			# data that can never be held in memory bypasses the buffer and is
+			# evicted immediately, this avoids copying large memory-mapped files
+			while self._resident:
+				self._evict_oldest()
+			if self._spill_file is not None:
+				self._spill_file.write(data)
+				self._spilled.append(record)
+			self._base += len(data)
+			return record
+		self._buffer += data
+		self._resident.append(record)
+		self._evict()
+		return record
+
+	def clear(self):
+		"""Remove all entries, including any that have been spilled."""
+		self._resident.clear()
+		self._spilled.clear()
+		self._buffer.clear()
+		self._base = 0
+		if self._spill_file is not None:
+			self._close_spill()
+			self._open_spill()
+
+	def close(self):
+		"""Release the resources used for spilling data to disk."""
+		if self._spill_file is not None:
+			self._close_spill()
+
+	def get_data(self, record):
+		"""
+		Get the data for the specified record.
+
+		:param record: The record to retrieve the data for.
+		:type record: :py:class:`.IORecord`
+		:rtype: bytes
+		"""
+		if not record.size:
+			return b''
+		if record.offset >= self._base:
+			position = record.offset - self._base
+			return bytes(self._buffer[position:position + record.size])
+		if self._spill_file is None or record.offset < self._spill_start:
+			raise KeyError('the data for this record has been evicted')
+		end = record.offset - self._spill_start + record.size
+		if self._spill_map is None or len(self._spill_map) < end:
+			if self._spill_map is not None:
+				self._spill_map.close()
+			self._spill_file.flush()
+			self._spill_map = mmap.mmap(self._spill_file.fileno(), 0, access=mmap.ACCESS_READ)
+		return self._spill_map[record.offset - self._spill_start:end]
+
+	@property
+	def memory_bytes(self):
+		"""The number of bytes of data that are held in memory."""
+		return len(self._buffer)
+
+	@property
+	def spill(self):
+		"""Whether or not evicted data is spilled to disk."""
+		return self._spill_file is not None
+
+	@spill.setter
+	def spill(self, value):
+		if value and self._spill_file is None:
+			self._open_spill()
+		elif not value and self._spill_file is not None:
+			self._close_spill()
+			self._spilled.clear()
+
+	@property
+	def spilled_bytes(self):
+		"""The number of bytes of data that have been spilled to disk."""
+		return 0 if self._spill_file is None else self._base - self._spill_start
+
+	def _close_spill(self):
+		if self._spill_map is not None:
+			self._spill_map.close()
+			self._spill_map = None
+		self._spill_file.close()
+		self._spill_file = None
+
+	def _evict(self):
+		resident = self._resident
+		while len(resident) > 1:
+			if not ((self.max_bytes and len(self._buffer) > self.max_bytes) or (self.max_entries and len(resident) > self.max_entries)):
+				break
+			self._evict_oldest()
+
+	def _evict_oldest(self):
+		record = self._resident.popleft()
+		if self._spill_file is not None:
+			self._spill_file.write(self._buffer[:record.size])
+			self._spilled.append(record)
+		del self._buffer[:record.size]
+		self._base += record.size
+
+	def _open_spill(self):
+		self._spill_file = tempfile.TemporaryFile(prefix='protocon-history-')
+		self._spill_start = self._base
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/instrumentation.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import collections
+import functools
+import os
+import sys
+import time
+import weakref
+
+from . import connection_driver
+from . import histogram
+
+RECV_OPERATIONS = ('recv_count', 'recv_size', 'recv_timeout', 'recv_until')
+SEND_OPERATIONS = ('send', 'send_batch', 'send_file')
+DRIVER_OPERATIONS = ('open', 'close') + SEND_OPERATIONS + RECV_OPERATIONS
+ENGINE_OPERATIONS = ('_crc_string', '_print_hexdump')
+# the low level read methods that are wrapped to find the time to first byte
+_READ_METHODS = ('_recv_chunk', '_recv_into', '_recv_messages')
+
+def _summarize(latencies):
+	if not latencies.count:
+		return None
+	return {
+		'total': latencies.total,
+		'mean': latencies.mean,
+		'p50': latencies.percentile(50),
+		'p90': latencies.percentile(90),
+		'p99': latencies.percentile(99),
+		'max': latencies.max,
+	}
+
+def _milliseconds(value):
+	return '-' if value is None else "{0:.3f}".format(value * 1000)
+
+def _transferred(connection, operation, args, kwargs, result):
+	# get the number of bytes that a driver operation sent or received
+	if operation == 'send':
+		return len(args[0])
+	if operation == 'send_batch':
+		return sum(len(message) for message in args[0])
+	if operation == 'send_file':
+		file_h = args[0]
+		offset = args[1] if len(args) > 1 else kwargs.get('offset', 0)
+		length = args[2] if len(args) > 2 else kwargs.get('length')
+		if length is None:
+			length = os.fstat(file_h.fileno()).st_size - offset
+		return length
+	if operation == 'recv_count':
+		return sum(len(message) for message in result)
+	if operation in RECV_OPERATIONS:
+		# data that was passed to the receive sink is not returned
+		return len(result) + (connection._recv_flushed if connection.recv_sink is not None else 0)
+	return 0
+
+class OperationStatistics(object):
+	"""The number of times an operation was performed, the bytes it transferred and its latency."""
+	__slots__ = ('bytes', 'count', 'errors', 'first_byte', 'latency')
+	def __init__(self):
+		self.bytes = 0
+		self.count = 0
+		self.errors = 0
+		self.first_byte = histogram.Histogram()
+		self.latency = histogram.Histogram()
+
+	def to_dict(self):
+		return {
+			'count': self.count,
+			'errors': self.errors,
+			'bytes': self.bytes,
+			'latency': _summarize(self.latency),
+			'first_byte': _summarize(self.first_byte),
+		}
+
+class SessionStatistics(object):
+	"""
+	Timing statistics for the commands executed by an engine, the operations
+	performed by its connection driver and the time spent calculating CRCs
+	and printing hex dumps. Drivers and engines are instrumented by replacing
+	the methods of the instance with wrappers, so nothing is measured (and
+	nothing is slowed down) until :py:meth:`.instrument_connection` and
+	:py:meth:`.instrument_engine` are called.
+	"""
+	def __init__(self):
+		self.commands = collections.OrderedDict()
+		self.driver = collections.OrderedDict()
+		self.engine = collections.OrderedDict()
+		self.started = time.monotonic()
+		self._instrumented = weakref.WeakSet()
+
+	@staticmethod
+	def _performed(table):
+		return [(name, statistics) for name, statistics in table.items() if statistics.count or statistics.errors]
+
+	def _get(self, table, name):
+		statistics = table.get(name)
+		if statistics is None:
+			statistics = table[name] = OperationStatistics()
+		return statistics
+
+	def record_command(self, name, elapsed):
+		"""
+		Record the execution of an engine command.
+
+		:param str name: The name of the command.
+		:param float elapsed: The time the command took in seconds.
+		"""
+		statistics = self._get(self.commands, name)
+		statistics.count += 1
+		statistics.latency.record(elapsed)
+
+	def _wrap_operation(self, connection, name, method, first_byte, active):
+		statistics = self._get(self.driver, name)
+		@functools.wraps(method)
+		def wrapper(*args, **kwargs):
+			if active[0]:
+				# operations such as send_batch and send_file may be implemented
+				# with send, only the outermost operation is recorded
+				return method(*args, **kwargs)
+			active[0] = True
+			first_byte[0] = None
+			started = time.perf_counter()
+			try:
+				result = method(*args, **kwargs)
+			except BaseException:
+				statistics.errors += 1
+				raise
+			finally:
+				active[0] = False
+			self._record_operation(statistics, connection, name, args, kwargs, result, started, first_byte[0])
+			return result
+		return wrapper
+
+	def _wrap_async_operation(self, connection, name, method, first_byte, active):
+		statistics = self._get(self.driver, name)
+		@functools.wraps(method)
+		async def wrapper(*args, **kwargs):
+			if active[0]:
+				# operations such as send_batch and send_file may be implemented
+				# with send, only the outermost operation is recorded
+				return await method(*args, **kwargs)
+			active[0] = True
+			first_byte[0] = None
+			started = time.perf_counter()
+			try:
+				result = await method(*args, **kwargs)
+			except BaseException:
+				statistics.errors += 1
+				raise
+			finally:
+				active[0] = False
+			self._record_operation(statistics, connection, name, args, kwargs, result, started, first_byte[0])
+			return result
+		return wrapper
+
+	def _record_operation(self, statistics, connection, name, args, kwargs, result, started, first_byte):
+		finished = time.perf_counter()
+		size = _transferred(connection, name, args, kwargs, result)
+		statistics.count += 1
+		statistics.bytes += size
+		statistics.latency.record(finished - started)
+		if name in RECV_OPERATIONS and size:
+			# data that was already buffered arrived immediately
+			statistics.first_byte.record(0.0 if first_byte is None else first_byte - started)
+
+	def instrument_connection(self, connection):
+		"""
+		Record the time taken by each operation of *connection* along with the
+		number of bytes transferred and, for receive operations, the time until
+		the first byte arrived.
+
+		:param connection: The connection driver to instrument.
+		:type connection: :py:class:`~protocon.connection_driver.ConnectionDriver`
+		"""
+		if connection in self._instrumented:
+			return
+		self._instrumented.add(connection)
+		first_byte = [None]
+		active = [False]
+		is_async = isinstance(connection, connection_driver.AsyncConnectionDriver)
+		wrap = self._wrap_async_operation if is_async else self._wrap_operation
+		for name in DRIVER_OPERATIONS:
+			method = getattr(connection, name, None)
+			if method is not None:
+				setattr(connection, name, wrap(connection, name, method, first_byte, active))
+		for name in _READ_METHODS:
+			method = getattr(connection, name, None)
+			if method is None:
+				continue
+			if is_async:
+				setattr(connection, name, _async_first_byte_marker(method, first_byte))
+			else:
+				setattr(connection, name, _first_byte_marker(method, first_byte))
+
+	def instrument_engine(self, engine):
+		"""
+		Record the time *engine* spends calculating CRCs and printing hex
+		dumps.
+
+		:param engine: The engine to instrument.
+		"""
+		if engine in self._instrumented:
+			return
+		self._instrumented.add(engine)
+		for name in ENGINE_OPERATIONS:
+			statistics = self._get(self.engine, name.lstrip('_'))
+			setattr(engine, name, _wrap_engine_method(getattr(engine, name), statistics))
+
+	def uninstrument(self, instance):
+		"""Remove the instrumentation from a connection driver or engine."""
+		for name in DRIVER_OPERATIONS + ENGINE_OPERATIONS + _READ_METHODS:
+			instance.__dict__.pop(name, None)
+		self._instrumented.discard(instance)
+
+	def report(self, stream=None):
+		"""Write a human readable report of the statistics to *stream*."""
+		stream = stream or sys.stdout
+		stream.write("Session:     {0:,.3f} seconds\n".format(time.monotonic() - self.started))
+		for title, table in (('command', self.commands), ('driver', self.driver), ('engine', self.engine)):
+			rows = self._performed(table)
+			if not rows:
+				continue
+			stream.write('\n')
+			stream.write("{0:<16} {1:>8} {2:>6} {3:>12} {4:>11} {5:>9} {6:>9} {7:>9} {8:>9}\n".format(
+				title, 'count', 'errors', 'bytes', 'total (ms)', 'p50', 'p99', 'max', 'ttfb p50'
+			))
+			for name, statistics in rows:
+				latency = statistics.latency
+				stream.write("{0:<16} {1:>8,} {2:>6,} {3:>12,} {4:>11} {5:>9} {6:>9} {7:>9} {8:>9}\n".format(
+					name,
+					statistics.count,
+					statistics.errors,
+					statistics.bytes,
+					_milliseconds(latency.total if latency.count else None),
+					_milliseconds(latency.percentile(50)),
+					_milliseconds(latency.percentile(99)),
+					_milliseconds(latency.max),
+					_milliseconds(statistics.first_byte.percentile(50))
+				))
+		stream.flush()
+
+	def to_dict(self):
+		return {
+			'duration': time.monotonic() - self.started,
+			'commands': {name: statistics.to_dict() for name, statistics in self._performed(self.commands)},
+			'driver': {name: statistics.to_dict() for name, statistics in self._performed(self.driver)},
+			'engine': {name: statistics.to_dict() for name, statistics in self._performed(self.engine)},
+		}
+
+def _first_byte_marker(method, first_byte):
+	@functools.wraps(method)
+	def wrapper(*args, **kwargs):
+		result = method(*args, **kwargs)
+		if first_byte[0] is None and len(result):
+			first_byte[0] = time.perf_counter()
+		return result
+	return wrapper
+
+def _async_first_byte_marker(method, first_byte):
+	@functools.wraps(method)
+	async def wrapper(*args, **kwargs):
+		result = await method(*args, **kwargs)
+		if first_byte[0] is None and len(result):
+			first_byte[0] = time.perf_counter()
+		return result
+	return wrapper
+
+def _wrap_engine_method(method, statistics):
+	@functools.wraps(method)
+	def wrapper(data, *args, **kwargs):
+		started = time.perf_counter()
+		result = method(data, *args, **kwargs)
+		statistics.count += 1
+		statistics.bytes += len(data)
+		statistics.latency.record(time.perf_counter() - started)
+		return result
+	return wrapper
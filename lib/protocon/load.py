@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/load.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import asyncio
+import collections
+import functools
+import os
+import sys
+import time
+
+import hyperlink
+
+from . import async_engine
+from . import errors
+from . import histogram
+from . import plugin_manager
+from . import pool
+
+class LoadStatistics(object):
+	"""
+	The aggregated results of a load generation run. Latencies are kept in
+	:py:class:`~protocon.histogram.Histogram` instances.
+	"""
+	def __init__(self):
+		self.connect = histogram.Histogram()
+		self.exchanges = collections.OrderedDict()
+		self.errors = collections.Counter()
+		self.iterations = 0
+		# receive operations that timed out, these are not included in the
+		# exchange latencies
+		self.timeouts = 0
+		self.rx_bytes = 0
+		self.tx_bytes = 0
+		self.elapsed = 0.0
+
+	@property
+	def requests(self):
+		return sum(latencies.count for latencies in self.exchanges.values())
+
+	def exchange(self, key):
+		latencies = self.exchanges.get(key)
+		if latencies is None:
+			latencies = self.exchanges[key] = histogram.Histogram()
+		return latencies
+
+	def report(self, stream=None):
+		"""Write a human readable report of the statistics to *stream*."""
+		stream = stream or sys.stdout
+		elapsed = self.elapsed or float('inf')
+		total_bytes = self.rx_bytes + self.tx_bytes
+		stream.write("Iterations:  {0:,} ({1:,.2f}/second)\n".format(self.iterations, self.iterations / elapsed))
+		stream.write("Requests:    {0:,} ({1:,.2f}/second)\n".format(self.requests, self.requests / elapsed))
+		stream.write("Timeouts:    {0:,}\n".format(self.timeouts))
+		stream.write("Bytes:       {0:,} ({1:,.2f}/second, rx: {2:,} tx: {3:,})\n".format(total_bytes, total_bytes / elapsed, self.rx_bytes, self.tx_bytes))
+		stream.write("Duration:    {0:,.3f} seconds\n".format(self.elapsed))
+		if self.errors:
+			stream.write('Errors:\n')
+			for error, count in self.errors.most_common():
+				stream.write("  {0:>8,}  {1}\n".format(count, error))
+		stream.write('\n')
+		stream.write("{0:<40} {1:>9} {2:>10} {3:>10} {4:>10} {5:>10}\n".format('latency (ms)', 'count', 'p50', 'p90', 'p99', 'max'))
+		rows = [('connect', self.connect)]
+		rows.extend(self.exchanges.items())
+		for name, latencies in rows:
+			if len(name) > 40:
+				name = name[:37] + '...'
+			if not latencies.count:
+				stream.write("{0:<40} {1:>9,}\n".format(name, 0))
+				continue
+			stream.write("{0:<40} {1:>9,} {2:>10.3f} {3:>10.3f} {4:>10.3f} {5:>10.3f}\n".format(
+				name,
+				latencies.count,
+				latencies.percentile(50) * 1000,
+				latencies.percentile(90) * 1000,
+				latencies.percentile(99) * 1000,
+				latencies.max * 1000
+			))
+		stream.flush()
+
+class LoadEngine(async_engine.AsyncEngine):
+	"""
+	An :py:class:`~protocon.async_engine.AsyncEngine` which records the
+	latency of each ``send`` to ``recv_*`` exchange into a shared
+	:py:class:`.LoadStatistics` instance instead of printing and storing the
+	data. Receive operations that time out are counted instead of being
+	recorded as exchanges.
+	"""
+	def __init__(self, connection, load_statistics, **kwargs):
+		super(LoadEngine, self).__init__(connection, **kwargs)
+		self.load_statistics = load_statistics
+		self._command = None
+		self._command_index = 0
+		self._last_send = None
+
+	def _pre_recv(self, opts=None):
+		# nothing is printed so there is no need to calculate the CRC
+		pass
+
+	def _post_recv(self, data, opts=None, messages=None):
+		self.load_statistics.rx_bytes += len(data)
+		if self.metrics is not None:
+			self.metrics.record_recv(len(data), self.connection.recv_timed_out)
+		if self.connection.recv_timed_out:
+			# the latency would only measure the timeout
+			self.load_statistics.timeouts += 1
+		elif self._last_send is not None and data:
+			key = "#{0} {1}".format(self._command_index, self._command)
+			self.load_statistics.exchange(key).record(time.perf_counter() - self._last_send)
+		self._last_send = None
+
+	def _post_send(self, data, messages=None, checksum=None):
+		self.load_statistics.tx_bytes += len(data)
+		if self.metrics is not None:
+			self.metrics.record_send(len(data))
+		self._last_send = time.perf_counter()
+
+	def postcmd(self, stop, line):
+		# errors are reported by the engine, end the iteration at the first one
+		# so it is counted as failed
+		if self.last_error is not None:
+			return True
+		return super(LoadEngine, self).postcmd(stop, line)
+
+	def _start_exchange(self, line):
+		# exchanges are labeled with the position and line of the command that
+		# completes them
+		self._command = line.strip()
+		self._command_index += 1
+
+	async def _execute(self, operation):
+		self._start_exchange(operation.line)
+		return await super(LoadEngine, self)._execute(operation)
+
+	async def onecmd(self, line):
+		self._start_exchange(line)
+		return await super(LoadEngine, self).onecmd(line)
+
+	async def iterate(self, scripts):
+		"""
+		Run one iteration of *scripts*, opening the connection (or taking one
+		from the pool) first if it is not already open. The first error that
+		occurs ends the iteration and is raised.
+		"""
+		if not self.connection.connected:
+			started = time.perf_counter()
+			if self.pool is None:
+				await self.connection.open()
+				self._set_connection(self.connection)
+			else:
+				self._set_connection(await self.pool.get())
+			self.load_statistics.connect.record(time.perf_counter() - started)
+		self._command_index = 0
+		self._last_send = None
+		self.last_error = None
+		for script in scripts:
+			if await self.run_script(script):
+				break
+		if self.last_error is not None:
+			raise self.last_error
+
+async def run_load(url, scripts, connections, duration=None, iterations=None, plugins=None, pool_size=None, metrics=None):
+	"""
+	Replay *scripts* against *url* in a loop over *connections* parallel
+	connections until either *duration* seconds have elapsed or a total of
+	*iterations* iterations have completed. The connection is reopened for the
+	next iteration whenever the scripts close it. When *pool_size* is
+	specified, that many connections are kept open in the background and
+	new connections are taken from the pool instead of being opened. When
+	*metrics* is specified, the engine of each connection updates it.
+
+	:param str url: The target URL.
+	:param tuple scripts: The paths of the scripts to run.
+	:param int connections: The number of parallel connections.
+	:param float duration: The maximum number of seconds to run for.
+	:param int iterations: The maximum number of iterations to run.
+	:param plugins: The plugins to load the connection driver from.
+	:type plugins: :py:class:`~protocon.plugin_manager.PluginManager`
+	:param int pool_size: The number of connections to keep open in the background.
+	:param metrics: The metrics to update.
+	:type metrics: :py:class:`~protocon.metrics.Metrics`
+	:rtype: :py:class:`.LoadStatistics`
+	"""
+	if connections < 1:
+		raise ValueError('connections must be at least 1')
+	if duration is None and iterations is None:
+		raise ValueError('either duration or iterations must be specified')
+	if plugins is None:
+		plugins = plugin_manager.PluginManager()
+	connection_pool = None
+	if pool_size:
+		if isinstance(url, str):
+			url = hyperlink.URL.from_text(url)
+		driver = plugins.get_async_connection_driver(url.scheme)
+		if driver is None:
+			raise errors.ProtoconDriverError('no asynchronous connection driver for scheme: ' + url.scheme)
+		connection_pool = pool.AsyncConnectionPool(functools.partial(driver, url), pool_size)
+	statistics = LoadStatistics()
+	deadline = None if duration is None else time.monotonic() + duration
+	remaining = [iterations]
+
+	def keep_going():
+		if deadline is not None and time.monotonic() >= deadline:
+			return False
+		if remaining[0] is not None:
+			if remaining[0] <= 0:
+				return False
+			remaining[0] -= 1
+		return True
+
+	with open(os.devnull, 'w') as devnull:
+		async def worker():
+			engine = LoadEngine.from_url(url, plugins=plugins, load_statistics=statistics, quiet=True, colors=False, stdout=devnull, pool=connection_pool, metrics=metrics)
+			engine.print_rx = False
+			engine.print_tx = False
+			try:
+				while keep_going():
+					try:
+						await engine.iterate(scripts)
+					except asyncio.CancelledError:
+						raise
+					except Exception as error:
+						# count any error so one failed iteration doesn't end the
+						# worker and the run
+						statistics.errors["{0}: {1}".format(error.__class__.__name__, getattr(error, 'message', None) or error)] += 1
+						if engine.connection.connected:
+							await engine.connection.close()
+					else:
+						statistics.iterations += 1
+			finally:
+				if engine.connection.connected:
+					await engine.connection.close()
+
+		started = time.monotonic()
+		tasks = [asyncio.ensure_future(worker()) for _ in range(connections)]
+		# iterations that are still in progress when the duration expires are
+		# cancelled and not counted
+		_, pending = await asyncio.wait(tasks, timeout=duration)
+		for task in pending:
+			task.cancel()
+		if pending:
+			await asyncio.wait(pending)
+		statistics.elapsed = time.monotonic() - started
+		if connection_pool is not None:
+			await connection_pool.close()
+	for task in tasks:
+		if not task.cancelled() and task.exception() is not None:
+			raise task.exception()
+	return statistics
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/matcher.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import collections
+import re
+
+class TerminatorMatcher(object):
+	"""
+	A streaming matcher which finds the first occurrence of one or more
+	terminators in a buffer that grows over time. Each call to
+	:py:meth:`.search` only scans the bytes that were appended since the
+	previous call. A single terminator is located with :py:meth:`bytes.find`
+	using an overlap of ``len(terminator) - 1`` bytes while multiple
+	terminators are located with an Aho-Corasick automaton.
+	"""
+	__slots__ = ('terminators', 'terminator', '_delta', '_output', '_scanned', '_skip', '_state')
+	def __init__(self, terminators):
+		if isinstance(terminators, (bytes, bytearray)):
+			terminators = (terminators,)
+		self.terminators = tuple(bytes(terminator) for terminator in terminators)
+		if not self.terminators or not all(self.terminators):
+			raise ValueError('terminators must be non-empty byte strings')
+		# the terminator which was matched, or None if no match has been found
+		self.terminator = None
+		self._scanned = 0
+		self._state = 0
+		self._delta = self._output = self._skip = None
+		if len(self.terminators) > 1:
+			self._build()
+
+	def _build(self):
+		goto = [{}]
+		output = [None]
+		for terminator in self.terminators:
+			state = 0
+			for byte in terminator:
+				next_state = goto[state].get(byte)
+				if next_state is None:
+					next_state = len(goto)
+					goto[state][byte] = next_state
+					goto.append({})
+					output.append(None)
+				state = next_state
+			if output[state] is None:
+				output[state] = terminator
+
+		# convert the trie into a deterministic automaton, the output of each
+		# state is the longest terminator that ends at it
+		delta = [None] * len(goto)
+		delta[0] = [goto[0].get(byte, 0) for byte in range(256)]
+		fail = [0] * len(goto)
+		queue = collections.deque(goto[0].values())
+		while queue:
+			state = queue.popleft()
+			if output[state] is None:
+				output[state] = output[fail[state]]
+			delta[state] = list(delta[fail[state]])
+			for byte, next_state in goto[state].items():
+				delta[state][byte] = next_state
+				fail[next_state] = delta[fail[state]][byte]
+				queue.append(next_state)
+		self._delta = delta
+		self._output = output
+		# while in the initial state, skip directly to the next byte that can
+		# start a terminator
+		first_bytes = sorted(set(terminator[0] for terminator in self.terminators))
+		self._skip = re.compile(b'[' + b''.join(re.escape(bytes((byte,))) for byte in first_bytes) + b']')
+
+	def discard(self, count):
+		"""
+		Account for *count* bytes that have been removed from the start of the
+		buffer. At least :py:attr:`.overlap` of the bytes that have been
+		searched must remain.
+
+		:param int count: The number of bytes that were removed.
+		"""
+		self._scanned -= count
+
+	@property
+	def overlap(self):
+		"""The number of searched bytes that must be kept in the buffer."""
+		return max(len(terminator) for terminator in self.terminators) - 1
+
+	def reset(self):
+		"""Reset the matcher so a new buffer can be searched."""
+		self.terminator = None
+		self._scanned = 0
+		self._state = 0
+
+	def search(self, data):
+		"""
+		Search the bytes of *data* that have not been scanned yet for a
+		terminator. *data* must contain the same bytes as the previous call with
+		any new data appended to the end.
+
+		:param data: The buffer to search.
+		:return: The offset of the end of the first terminator or None.
+		:rtype: int
+		"""
+		if self._delta is None:
+			terminator = self.terminators[0]
+			position = data.find(terminator, max(self._scanned - len(terminator) + 1, 0))
+			self._scanned = len(data)
+			if position == -1:
+				return None
+			self.terminator = terminator
+			return position + len(terminator)
+
+		delta = self._delta
+		output = self._output
+		state = self._state
+		position = self._scanned
+		length = len(data)
+		terminator = None
+		while position < length:
+			if state == 0:
+				match = self._skip.search(data, position)
+				if match is None:
+					position = length
+					break
+				position = match.start()
+			state = delta[state][data[position]]
+			position += 1
+			if output[state] is not None:
+				terminator = output[state]
+				state = 0
+				break
+		self._state = state
+		self._scanned = position
+		if terminator is None:
+			return None
+		self.terminator = terminator
+		return position
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/metrics.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import collections
+import json
+import os
+import threading
+import time
+import weakref
+
+from . import color
+from . import histogram
+
+FORMATS = ('jsonl', 'prometheus')
+QUANTILES = (0.5, 0.9, 0.99)
+
+def _escape_label(value):
+	return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(value):
+	if value is None:
+		return 'NaN'
+	return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metrics(object):
+	"""
+	Counters for long running sessions which are shared by any number of
+	engines, such as the engines of each client in server mode or each
+	connection in load mode. Engines update the counters as commands are
+	executed while a :py:class:`.MetricsWriter` periodically takes a
+	:py:meth:`.snapshot` of them from another thread.
+	"""
+	def __init__(self):
+		self.started = time.time()
+		self.commands = collections.OrderedDict()
+		self.reconnects = 0
+		self.recv_timeouts = 0
+		self.rx_bytes = 0
+		self.sessions = 0
+		self.tx_bytes = 0
+		self._engines = weakref.WeakSet()
+		self._lock = threading.Lock()
+
+	def add_engine(self, engine):
+		"""
+		Track *engine* so the memory used by its I/O history is included in
+		the snapshots.
+		"""
+		with self._lock:
+			self._engines.add(engine)
+		self.sessions += 1
+
+	def record_command(self, name, elapsed):
+		"""
+		Record the execution of an engine command.
+
+		:param str name: The name of the command.
+		:param float elapsed: The time the command took in seconds.
+		"""
+		with self._lock:
+			latencies = self.commands.get(name)
+			if latencies is None:
+				latencies = self.commands[name] = histogram.Histogram()
+			latencies.record(elapsed)
+
+	def record_recv(self, size, timed_out=False):
+		self.rx_bytes += size
+		if timed_out:
+			self.recv_timeouts += 1
+
+	def record_send(self, size):
+		self.tx_bytes += size
+
+	def snapshot(self):
+		"""
+		Get the current value of each of the metrics.
+
+		:rtype: dict
+		"""
+		with self._lock:
+			engines = list(self._engines)
+			commands = collections.OrderedDict()
+			for name, latencies in self.commands.items():
+				commands[name] = {
+					'count': latencies.count,
+					'sum': latencies.total,
+					'quantiles': collections.OrderedDict((quantile, latencies.percentile(quantile * 100)) for quantile in QUANTILES),
+					'max': latencies.max,
+				}
+		# the counters of the drivers, such as the frames dropped by a packet ring
+		connection = collections.OrderedDict()
+		for engine in engines:
+			for name, value in engine.connection.get_statistics().items():
+				connection[name] = connection.get(name, 0) + value
+		now = time.time()
+		return {
+			'timestamp': now,
+			'uptime': now - self.started,
+			'sessions': self.sessions,
+			'active_sessions': len(engines),
+			'commands': commands,
+			'connection': connection,
+			'history_memory_bytes': sum(engine.io_history.memory_bytes for engine in engines),
+			'history_spilled_bytes': sum(engine.io_history.spilled_bytes for engine in engines),
+			'reconnects': self.reconnects,
+			'recv_timeouts': self.recv_timeouts,
+			'rx_bytes': self.rx_bytes,
+			'tx_bytes': self.tx_bytes,
+		}
+
+def to_json(snapshot):
+	"""Format a snapshot of the metrics as a single line of JSON."""
+	snapshot = dict(snapshot)
+	snapshot['commands'] = collections.OrderedDict(
+		(name, {
+			'count': command['count'],
+			'sum': command['sum'],
+			'p50': command['quantiles'][0.5],
+			'p90': command['quantiles'][0.9],
+			'p99': command['quantiles'][0.99],
+			'max': command['max'],
+		}) for name, command in snapshot['commands'].items()
+	)
+	return json.dumps(snapshot, sort_keys=True)
+
+def to_prometheus(snapshot):
+	"""Format a snapshot of the metrics in the Prometheus text exposition format."""
+	lines = []
+	def metric(name, kind, description, value):
+		lines.append("# HELP protocon_{0} {1}".format(name, description))
+		lines.append("# TYPE protocon_{0} {1}".format(name, kind))
+		lines.append("protocon_{0} {1}".format(name, _format_value(value)))
+	metric('uptime_seconds', 'gauge', 'The number of seconds since the metrics were started.', snapshot['uptime'])
+	metric('sessions_total', 'counter', 'The number of engines that have been started.', snapshot['sessions'])
+	metric('active_sessions', 'gauge', 'The number of engines that are running.', snapshot['active_sessions'])
+	metric('rx_bytes_total', 'counter', 'The number of bytes received.', snapshot['rx_bytes'])
+	metric('tx_bytes_total', 'counter', 'The number of bytes sent.', snapshot['tx_bytes'])
+	metric('recv_timeouts_total', 'counter', 'The number of receive operations that timed out before they were complete.', snapshot['recv_timeouts'])
+	metric('reconnects_total', 'counter', 'The number of times a connection was opened again.', snapshot['reconnects'])
+	metric('history_memory_bytes', 'gauge', 'The number of bytes of I/O history held in memory.', snapshot['history_memory_bytes'])
+	metric('history_spilled_bytes', 'gauge', 'The number of bytes of I/O history spilled to temporary files.', snapshot['history_spilled_bytes'])
+	for name, value in snapshot['connection'].items():
+		metric('connection_' + name, 'gauge', 'The sum of the driver counter ' + name + ' over the active sessions.', value)
+	if snapshot['commands']:
+		lines.append('# HELP protocon_command_duration_seconds The time taken to execute each command.')
+		lines.append('# TYPE protocon_command_duration_seconds summary')
+		for name, command in snapshot['commands'].items():
+			name = _escape_label(name)
+			for quantile, value in command['quantiles'].items():
+				lines.append("protocon_command_duration_seconds{{command=\"{0}\",quantile=\"{1}\"}} {2}".format(name, quantile, _format_value(value)))
+			lines.append("protocon_command_duration_seconds_sum{{command=\"{0}\"}} {1}".format(name, _format_value(command['sum'])))
+			lines.append("protocon_command_duration_seconds_count{{command=\"{0}\"}} {1}".format(name, command['count']))
+	return '\n'.join(lines) + '\n'
+
+class MetricsWriter(object):
+	"""
+	Periodically write a snapshot of :py:class:`.Metrics` to a file from a
+	background thread. In the ``prometheus`` format the file is replaced
+	atomically so it can be read by the node exporter's textfile collector,
+	in the ``jsonl`` format a line is appended to it for each snapshot.
+	"""
+	def __init__(self, metrics, path, format=None, interval=10.0):
+		"""
+		:param metrics: The metrics to write.
+		:type metrics: :py:class:`.Metrics`
+		:param str path: The path of the file to write to.
+		:param str format: The format, inferred from the file extension when not specified.
+		:param float interval: The number of seconds between each write.
+		"""
+		if format is None:
+			format = 'prometheus' if path.endswith('.prom') else 'jsonl'
+		if format not in FORMATS:
+			raise ValueError('unknown metrics format: ' + format)
+		if interval <= 0:
+			raise ValueError('interval must be greater than 0')
+		self.metrics = metrics
+		self.path = path
+		self.format = format
+		self.interval = interval
+		self._stop_event = threading.Event()
+		self._thread = None
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.stop()
+
+	def _run(self):
+		while not self._stop_event.wait(self.interval):
+			try:
+				self.write()
+			except OSError as error:
+				color.print_error("Failed to write the metrics: {0}".format(error))
+
+	def start(self):
+		"""Start writing the metrics in the background."""
+		if self._thread is not None:
+			raise RuntimeError('the metrics writer has already been started')
+		self._thread = threading.Thread(target=self._run, name='protocon-metrics', daemon=True)
+		self._thread.start()
+
+	def stop(self):
+		"""Stop writing the metrics in the background and write them one last time."""
+		if self._thread is None:
+			return
+		self._stop_event.set()
+		self._thread.join()
+		self._thread = None
+		self.write()
+
+	def write(self):
+		"""Write a snapshot of the metrics now."""
+		snapshot = self.metrics.snapshot()
+		if self.format == 'jsonl':
+			with open(self.path, 'a') as file_h:
+				file_h.write(to_json(snapshot) + '\n')
+			return
+		temporary_path = "{0}.{1}.tmp".format(self.path, os.getpid())
+		with open(temporary_path, 'w') as file_h:
+			file_h.write(to_prometheus(snapshot))
+		os.replace(temporary_path, self.path)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/packet_ring.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import collections
+import mmap
+import struct
+
+from . import errors
+
+# see: <linux/if_packet.h>
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+
+# offsets into struct tpacket_block_desc
+_BLOCK_STATUS = 8
+_BLOCK_NUM_PKTS = 12
+_BLOCK_FIRST_PKT = 16
+# struct tpacket3_hdr: tp_next_offset, tp_sec, tp_nsec, tp_snaplen, tp_len, tp_status, tp_mac
+_FRAME_HEADER = struct.Struct('=IIIIIIH')
+
+RingStatistics = collections.namedtuple('RingStatistics', ('received', 'dropped', 'freezes'))
+RingStatistics.__doc__ = """
+The number of frames the kernel has received and dropped because the ring was
+full and the number of times the queue was frozen as a result.
+"""
+
+class PacketRing(object):
+	"""
+	A TPACKET_V3 receive ring mapped from an ``AF_PACKET`` socket. The kernel
+	writes frames into blocks of shared memory which are read in place
+	without a system call or copy per frame.
+	"""
+	def __init__(self, sock, block_size=0x100000, block_count=16, frame_size=0x800, block_timeout=10):
+		"""
+		:param sock: The ``AF_PACKET`` socket to map the ring for.
+		:param int block_size: The size of each block, a multiple of the page size.
+		:param int block_count: The number of blocks in the ring.
+		:param int frame_size: The nominal size of each frame.
+		:param int block_timeout: The number of milliseconds after which the
+			kernel hands over a block that is not full.
+		"""
+		self.block_size = block_size
+		self.block_count = block_count
+		# the kernel timestamp of the last frame in nanoseconds since the epoch
+		self.last_timestamp_ns = None
+		self.received = 0
+		self.dropped = 0
+		self.freezes = 0
+		self._socket = sock
+		try:
+			sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+			request = struct.pack('=7I', block_size, block_count, frame_size, (block_size * block_count) // frame_size, block_timeout, 0, 0)
+			sock.setsockopt(SOL_PACKET, PACKET_RX_RING, request)
+			self._mmap = mmap.mmap(sock.fileno(), block_size * block_count, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+		except OSError as error:
+			raise errors.ProtoconDriverError("failed to set up the packet ring ({0})".format(error)) from None
+		self._view = memoryview(self._mmap)
+		self._block = 0
+		self._held = False
+		self._remaining = 0
+		self._offset = 0
+
+	@property
+	def last_timestamp(self):
+		"""The kernel timestamp of the last frame in seconds since the epoch."""
+		return None if self.last_timestamp_ns is None else self.last_timestamp_ns / 1e9
+
+	def _block_ready(self, block):
+		return struct.unpack_from('=I', self._mmap, block * self.block_size + _BLOCK_STATUS)[0] & TP_STATUS_USER
+
+	def _release(self):
+		# return the held block to the kernel and move on to the next one
+		struct.pack_into('=I', self._mmap, self._block * self.block_size + _BLOCK_STATUS, TP_STATUS_KERNEL)
+		self._held = False
+		self._block = (self._block + 1) % self.block_count
+
+	def close(self):
+		"""Unmap the ring."""
+		if self._view is None:
+			return
+		self._view.release()
+		self._view = None
+		self._mmap.close()
+
+	def next_frame(self):
+		"""
+		Get the next frame from the ring. The frame is a view into the shared
+		memory and is only valid until the next call.
+
+		:return: The frame or an empty view when none is available.
+		:rtype: memoryview
+		"""
+		if not self._remaining:
+			if self._held:
+				self._release()
+			if not self._block_ready(self._block):
+				return self._view[:0]
+			block_offset = self._block * self.block_size
+			self._held = True
+			self._remaining = struct.unpack_from('=I', self._mmap, block_offset + _BLOCK_NUM_PKTS)[0]
+			self._offset = block_offset + struct.unpack_from('=I', self._mmap, block_offset + _BLOCK_FIRST_PKT)[0]
+			if not self._remaining:
+				return self._view[:0]
+		next_offset, seconds, nanoseconds, snap_length, _, _, mac_offset = _FRAME_HEADER.unpack_from(self._mmap, self._offset)
+		start = self._offset + mac_offset
+		self._offset += next_offset
+		self._remaining -= 1
+		self.last_timestamp_ns = seconds * 1000000000 + nanoseconds
+		return self._view[start:start + snap_length]
+
+	def pending(self):
+		"""
+		Check whether a frame is available without waiting.
+
+		:rtype: bool
+		"""
+		if self._remaining:
+			return True
+		block = (self._block + 1) % self.block_count if self._held else self._block
+		return bool(self._block_ready(block))
+
+	def statistics(self):
+		"""
+		Get the counters of the ring since it was created. This can be called
+		at any time while the ring is in use, the totals are also available
+		from the :py:attr:`.received`, :py:attr:`.dropped` and
+		:py:attr:`.freezes` attributes once updated.
+
+		:rtype: :py:class:`.RingStatistics`
+		"""
+		try:
+			# the kernel resets the counters each time they are read
+			received, dropped, freezes = struct.unpack('=III', self._socket.getsockopt(SOL_PACKET, PACKET_STATISTICS, 12))
+		except OSError:
+			# the socket has been closed so the totals are final
+			pass
+		else:
+			self.received += received
+			self.dropped += dropped
+			self.freezes += freezes
+		return RingStatistics(self.received, self.dropped, self.freezes)
@@ -31,26 +31,215 @@
 #
 
 import functools
+import hashlib
+import json
 import os
+import tempfile
 
 import pluginbase
 
+from . import __version__
+from . import script
+
 get_path = functools.partial(os.path.join, os.path.abspath(os.path.dirname(__file__)))
 
+MANIFEST_VERSION = 1
+_memory_cache = {}
+
+def _fingerprint(searchpath):
+	# a summary of the plugin files which changes when any of them are added,
+	# removed or modified
+	fingerprint = []
+	for directory in searchpath:
+		try:
+			entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+		except OSError:
+			continue
+		for entry in entries:
+			if entry.name.startswith(('.', '__pycache__')):
+				continue
+			try:
+				stat = entry.stat()
+			except OSError:
+				continue
+			fingerprint.append([entry.path, stat.st_mtime_ns, stat.st_size])
+			if entry.is_dir():
+				init_path = os.path.join(entry.path, '__init__.py')
+				if os.path.isfile(init_path):
+					stat = os.stat(init_path)
+					fingerprint.append([init_path, stat.st_mtime_ns, stat.st_size])
+	return fingerprint
+
+def _get_manifest_path(searchpath):
+	cache_directory = script.get_cache_directory()
+	if cache_directory is None:
+		return None
+	key = repr((MANIFEST_VERSION, __version__, tuple(searchpath)))
+	return os.path.join(cache_directory, 'plugins-' + hashlib.sha256(key.encode('utf-8')).hexdigest()[:16] + '.json')
+
+def _load_manifest(manifest_path, fingerprint):
+	try:
+		with open(manifest_path, 'r') as file_h:
+			manifest = json.load(file_h)
+	except (OSError, ValueError):
+		return None
+	if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION or manifest.get('fingerprint') != fingerprint:
+		return None
+	return manifest
+
+def _store_manifest(manifest_path, manifest):
+	directory = os.path.dirname(manifest_path)
+	try:
+		os.makedirs(directory, exist_ok=True)
+		fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+	except OSError:
+		# the manifest is an optimization, failing to write it is not an error
+		return
+	try:
+		with os.fdopen(fd, 'w') as file_h:
+			json.dump(manifest, file_h)
+		os.replace(temp_path, manifest_path)
+	except OSError:
+		os.unlink(temp_path)
+
 class PluginManager(object):
-	__slots__ = ('source', 'connection_drivers', 'transcoders')
+	"""
+	Provides access to the connection drivers and transcoders defined by the
+	plugins in the search path. Plugins are imported on demand using a
+	manifest of the URL schemes each one provides. The manifest is cached on
+	disk alongside the compiled scripts and is rebuilt, which imports every
+	plugin once, whenever a plugin file is added, removed or modified.
+	Accessing :py:attr:`.connection_drivers`, :py:attr:`.async_connection_drivers`
+	or :py:attr:`.transcoders` imports all of the plugins.
+	"""
+	__slots__ = ('source', 'searchpath', '_all_loaded', '_async_connection_drivers', '_connection_drivers', '_loaded', '_manifest', '_transcoders')
 	def __init__(self, searchpath=None):
 		searchpath = searchpath or []
 		searchpath.append(get_path('plugins'))
+		self.searchpath = tuple(searchpath)
 
 		self.source = pluginbase.PluginBase(package='protocon.plugins').make_plugin_source(
 			searchpath=searchpath
 		)
-		self.connection_drivers = {}
-		self.transcoders = {}
+		self._async_connection_drivers = {}
+		self._connection_drivers = {}
+		self._transcoders = {}
+		self._all_loaded = False
+		self._loaded = set()
+		self._manifest = None
+
+	@property
+	def async_connection_drivers(self):
+		"""A dictionary of every plugin name and its asynchronous connection driver."""
+		self.load_all()
+		return self._async_connection_drivers
+
+	@property
+	def connection_drivers(self):
+		"""A dictionary of every plugin name and its connection driver."""
+		self.load_all()
+		return self._connection_drivers
+
+	@property
+	def transcoders(self):
+		"""A dictionary of every plugin name and its transcoder."""
+		self.load_all()
+		return self._transcoders
+
+	@property
+	def connection_driver_schemes(self):
+		"""
+		A dictionary of each plugin name that provides a connection driver and
+		the URL schemes it handles, this does not import any plugins.
+		"""
+		plugins = self._get_manifest()['plugins']
+		return {name: tuple(plugin['schemes']) for name, plugin in plugins.items() if plugin['schemes'] is not None}
+
+	@property
+	def transcoder_names(self):
+		"""The names of the plugins that provide a transcoder, this does not import any plugins."""
+		return tuple(name for name, plugin in self._get_manifest()['plugins'].items() if plugin['transcoder'])
+
+	def _build_manifest(self, fingerprint):
+		plugins = {}
+		for plugin in self.source.list_plugins():
+			self._load(plugin)
+			driver = self._connection_drivers.get(plugin)
+			async_driver = self._async_connection_drivers.get(plugin)
+			plugins[plugin] = {
+				'async_schemes': None if async_driver is None else list(async_driver.schemes),
+				'schemes': None if driver is None else list(driver.schemes),
+				'transcoder': plugin in self._transcoders
+			}
+		return {'version': MANIFEST_VERSION, 'fingerprint': fingerprint, 'plugins': plugins}
+
+	def _find_driver(self, scheme, drivers, key):
+		for plugin, entry in self._get_manifest()['plugins'].items():
+			if entry[key] is None or scheme not in entry[key]:
+				continue
+			self._load(plugin)
+			driver = drivers.get(plugin)
+			if driver is not None and scheme in driver.schemes:
+				return driver
+		# the manifest is out of date, fall back to checking every plugin
+		self.load_all()
+		return next((driver for driver in drivers.values() if scheme in driver.schemes), None)
+
+	def _get_manifest(self):
+		if self._manifest is not None:
+			return self._manifest
+		fingerprint = _fingerprint(self.searchpath)
+		memory_key = (self.searchpath, repr(fingerprint))
+		manifest = _memory_cache.get(memory_key)
+		manifest_path = None
+		if manifest is None:
+			manifest_path = _get_manifest_path(self.searchpath)
+			if manifest_path is not None:
+				manifest = _load_manifest(manifest_path, fingerprint)
+		if manifest is None:
+			manifest = self._build_manifest(fingerprint)
+			if manifest_path is not None:
+				_store_manifest(manifest_path, manifest)
+		_memory_cache[memory_key] = manifest
+		self._manifest = manifest
+		return manifest
+
+	def _load(self, plugin):
+		if plugin in self._loaded:
+			return
+		module = self.source.load_plugin(plugin)
+		self._loaded.add(plugin)
+		if hasattr(module, 'AsyncConnectionDriver'):
+			self._async_connection_drivers[plugin] = module.AsyncConnectionDriver
+		if hasattr(module, 'ConnectionDriver'):
+			self._connection_drivers[plugin] = module.ConnectionDriver
+		if hasattr(module, 'Transcoder'):
+			self._transcoders[plugin] = module.Transcoder
+
+	def get_async_connection_driver(self, scheme):
+		"""
+		Get the asynchronous connection driver for the URL *scheme*, importing
+		only the plugin which provides it.
+
+		:param str scheme: The URL scheme.
+		:return: The driver class or None if no plugin provides the scheme.
+		"""
+		return self._find_driver(scheme, self._async_connection_drivers, 'async_schemes')
+
+	def get_connection_driver(self, scheme):
+		"""
+		Get the connection driver for the URL *scheme*, importing only the
+		plugin which provides it.
+
+		:param str scheme: The URL scheme.
+		:return: The driver class or None if no plugin provides the scheme.
+		"""
+		return self._find_driver(scheme, self._connection_drivers, 'schemes')
+
+	def load_all(self):
+		"""Import every plugin."""
+		if self._all_loaded:
+			return
 		for plugin in self.source.list_plugins():
-			module = self.source.load_plugin(plugin)
-			if hasattr(module, 'ConnectionDriver'):
-				self.connection_drivers[plugin] = module.ConnectionDriver
-			if hasattr(module, 'Transcoder'):
-				self.transcoders[plugin] = module.Transcoder
+			self._load(plugin)
+		self._all_loaded = True
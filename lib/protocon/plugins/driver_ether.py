@@ -31,22 +31,30 @@
 #
 
 import binascii
+import ctypes
 import fcntl
 import os
 import re
 import socket
 import struct
-import time
 
+import protocon.capture
 import protocon.errors
+import protocon.packet_ring
 import protocon.utilities
 
-_inf = float('inf')
-
 _BROADCAST = b'\xff\xff\xff\xff\xff\xff'
 _HEADER_SIZE = 14
 DEFAULT_SRC = '$iface.addr'
 
+# see: <asm-generic/socket.h> and <linux/filter.h>
+SO_ATTACH_FILTER = 26
+_BPF_LD_W_ABS = 0x20
+_BPF_LD_H_ABS = 0x28
+_BPF_JEQ_K = 0x15
+_BPF_RET_K = 0x06
+_BPF_ACCEPT = 0x40000
+
 def _assert_is_mac(mac):
 	if re.match('^([0-9a-fA-F]{2}:){5}[0-9a-fA-F]{2}$', mac) is None:
 		raise protocon.errors.ProtoconDriverError('bad mac address: ' + mac)
@@ -57,6 +65,51 @@ def _get_iface_mac(ifname):
 	info = fcntl.ioctl(s.fileno(), 0x8927,  struct.pack('256s', ifname[:15].encode('ascii')))
 	return ':'.join(['%02x' % char for char in info[18:24]])
 
+def _bpf_program(src, dst, ether_type):
+	# compile a classic BPF program which accepts frames of the ether type that
+	# are addressed to src (or broadcast) and were sent from dst (unless dst is
+	# the broadcast address), jump targets are resolved from the labels
+	program = []
+	def load(size, offset):
+		program.append((_BPF_LD_W_ABS if size == 4 else _BPF_LD_H_ABS, None, None, offset))
+	def jump_equal(value, true, false):
+		program.append((_BPF_JEQ_K, true, false, value))
+
+	load(2, 12)
+	jump_equal(ether_type, None, 'reject')
+	load(4, 0)
+	jump_equal(struct.unpack('>I', src[:4])[0], None, 'broadcast')
+	load(2, 4)
+	jump_equal(struct.unpack('>H', src[4:])[0], 'source', 'broadcast')
+	program.append('broadcast')
+	load(4, 0)
+	jump_equal(0xffffffff, None, 'reject')
+	load(2, 4)
+	jump_equal(0xffff, None, 'reject')
+	program.append('source')
+	if dst != _BROADCAST:
+		load(4, 6)
+		jump_equal(struct.unpack('>I', dst[:4])[0], None, 'reject')
+		load(2, 10)
+		jump_equal(struct.unpack('>H', dst[4:])[0], None, 'reject')
+	program.append((_BPF_RET_K, None, None, _BPF_ACCEPT))
+	program.append('reject')
+	program.append((_BPF_RET_K, None, None, 0))
+
+	labels = {}
+	instructions = []
+	for entry in program:
+		if isinstance(entry, str):
+			labels[entry] = len(instructions)
+		else:
+			instructions.append(entry)
+	def offset(index, label):
+		return 0 if label is None else labels[label] - index - 1
+	return b''.join(
+		struct.pack('=HBBI', code, offset(index, true), offset(index, false), k)
+		for index, (code, true, false, k) in enumerate(instructions)
+	)
+
 # This driver is a software wrapper on top of L2 sockets to handle ethernet
 # headers. Frames sent will have an ethernet header created and added to them
 # and frames received will be filtered based on their ethernet header.
@@ -67,6 +120,8 @@ class ConnectionDriver(protocon.ConnectionDriver):
 		protocon.ConnectionDriverSetting(name='dst', default_value='ff:ff:ff:ff:ff:ff'),
 		protocon.ConnectionDriverSetting(name='type', default_value=0x0800, type=protocon.utilities.literal_type(int)),
 		protocon.ConnectionDriverSetting(name='size', default_value=0xffff, type=protocon.utilities.literal_type(int)),
+		protocon.ConnectionDriverSetting(name='ring', default_value=False, type=protocon.utilities.bool_type),
+		protocon.ConnectionDriverSetting(name='ring-blocks', default_value=16, type=protocon.utilities.literal_type(int)),
 	)
 	url_attributes = ('host',)
 	def __init__(self, *args, **kwargs):
@@ -77,53 +132,103 @@ class ConnectionDriver(protocon.ConnectionDriver):
 		if self.settings['src'] is None or self.settings['src'] == DEFAULT_SRC:
 			self.settings['src'] = _get_iface_mac(self.url.host)
 		_assert_is_mac(self.settings['src'])
+		self.recv_buffer_size = max(self.recv_buffer_size, _HEADER_SIZE + self.settings['size'])
+		self._bpf_program = None
+		self._headers = None
+		self._headers_key = None
+		self.ring = None
+
+	def _attach_filter(self):
+		src, dst, _ = self._headers
+		program = _bpf_program(src, dst, self.settings['type'])
+		instructions = ctypes.create_string_buffer(program, len(program))
+		fprog = struct.pack('HP', len(program) // 8, ctypes.addressof(instructions))
+		try:
+			self._connection.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+		except OSError as error:
+			self._bpf_program = None
+			self.print_warning("Failed to attach the kernel filter, frames will be filtered in userspace ({0})".format(error))
+			return
+		self._bpf_program = program
+		# discard the frames which were queued before the filter was attached
+		self._connection.setblocking(False)
+		try:
+			while True:
+				self._connection.recv(1)
+		except (BlockingIOError, InterruptedError):
+			pass
+		finally:
+			self._connection.setblocking(True)
+
+	def _get_headers(self):
+		# the addresses are parsed and the tx header is built once, they are only
+		# rebuilt (and the kernel filter reattached) when the settings change
+		key = (self.settings['src'], self.settings['dst'], self.settings['type'])
+		if key != self._headers_key:
+			src, dst = self._mac('src'), self._mac('dst')
+			self._headers = (src, dst, dst + src + struct.pack('>H', self.settings['type']))
+			self._headers_key = key
+			if self._connection is not None:
+				self._attach_filter()
+		return self._headers
 
 	def _mac(self, which):
 		mac = self.settings[which]
 		_assert_is_mac(mac)
 		return binascii.a2b_hex(mac.replace(':', ''))
 
-	def _recv(self, size, timeout, terminator=None):
-		now = time.time()
-		expiration = _inf if timeout is None else time.time() + timeout
-		data = b''
-		while len(data) < size and (self._select(0) or expiration >= now):
-			if not self._select(max(expiration - now, 0)):
-				break
-			packet = self._connection.recv(_HEADER_SIZE + (self.settings['size'] if size == _inf else size))
-			if len(packet) < _HEADER_SIZE:
-				continue
-			dst, src = packet[:6], packet[6:12]
-			if dst != self._mac('src') and dst != _BROADCAST:
-				continue
-			if src != self._mac('dst') and self._mac('dst') != _BROADCAST:
-				continue
-			data += packet[_HEADER_SIZE:]
-			if terminator is not None and terminator in data:
-				data, terminator, _ = data.partition(terminator)
-				data += terminator
-				break
-			now = time.time()
-		return data
+	def get_capture_framer(self):
+		src, dst, _ = self._get_headers()
+		return protocon.capture.EthernetFramer(src, dst, self.settings['type'])
+
+	def _recv_into(self, buffer):
+		src_mac, dst_mac, _ = self._get_headers()
+		if self.ring is not None:
+			buffer = self.ring.next_frame()
+			size = len(buffer)
+		else:
+			size = self._connection.recv_into(buffer)
+		if size < _HEADER_SIZE:
+			return buffer[:0]
+		if self._bpf_program is None:
+			dst, src = buffer[:6], buffer[6:12]
+			if dst != src_mac and dst != _BROADCAST:
+				return buffer[:0]
+			if src != dst_mac and dst_mac != _BROADCAST:
+				return buffer[:0]
+		if self.ring is not None:
+			self.recv_timestamps.append(self.ring.last_timestamp_ns)
+		return buffer[_HEADER_SIZE:size]
+
+	def get_statistics(self):
+		# the ring may be closed by another thread while this is running
+		ring = self.ring
+		if ring is None:
+			return {}
+		return {'ring_' + key: value for key, value in ring.statistics()._asdict().items()}
+
+	def _recv_ready(self, timeout):
+		if self.ring is not None and self.ring.pending():
+			return True
+		return super(ConnectionDriver, self)._recv_ready(timeout)
 
 	def close(self):
+		if self.ring is not None:
+			received, dropped, freezes = self.ring.statistics()
+			self.print_status("The packet ring received {0:,} frames and dropped {1:,} (frozen {2:,} times)".format(received, dropped, freezes))
+			self.ring.close()
+			self.ring = None
 		self._connection.close()
 		super(ConnectionDriver, self).close()
 
 	def open(self):
 		self._connection = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(self.settings['type']))
 		self._connection.bind((self.url.host, 0))
+		self._headers_key = None
+		self._get_headers()
+		if self.settings['ring']:
+			self.ring = protocon.packet_ring.PacketRing(self._connection, block_count=self.settings['ring-blocks'])
 		self.connected = True
 
-	def recv_size(self, size, timeout=None):
-		return self._recv(size, timeout)
-
-	def recv_timeout(self, timeout):
-		return self._recv(_inf, timeout)
-
-	def recv_until(self, terminator, timeout=None):
-		return self._recv(_inf, timeout, terminator=terminator)
-
 	def send(self, data):
-		ether = self._mac('dst') + self._mac('src') + struct.pack('>H', self.settings['type'])
-		self._connection.send(ether + data)
+		self._connection.send(self._get_headers()[2] + data)
@@ -32,13 +32,12 @@
 
 import os
 import socket
-import time
 
+import protocon.capture
 import protocon.errors
+import protocon.packet_ring
 import protocon.utilities
 
-_inf = float('inf')
-
 # see: <linux/if_ether.h>
 ETH_P_ALL = 0x0003
 
@@ -46,45 +45,55 @@ class ConnectionDriver(protocon.ConnectionDriver):
 	schemes = ('l2',)
 	setting_definitions = (
 		protocon.ConnectionDriverSetting(name='size', default_value=0xffff, type=protocon.utilities.literal_type(int)),
+		protocon.ConnectionDriverSetting(name='ring', default_value=False, type=protocon.utilities.bool_type),
+		protocon.ConnectionDriverSetting(name='ring-blocks', default_value=16, type=protocon.utilities.literal_type(int)),
 	)
 	url_attributes = ('host',)
 	def __init__(self, *args, **kwargs):
 		if os.getuid():
 			raise protocon.errors.ProtoconDriverError('this driver requires root privileges')
 		super(ConnectionDriver, self).__init__(*args, **kwargs)
+		self.recv_buffer_size = max(self.recv_buffer_size, self.settings['size'])
+		self.ring = None
+
+	def get_capture_framer(self):
+		return protocon.capture.Framer(protocon.capture.LINKTYPE_ETHERNET)
+
+	def _recv_into(self, buffer):
+		if self.ring is not None:
+			frame = self.ring.next_frame()
+			if frame:
+				self.recv_timestamps.append(self.ring.last_timestamp_ns)
+			return frame
+		return buffer[:self._connection.recv_into(buffer)]
+
+	def get_statistics(self):
+		# the ring may be closed by another thread while this is running
+		ring = self.ring
+		if ring is None:
+			return {}
+		return {'ring_' + key: value for key, value in ring.statistics()._asdict().items()}
 
-	def _recv(self, size, timeout, terminator=None):
-		now = time.time()
-		expiration = _inf if timeout is None else time.time() + timeout
-		data = b''
-		while len(data) < size and (self._select(0) or expiration >= now):
-			if not self._select(max(expiration - now, 0)):
-				break
-			data += self._connection.recv(self.settings['size'] if size == _inf else size)
-			if terminator is not None and terminator in data:
-				data, terminator, _ = data.partition(terminator)
-				data += terminator
-				break
-			now = time.time()
-		return data
+	def _recv_ready(self, timeout):
+		if self.ring is not None and self.ring.pending():
+			return True
+		return super(ConnectionDriver, self)._recv_ready(timeout)
 
 	def close(self):
+		if self.ring is not None:
+			received, dropped, freezes = self.ring.statistics()
+			self.print_status("The packet ring received {0:,} frames and dropped {1:,} (frozen {2:,} times)".format(received, dropped, freezes))
+			self.ring.close()
+			self.ring = None
 		self._connection.close()
 		super(ConnectionDriver, self).close()
 
 	def open(self):
 		self._connection = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
 		self._connection.bind((self.url.host, 0))
+		if self.settings['ring']:
+			self.ring = protocon.packet_ring.PacketRing(self._connection, block_count=self.settings['ring-blocks'])
 		self.connected = True
 
-	def recv_size(self, size, timeout=None):
-		return self._recv(size, timeout)
-
-	def recv_timeout(self, timeout):
-		return self._recv(_inf, timeout)
-
-	def recv_until(self, terminator, timeout=None):
-		return self._recv(_inf, timeout, terminator=terminator)
-
 	def send(self, data):
 		self._connection.send(data)
@@ -41,7 +41,27 @@ class ConnectionDriver(protocon.ConnectionDriver):
 		return b'\x00'
 
 	def recv_until(self, terminator, timeout=None):
+		if not isinstance(terminator, (bytes, bytearray)):
+			terminator = terminator[0]
+		self.last_terminator = terminator
 		return terminator
 
 	def send(self, data):
 		pass
+
+class AsyncConnectionDriver(protocon.AsyncConnectionDriver):
+	schemes = ('null',)
+	async def recv_size(self, size, timeout=None):
+		return b'\x00' * size
+
+	async def recv_timeout(self, timeout):
+		return b'\x00'
+
+	async def recv_until(self, terminator, timeout=None):
+		if not isinstance(terminator, (bytes, bytearray)):
+			terminator = terminator[0]
+		self.last_terminator = terminator
+		return terminator
+
+	async def send(self, data):
+		pass
@@ -31,14 +31,11 @@
 #
 
 import os
-import time
 
 import serial
 
 import protocon
 
-_inf = float('inf')
-
 BAUDRATES = (
 	50, 75, 110, 134, 150, 200, 300, 600, 1200, 1800, 2400, 4800, 9600, 19200, 38400, 57600, 115200,
 	230400, 460800, 500000, 576000, 921600, 1000000, 1152000, 1500000, 2000000, 2500000, 3000000, 3500000, 4000000
@@ -53,20 +50,9 @@ class ConnectionDriver(protocon.ConnectionDriver):
 		protocon.ConnectionDriverSetting(name='stopbits', default_value=1, type=float, choices=(1, 1.5, 2))
 	)
 	url_attributes = ('path',)
-	def _recv(self, size, timeout, terminator=None):
-		now = time.time()
-		expiration = _inf if timeout is None else time.time() + timeout
-		data = b''
-		while len(data) < size and (self._select(0) or expiration >= now):
-			if not self._select(max(expiration - now, 0)):
-				break
-			data += self._connection.read(1)
-			if terminator is not None and terminator in data:
-				data, terminator, _ = data.partition(terminator)
-				data += terminator
-				break
-			now = time.time()
-		return data
+	def _recv_into(self, buffer):
+		size = min(max(self._connection.in_waiting, 1), len(buffer))
+		return buffer[:self._connection.readinto(buffer[:size])]
 
 	def close(self):
 		self._connection.close()
@@ -78,14 +64,5 @@ class ConnectionDriver(protocon.ConnectionDriver):
 		self._connection.setDTR(False)
 		self.connected = True
 
-	def recv_size(self, size, timeout=None):
-		return self._recv(size, timeout)
-
-	def recv_timeout(self, timeout):
-		return self._recv(_inf, timeout)
-
-	def recv_until(self, terminator, timeout=None):
-		return self._recv(_inf, timeout, terminator=terminator)
-
 	def send(self, data):
 		self._connection.write(data)
@@ -29,101 +29,258 @@
 #  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 #  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 #
-
+import asyncio
 import socket
-import time
 import ssl
 
 import protocon
+import protocon.capture
+import protocon.resolver
 import protocon.utilities
 
-_inf = float('inf')
+SCHEMES = ('tcp', 'tcp4', 'tcp6', 'ssl', 'ssl4', 'ssl6')
+SETTING_DEFINITIONS = (
+	protocon.ConnectionDriverSetting(name='ip6-scope-id'),
+	protocon.ConnectionDriverSetting(name='type', default_value='client', choices=('client', 'server')),
+	protocon.ConnectionDriverSetting(name='backlog', default_value=128, type=protocon.utilities.literal_type(int)),
+)
 
-class ConnectionDriver(protocon.ConnectionDriver):
-	schemes = ('tcp', 'tcp4', 'tcp6', 'ssl', 'ssl4', 'ssl6')
-	setting_definitions = (
-		protocon.ConnectionDriverSetting(name='ip6-scope-id'),
-		protocon.ConnectionDriverSetting(name='type', default_value='client', choices=('client', 'server')),
+def _get_addrinfos(url, settings):
+	family = {
+		'tcp': socket.AF_UNSPEC, 'tcp4': socket.AF_INET, 'tcp6': socket.AF_INET6,
+		'ssl': socket.AF_UNSPEC, 'ssl4': socket.AF_INET, 'ssl6': socket.AF_INET6
+	}[url.scheme]
+	addrinfos = protocon.resolver.getaddrinfos(
+		url.host,
+		url.port,
+		family,
+		type=socket.SOCK_STREAM,
+		proto=socket.IPPROTO_TCP
+	)
+	if not addrinfos:
+		raise protocon.ProtoconDriverError('getaddrinfo failed for the specified URL')
+	if settings['ip6-scope-id'] is not None:
+		scope_id = settings['ip6-scope-id']
+		scope_id = int(scope_id) if scope_id.isdigit() else socket.if_nametoindex(scope_id)
+		addrinfos = tuple(
+			addrinfo._replace(sockaddr=addrinfo.sockaddr[:3] + (scope_id,)) if addrinfo.family == socket.AF_INET6 else addrinfo
+			for addrinfo in addrinfos
+		)
+	return addrinfos
+
+def _get_addrinfo(url, settings):
+	return _get_addrinfos(url, settings)[0]
+
+def _get_ssl_context():
+	context = ssl.create_default_context()
+	context.check_hostname = False
+	context.verify_mode = ssl.CERT_NONE
+	return context
+
+def _format_peer_address(family, peer_address):
+	return "{0}:{1}".format(
+		'[' + peer_address[0] + ']' if family == socket.AF_INET6 else peer_address[0],
+		peer_address[1]
 	)
+
+class ConnectionDriver(protocon.ConnectionDriver):
+	schemes = SCHEMES
+	setting_definitions = SETTING_DEFINITIONS
 	url_attributes = ('host', 'port',)
 	def __init__(self, *args, **kwargs):
 		super(ConnectionDriver, self).__init__(*args, **kwargs)
 		self._addrinfo = None
 
-	def _recv(self, size, timeout, terminator=None):
-		now = time.time()
-		expiration = _inf if timeout is None else time.time() + timeout
-		data = b''
-		while len(data) < size and (self._select(0) or expiration >= now):
-			if not self._select(max(expiration - now, 0)):
-				break
-			chunk = self._connection.recv(1)
-			if not chunk:
-				self.connected = False
-				break
-			data += chunk
-			if terminator is not None and terminator in data:
-				data, terminator, _ = data.partition(terminator)
-				data += terminator
-				break
-			now = time.time()
-		return data
+	def get_capture_framer(self):
+		return protocon.capture.TCPFramer(self._connection.getsockname(), self._connection.getpeername())
+
+	def _recv_ready(self, timeout):
+		# ssl sockets may have decrypted data pending that select can not see
+		if isinstance(self._connection, ssl.SSLSocket) and self._connection.pending():
+			return True
+		return super(ConnectionDriver, self)._recv_ready(timeout)
 
 	def close(self):
 		self._connection.close()
 		super(ConnectionDriver, self).close()
 
-	def open(self):
-		family = {
-			'tcp': socket.AF_UNSPEC, 'tcp4': socket.AF_INET, 'tcp6': socket.AF_INET6,
-			'ssl': socket.AF_UNSPEC, 'ssl4': socket.AF_INET, 'ssl6': socket.AF_INET6
-		}[self.url.scheme]
-		addrinfo = protocon.utilities.getaddrinfos(
-			self.url.host,
-			self.url.port,
-			family,
-			type=socket.SOCK_STREAM,
-			proto=socket.IPPROTO_TCP
-		)
-		if not addrinfo:
-			raise protocon.ProtoconDriverError('getaddrinfo failed for the specified URL')
-		self._addrinfo = addrinfo[0]
-		if self._addrinfo.family == socket.AF_INET6 and self.settings['ip6-scope-id'] is not None:
-			scope_id = self.settings['ip6-scope-id']
-			scope_id = int(scope_id) if scope_id.isdigit() else socket.if_nametoindex(scope_id)
-			self._addrinfo = self._addrinfo._replace(sockaddr=self._addrinfo.sockaddr[:3] + (scope_id,))
+	def is_stale(self):
+		if not isinstance(self._connection, ssl.SSLSocket) or not self.connected:
+			return super(ConnectionDriver, self).is_stale()
+		if self._read_ahead:
+			return True
+		if not self._recv_ready(0):
+			return False
+		# ssl sockets can't peek and are also readable when the server sends
+		# records without application data, such as TLS 1.3 session tickets
+		timeout = self._connection.gettimeout()
+		self._connection.setblocking(False)
+		try:
+			self._connection.recv(self.recv_buffer_size)
+		except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+			return False
+		except OSError:
+			return True
+		finally:
+			self._connection.settimeout(timeout)
+		# either the end of the stream or data that nothing asked for
+		return True
 
-		tcp_sock = socket.socket(self._addrinfo.family, self._addrinfo.type)
-		if self.settings['type'] == 'client':
+	def _connect(self, addrinfos):
+		# try each of the addresses in order like socket.create_connection
+		for index, addrinfo in enumerate(addrinfos):
+			tcp_sock = socket.socket(addrinfo.family, addrinfo.type)
 			if self.url.scheme.startswith('ssl'):
-				context = ssl.create_default_context()
-				context.check_hostname = False
-				context.verify_mode = ssl.CERT_NONE
-				tcp_sock = context.wrap_socket(tcp_sock)
-			tcp_sock.connect(self._addrinfo.sockaddr)
-			self._connection = tcp_sock
+				tcp_sock = _get_ssl_context().wrap_socket(tcp_sock)
+			try:
+				tcp_sock.connect(addrinfo.sockaddr)
+			except OSError:
+				tcp_sock.close()
+				if index == len(addrinfos) - 1:
+					raise
+				continue
+			self._addrinfo = addrinfo
+			return tcp_sock
+
+	def open(self):
+		if self.settings['type'] == 'client':
+			self._connection = self._connect(_get_addrinfos(self.url, self.settings))
 		elif self.settings['type'] == 'server':
+			self._addrinfo = _get_addrinfo(self.url, self.settings)
+			tcp_sock = socket.socket(self._addrinfo.family, self._addrinfo.type)
 			if self.url.scheme.startswith('ssl'):
 				raise protocon.ProtoconDriverError("{0} does not support server".format(self.url.scheme))
 			tcp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 			tcp_sock.bind(self._addrinfo.sockaddr)
-			tcp_sock.listen(1)
+			tcp_sock.listen(self.settings['backlog'])
 			self.print_status("Bound to {0}, waiting for a client to connect".format(self.url.authority()))
 			self._connection, peer_address = tcp_sock.accept()
-			self.print_status("Received connection from: {0}:{1}".format(
-				'[' + peer_address[0] + ']' if tcp_sock.family == socket.AF_INET6 else peer_address[0],
-				peer_address[1]
-			))
+			self.print_status('Received connection from: ' + _format_peer_address(tcp_sock.family, peer_address))
 		self.connected = True
 
-	def recv_size(self, size, timeout=None):
-		return self._recv(size, timeout)
+	def send(self, data):
+		self._connection.send(data)
+
+	def send_file(self, file_h, offset=0, length=None):
+		if length == 0:
+			return
+		self._connection.sendfile(file_h, offset, length)
 
-	def recv_timeout(self, timeout):
-		return self._recv(_inf, timeout)
+class AsyncConnectionDriver(protocon.AsyncStreamConnectionDriver):
+	schemes = SCHEMES
+	setting_definitions = SETTING_DEFINITIONS
+	url_attributes = ('host', 'port',)
+	def __init__(self, *args, **kwargs):
+		super(AsyncConnectionDriver, self).__init__(*args, **kwargs)
+		self._addrinfo = None
 
-	def recv_until(self, terminator, timeout=None):
-		return self._recv(_inf, timeout, terminator=terminator)
+	def get_capture_framer(self):
+		_, writer = self._connection
+		return protocon.capture.TCPFramer(writer.get_extra_info('sockname'), writer.get_extra_info('peername'))
 
-	def send(self, data):
-		self._connection.send(data)
+	async def _connect(self, addrinfos):
+		loop = asyncio.get_running_loop()
+		for index, addrinfo in enumerate(addrinfos):
+			tcp_sock = socket.socket(addrinfo.family, addrinfo.type)
+			tcp_sock.setblocking(False)
+			try:
+				await loop.sock_connect(tcp_sock, addrinfo.sockaddr)
+			except OSError:
+				tcp_sock.close()
+				if index == len(addrinfos) - 1:
+					raise
+				continue
+			except BaseException:
+				tcp_sock.close()
+				raise
+			self._addrinfo = addrinfo
+			return tcp_sock
+
+	async def open(self):
+		loop = asyncio.get_running_loop()
+		if self.settings['type'] == 'client':
+			addrinfos = await loop.run_in_executor(None, _get_addrinfos, self.url, self.settings)
+			tcp_sock = await self._connect(addrinfos)
+			if self.url.scheme.startswith('ssl'):
+				self._connection = await asyncio.open_connection(sock=tcp_sock, ssl=_get_ssl_context(), server_hostname=self.url.host)
+			else:
+				self._connection = await asyncio.open_connection(sock=tcp_sock)
+		elif self.settings['type'] == 'server':
+			if self.url.scheme.startswith('ssl'):
+				raise protocon.ProtoconDriverError("{0} does not support server".format(self.url.scheme))
+			self._addrinfo = await loop.run_in_executor(None, _get_addrinfo, self.url, self.settings)
+			tcp_sock = socket.socket(self._addrinfo.family, self._addrinfo.type)
+			tcp_sock.setblocking(False)
+			tcp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+			tcp_sock.bind(self._addrinfo.sockaddr)
+			client = loop.create_future()
+			def on_connection(reader, writer):
+				if client.done():
+					writer.close()
+				else:
+					client.set_result((reader, writer))
+			server = await asyncio.start_server(on_connection, sock=tcp_sock, backlog=self.settings['backlog'])
+			self.print_status("Bound to {0}, waiting for a client to connect".format(self.url.authority()))
+			try:
+				self._connection = await client
+			finally:
+				server.close()
+			peer_address = self._connection[1].get_extra_info('peername')
+			self.print_status('Received connection from: ' + _format_peer_address(tcp_sock.family, peer_address))
+		self.connected = True
+
+	async def _serve_client(self, client_sock, peer_address, handler, slots):
+		peer_address = _format_peer_address(client_sock.family, peer_address)
+		try:
+			client = self.__class__(self.url)
+			client._addrinfo = self._addrinfo
+			client._connection = await asyncio.open_connection(sock=client_sock)
+			client.connected = True
+			self.print_status('Received connection from: ' + peer_address)
+			try:
+				await handler(client)
+			finally:
+				if client.connected:
+					await client.close()
+		except (protocon.ProtoconError, OSError) as error:
+			self.print_error("Error while serving {0}: {1}".format(peer_address, getattr(error, 'message', None) or error))
+		finally:
+			if slots is not None:
+				slots.release()
+
+	async def serve(self, handler, max_clients=None):
+		if self.settings['type'] != 'server':
+			raise protocon.ProtoconDriverError('serving clients requires the server type')
+		if self.url.scheme.startswith('ssl'):
+			raise protocon.ProtoconDriverError("{0} does not support server".format(self.url.scheme))
+		loop = asyncio.get_running_loop()
+		self._addrinfo = await loop.run_in_executor(None, _get_addrinfo, self.url, self.settings)
+		tcp_sock = socket.socket(self._addrinfo.family, self._addrinfo.type)
+		tcp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		tcp_sock.setblocking(False)
+		tcp_sock.bind(self._addrinfo.sockaddr)
+		tcp_sock.listen(self.settings['backlog'])
+		self.print_status("Bound to {0}, waiting for clients to connect".format(self.url.authority()))
+		# a slot is acquired before accepting so clients beyond the limit wait
+		# in the listen backlog
+		slots = asyncio.Semaphore(max_clients) if max_clients else None
+		tasks = set()
+		try:
+			while True:
+				if slots is not None:
+					await slots.acquire()
+				try:
+					client_sock, peer_address = await loop.sock_accept(tcp_sock)
+				except BaseException:
+					if slots is not None:
+						slots.release()
+					raise
+				task = asyncio.ensure_future(self._serve_client(client_sock, peer_address, handler, slots))
+				tasks.add(task)
+				task.add_done_callback(tasks.discard)
+		finally:
+			tcp_sock.close()
+			for task in tasks:
+				task.cancel()
+			if tasks:
+				await asyncio.wait(tasks)
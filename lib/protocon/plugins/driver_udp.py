@@ -29,76 +29,228 @@
 #  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 #  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 #
-
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import functools
+import os
 import socket
-import time
+import struct
 
 import protocon
+import protocon.capture
+import protocon.resolver
 import protocon.utilities
 
-_inf = float('inf')
+SCHEMES = ('udp', 'udp4', 'udp6')
+SETTING_DEFINITIONS = (
+	protocon.ConnectionDriverSetting(name='ip6-scope-id'),
+	protocon.ConnectionDriverSetting(name='src'),
+	protocon.ConnectionDriverSetting(name='size', default_value=0xffff, type=protocon.utilities.literal_type(int)),
+	protocon.ConnectionDriverSetting(name='batch', default_value=64, type=protocon.utilities.literal_type(int)),
+)
+# the maximum number of messages for a single sendmmsg call, see: <linux/uio.h>
+UIO_MAXIOV = 1024
+# the largest payload of a single IPv4 UDP datagram
+MAX_DATAGRAM_SIZE = 0xffe3
 
-class ConnectionDriver(protocon.ConnectionDriver):
-	schemes = ('udp', 'udp4', 'udp6')
-	setting_definitions = (
-		protocon.ConnectionDriverSetting(name='ip6-scope-id'),
-		protocon.ConnectionDriverSetting(name='src'),
-		protocon.ConnectionDriverSetting(name='size', default_value=0xffff, type=protocon.utilities.literal_type(int)),
+class _IOVec(ctypes.Structure):
+	_fields_ = (('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t))
+
+class _MsgHdr(ctypes.Structure):
+	_fields_ = (
+		('msg_name', ctypes.c_void_p),
+		('msg_namelen', ctypes.c_uint32),
+		('msg_iov', ctypes.POINTER(_IOVec)),
+		('msg_iovlen', ctypes.c_size_t),
+		('msg_control', ctypes.c_void_p),
+		('msg_controllen', ctypes.c_size_t),
+		('msg_flags', ctypes.c_int)
 	)
+
+class _MMsgHdr(ctypes.Structure):
+	_fields_ = (('msg_hdr', _MsgHdr), ('msg_len', ctypes.c_uint))
+
+@functools.lru_cache(maxsize=None)
+def _get_libc():
+	# get libc if it provides recvmmsg and sendmmsg, otherwise None
+	try:
+		libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+		recvmmsg, sendmmsg = libc.recvmmsg, libc.sendmmsg
+	except (AttributeError, OSError, TypeError):
+		return None
+	recvmmsg.argtypes = (ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p)
+	sendmmsg.argtypes = (ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int)
+	return libc
+
+def _pack_sockaddr(family, sockaddr):
+	host = sockaddr[0].split('%', 1)[0]
+	if family == socket.AF_INET6:
+		return struct.pack('=H', family) + struct.pack('!HI', sockaddr[1], sockaddr[2]) + socket.inet_pton(family, host) + struct.pack('=I', sockaddr[3])
+	return struct.pack('=H', family) + struct.pack('!H', sockaddr[1]) + socket.inet_pton(family, host) + b'\x00' * 8
+
+def _raise_errno():
+	error = ctypes.get_errno()
+	raise OSError(error, os.strerror(error))
+
+def _get_addrinfo(url, settings):
+	family = {'udp': socket.AF_UNSPEC, 'udp4': socket.AF_INET, 'udp6': socket.AF_INET6}[url.scheme]
+	addrinfo = protocon.resolver.getaddrinfos(
+		url.host,
+		url.port,
+		family,
+		type=socket.SOCK_DGRAM,
+		proto=socket.IPPROTO_UDP
+	)
+	if not addrinfo:
+		raise protocon.ProtoconDriverError('getaddrinfo failed for the specified URL')
+	addrinfo = addrinfo[0]
+	if addrinfo.family == socket.AF_INET6 and settings['ip6-scope-id'] is not None:
+		scope_id = settings['ip6-scope-id']
+		scope_id = int(scope_id) if scope_id.isdigit() else socket.if_nametoindex(scope_id)
+		addrinfo = addrinfo._replace(sockaddr=addrinfo.sockaddr[:3] + (scope_id,))
+	return addrinfo
+
+def _get_socket(addrinfo, settings):
+	udp_sock = socket.socket(addrinfo.family, addrinfo.type)
+	if addrinfo.family == socket.AF_INET and addrinfo.sockaddr.address == '255.255.255.255':
+		udp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+	source = settings['src']
+	if source:
+		source = protocon.utilities.NetworkLocation.from_string(source)
+		udp_sock.bind(source.to_address())
+	else:
+		# bind to an ephemeral port now instead of on the first send so the
+		# local address is known
+		udp_sock.bind(('::' if addrinfo.family == socket.AF_INET6 else '0.0.0.0', 0))
+	return udp_sock
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+	def __init__(self):
+		self.queue = asyncio.Queue()
+
+	def datagram_received(self, data, addr):
+		self.queue.put_nowait(data)
+
+class ConnectionDriver(protocon.ConnectionDriver):
+	schemes = SCHEMES
+	setting_definitions = SETTING_DEFINITIONS
 	url_attributes = ('host', 'port',)
+	message_oriented = True
+	send_file_chunk_size = MAX_DATAGRAM_SIZE
 	def __init__(self, *args, **kwargs):
 		super(ConnectionDriver, self).__init__(*args, **kwargs)
 		self._addrinfo = None
+		self._recv_pool = None
+		self.recv_buffer_size = max(self.recv_buffer_size, self.settings['size'])
 
-	def _recv(self, size, timeout, terminator=None):
-		now = time.time()
-		expiration = _inf if timeout is None else time.time() + timeout
-		data = b''
-		while len(data) < size and (self._select(0) or expiration >= now):
-			if not self._select(max(expiration - now, 0)):
-				break
-			data += self._connection.recvfrom(self.settings['size'] if size == _inf else size)[0]
-			if terminator is not None and terminator in data:
-				data, terminator, _ = data.partition(terminator)
-				data += terminator
-				break
-			now = time.time()
-		return data
+	def _get_recv_pool(self):
+		# a preallocated buffer with a slot for each message in a batch
+		if self._recv_pool is None:
+			count, size = self.settings['batch'], self.settings['size']
+			buffer = (ctypes.c_char * (count * size))()
+			iovecs = (_IOVec * count)()
+			messages = (_MMsgHdr * count)()
+			for index in range(count):
+				iovecs[index].iov_base = ctypes.addressof(buffer) + index * size
+				iovecs[index].iov_len = size
+				messages[index].msg_hdr.msg_iov = ctypes.pointer(iovecs[index])
+				messages[index].msg_hdr.msg_iovlen = 1
+			self._recv_pool = (buffer, iovecs, messages)
+		return self._recv_pool
 
-	def open(self):
-		family = {'udp': socket.AF_UNSPEC, 'udp4': socket.AF_INET, 'udp6': socket.AF_INET6}[self.url.scheme]
-		addrinfo = protocon.utilities.getaddrinfos(
-			self.url.host,
-			self.url.port,
-			family,
-			type=socket.SOCK_DGRAM,
-			proto=socket.IPPROTO_UDP
-		)
-		if not addrinfo:
-			raise protocon.ProtoconDriverError('getaddrinfo failed for the specified URL')
-		self._addrinfo = addrinfo[0]
-		if self._addrinfo.family == socket.AF_INET6 and self.settings['ip6-scope-id'] is not None:
-			scope_id = self.settings['ip6-scope-id']
-			scope_id = int(scope_id) if scope_id.isdigit() else socket.if_nametoindex(scope_id)
-			self._addrinfo = self._addrinfo._replace(sockaddr=self._addrinfo.sockaddr[:3] + (scope_id,))
-
-		self._connection = socket.socket(self._addrinfo.family, self._addrinfo.type)
-		if self._addrinfo.family == socket.AF_INET and self._addrinfo.sockaddr.address == '255.255.255.255':
-			self._connection.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-		source = self.settings['src']
-		if source:
-			source = protocon.utilities.NetworkLocation.from_string(source)
-			self._connection.bind(source.to_address())
-		self.connected = True
+	def _recv_into(self, buffer):
+		return buffer[:self._connection.recvfrom_into(buffer)[0]]
 
-	def recv_size(self, size, timeout=None):
-		return self._recv(size, timeout)
+	def _recv_messages(self, limit):
+		libc = _get_libc()
+		if libc is None or limit < 2 or self.settings['batch'] < 2:
+			return super(ConnectionDriver, self)._recv_messages(limit)
+		buffer, _, messages = self._get_recv_pool()
+		count = libc.recvmmsg(self._connection.fileno(), messages, min(limit, len(messages)), socket.MSG_DONTWAIT, None)
+		if count == -1:
+			if ctypes.get_errno() in (errno.EAGAIN, errno.EINTR):
+				return []
+			_raise_errno()
+		size = self.settings['size']
+		view = memoryview(buffer)
+		return [bytes(view[index * size:index * size + messages[index].msg_len]) for index in range(count)]
 
-	def recv_timeout(self, timeout):
-		return self._recv(_inf, timeout)
+	def get_capture_framer(self):
+		return protocon.capture.UDPFramer(self._connection.getsockname(), self._addrinfo.sockaddr)
 
-	def recv_until(self, terminator, timeout=None):
-		return self._recv(_inf, timeout, terminator=terminator)
+	def open(self):
+		self._addrinfo = _get_addrinfo(self.url, self.settings)
+		self._connection = _get_socket(self._addrinfo, self.settings)
+		self.connected = True
 
 	def send(self, data):
 		self._connection.sendto(data, self._addrinfo.sockaddr)
+
+	def send_batch(self, messages):
+		libc = _get_libc()
+		if libc is None or len(messages) < 2:
+			return super(ConnectionDriver, self).send_batch(messages)
+		name = ctypes.create_string_buffer(_pack_sockaddr(self._addrinfo.family, self._addrinfo.sockaddr))
+		for start in range(0, len(messages), UIO_MAXIOV):
+			batch = [bytes(message) for message in messages[start:start + UIO_MAXIOV]]
+			# the iovecs point directly at the data of the bytes objects
+			iovecs = (_IOVec * len(batch))()
+			vector = (_MMsgHdr * len(batch))()
+			for index, message in enumerate(batch):
+				iovecs[index].iov_base = ctypes.cast(ctypes.c_char_p(message), ctypes.c_void_p)
+				iovecs[index].iov_len = len(message)
+				vector[index].msg_hdr.msg_name = ctypes.addressof(name)
+				vector[index].msg_hdr.msg_namelen = len(name) - 1
+				vector[index].msg_hdr.msg_iov = ctypes.pointer(iovecs[index])
+				vector[index].msg_hdr.msg_iovlen = 1
+			sent = 0
+			while sent < len(batch):
+				count = libc.sendmmsg(self._connection.fileno(), ctypes.cast(ctypes.addressof(vector) + sent * ctypes.sizeof(_MMsgHdr), ctypes.POINTER(_MMsgHdr)), len(batch) - sent, 0)
+				if count == -1:
+					if ctypes.get_errno() == errno.EINTR:
+						continue
+					_raise_errno()
+				sent += count
+
+class AsyncConnectionDriver(protocon.AsyncConnectionDriver):
+	schemes = SCHEMES
+	setting_definitions = SETTING_DEFINITIONS
+	url_attributes = ('host', 'port',)
+	message_oriented = True
+	send_file_chunk_size = MAX_DATAGRAM_SIZE
+	def __init__(self, *args, **kwargs):
+		super(AsyncConnectionDriver, self).__init__(*args, **kwargs)
+		self._addrinfo = None
+
+	async def _recv_chunk(self):
+		_, protocol = self._connection
+		return await protocol.queue.get()
+
+	def is_stale(self):
+		if super(AsyncConnectionDriver, self).is_stale():
+			return True
+		# datagrams that arrived while the connection was idle were not asked for
+		return self._connection is not None and not self._connection[1].queue.empty()
+
+	async def close(self):
+		if self._connection is not None:
+			transport, _ = self._connection
+			transport.close()
+		await super(AsyncConnectionDriver, self).close()
+
+	def get_capture_framer(self):
+		transport, _ = self._connection
+		return protocon.capture.UDPFramer(transport.get_extra_info('sockname'), self._addrinfo.sockaddr)
+
+	async def open(self):
+		loop = asyncio.get_running_loop()
+		self._addrinfo = await loop.run_in_executor(None, _get_addrinfo, self.url, self.settings)
+		udp_sock = _get_socket(self._addrinfo, self.settings)
+		self._connection = await loop.create_datagram_endpoint(_DatagramProtocol, sock=udp_sock)
+		self.connected = True
+
+	async def send(self, data):
+		transport, _ = self._connection
+		transport.sendto(data, self._addrinfo.sockaddr)
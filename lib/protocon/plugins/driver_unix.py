@@ -29,60 +29,45 @@
 #  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 #  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 #
-
+import asyncio
 import os
 import socket
 import stat
-import time
 
 import protocon
 import protocon.utilities
 
-_inf = float('inf')
+def _get_socket_path(url):
+	sock_path = os.path.sep + os.path.sep.join(url.path)
+	try:
+		st_mode = os.stat(sock_path).st_mode
+	except FileNotFoundError:
+		raise protocon.ProtoconDriverError('invalid unix socket path: ' + sock_path)
+	if not stat.S_ISSOCK(st_mode):
+		raise protocon.ProtoconDriverError('invalid unix socket path: ' + sock_path)
+	return sock_path
 
 class ConnectionDriver(protocon.ConnectionDriver):
 	schemes = ('unix',)
 	setting_definitions = ()
 	url_attributes = ()
-	def _recv(self, size, timeout, terminator=None):
-		now = time.time()
-		expiration = _inf if timeout is None else time.time() + timeout
-		data = b''
-		while len(data) < size and (self._select(0) or expiration >= now):
-			if not self._select(max(expiration - now, 0)):
-				break
-			chunk = self._connection.recv(1)
-			if not chunk:
-				self.connected = False
-				break
-			data += chunk
-			if terminator is not None and terminator in data:
-				data, terminator, _ = data.partition(terminator)
-				data += terminator
-				break
-			now = time.time()
-		return data
-
 	def open(self):
 		self._connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-		sock_path = os.path.sep + os.path.sep.join(self.url.path)
-		try:
-			st_mode = os.stat(sock_path).st_mode
-		except FileNotFoundError:
-			raise protocon.ProtoconDriverError('invalid unix socket path: ' + sock_path)
-		if not stat.S_ISSOCK(st_mode):
-			raise protocon.ProtoconDriverError('invalid unix socket path: ' + sock_path)
-		self._connection.connect(os.path.sep + os.path.sep.join(self.url.path))
+		self._connection.connect(_get_socket_path(self.url))
 		self.connected = True
 
-	def recv_size(self, size, timeout=None):
-		return self._recv(size, timeout)
-
-	def recv_timeout(self, timeout):
-		return self._recv(_inf, timeout)
-
-	def recv_until(self, terminator, timeout=None):
-		return self._recv(_inf, timeout, terminator=terminator)
-
 	def send(self, data):
 		self._connection.send(data)
+
+	def send_file(self, file_h, offset=0, length=None):
+		if length == 0:
+			return
+		self._connection.sendfile(file_h, offset, length)
+
+class AsyncConnectionDriver(protocon.AsyncStreamConnectionDriver):
+	schemes = ('unix',)
+	setting_definitions = ()
+	url_attributes = ()
+	async def open(self):
+		self._connection = await asyncio.open_unix_connection(_get_socket_path(self.url))
+		self.connected = True
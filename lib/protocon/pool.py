@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/pool.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import asyncio
+import collections
+import threading
+
+from . import errors
+
+RETRY_DELAY = 1.0
+
+class ConnectionPool(object):
+	"""
+	Keeps up to *size* connections open in the background so a new session
+	can take one without waiting for it to be established. Connections are
+	created by calling *factory* and opened with
+	:py:meth:`~protocon.connection_driver.ConnectionDriver.open` on a
+	background thread. Connections that are taken from the pool belong to the
+	caller and are replaced.
+
+	:param factory: A callable which returns a new, unopened connection driver.
+	:param int size: The number of connections to keep open.
+	"""
+	def __init__(self, factory, size):
+		if size < 1:
+			raise ValueError('size must be at least 1')
+		self.factory = factory
+		self.size = size
+		self.hits = 0
+		self.misses = 0
+		self.errors = 0
+		self.last_error = None
+		self._closed = False
+		self._condition = threading.Condition()
+		self._idle = collections.deque()
+		self._thread = threading.Thread(target=self._fill, name='protocon-pool', daemon=True)
+		self._thread.start()
+
+	def __len__(self):
+		return len(self._idle)
+
+	def _fill(self):
+		while True:
+			with self._condition:
+				while not self._closed and len(self._idle) >= self.size:
+					self._condition.wait()
+				if self._closed:
+					return
+			connection = self.factory()
+			try:
+				connection.open()
+			except (errors.ProtoconError, OSError) as error:
+				with self._condition:
+					self.errors += 1
+					self.last_error = error
+					self._condition.wait(RETRY_DELAY)
+				continue
+			with self._condition:
+				if self._closed:
+					break
+				self._idle.append(connection)
+		connection.close()
+
+	def get(self):
+		"""
+		Take an open connection from the pool, opening a new one if none are
+		available. Idle connections that are stale, such as those the remote
+		end has closed, are discarded.
+
+		:return: The open connection driver.
+		"""
+		with self._condition:
+			if self._closed:
+				raise RuntimeError('the connection pool is closed')
+			connection = None
+			stale = []
+			while self._idle and connection is None:
+				connection = self._idle.popleft()
+				if connection.is_stale():
+					stale.append(connection)
+					connection = None
+			self._condition.notify_all()
+			if connection is None:
+				self.misses += 1
+			else:
+				self.hits += 1
+		for stale_connection in stale:
+			stale_connection.close()
+		if connection is not None:
+			return connection
+		connection = self.factory()
+		connection.open()
+		return connection
+
+	def close(self):
+		"""Close the idle connections and stop opening new ones."""
+		with self._condition:
+			self._closed = True
+			idle = tuple(self._idle)
+			self._idle.clear()
+			self._condition.notify_all()
+		for connection in idle:
+			connection.close()
+
+class AsyncConnectionPool(object):
+	"""
+	The :py:mod:`asyncio` counterpart to :py:class:`.ConnectionPool` for
+	asynchronous connection drivers. Up to *size* connections are opened
+	concurrently by tasks on the running event loop, which are started by
+	the first call to :py:meth:`.get`.
+
+	:param factory: A callable which returns a new, unopened asynchronous connection driver.
+	:param int size: The number of connections to keep open.
+	"""
+	def __init__(self, factory, size):
+		if size < 1:
+			raise ValueError('size must be at least 1')
+		self.factory = factory
+		self.size = size
+		self.hits = 0
+		self.misses = 0
+		self.errors = 0
+		self.last_error = None
+		self._closed = False
+		self._idle = collections.deque()
+		self._slots = None
+		self._tasks = []
+
+	def __len__(self):
+		return len(self._idle)
+
+	async def _fill(self):
+		while True:
+			await self._slots.acquire()
+			connection = self.factory()
+			try:
+				await connection.open()
+			except (errors.ProtoconError, OSError) as error:
+				self.errors += 1
+				self.last_error = error
+				self._slots.release()
+				await asyncio.sleep(RETRY_DELAY)
+				continue
+			except BaseException:
+				self._slots.release()
+				raise
+			self._idle.append(connection)
+
+	def _start(self):
+		self._slots = asyncio.Semaphore(self.size)
+		self._tasks = [asyncio.ensure_future(self._fill()) for _ in range(self.size)]
+
+	async def get(self):
+		"""
+		Take an open connection from the pool, opening a new one if none are
+		available. Idle connections that are stale, such as those the remote
+		end has closed, are discarded.
+
+		:return: The open connection driver.
+		"""
+		if self._closed:
+			raise RuntimeError('the connection pool is closed')
+		if self._slots is None:
+			self._start()
+		while self._idle:
+			connection = self._idle.popleft()
+			self._slots.release()
+			if not connection.is_stale():
+				self.hits += 1
+				return connection
+			await connection.close()
+		self.misses += 1
+		connection = self.factory()
+		await connection.open()
+		return connection
+
+	async def close(self):
+		"""Close the idle connections and stop opening new ones."""
+		self._closed = True
+		for task in self._tasks:
+			task.cancel()
+		if self._tasks:
+			await asyncio.wait(self._tasks)
+		self._tasks = []
+		while self._idle:
+			await self._idle.popleft().close()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/readiness.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import selectors
+import time
+
+_inf = float('inf')
+
+class Deadline(object):
+	"""
+	A point in time by which an operation must complete. Deadlines are tracked
+	using :py:func:`time.monotonic` so they are unaffected by changes to the
+	system clock.
+	"""
+	__slots__ = ('expiration',)
+	def __init__(self, timeout=None):
+		self.expiration = _inf if timeout is None or timeout == _inf else time.monotonic() + timeout
+
+	def __repr__(self):
+		return "<{0} remaining={1!r} >".format(self.__class__.__name__, self.remaining())
+
+	@property
+	def expired(self):
+		return self.expiration <= time.monotonic()
+
+	def remaining(self):
+		"""
+		Get the number of seconds that remain until the deadline expires. This
+		is never negative and is infinite when no timeout was specified.
+
+		:rtype: float
+		"""
+		if self.expiration == _inf:
+			return _inf
+		return max(self.expiration - time.monotonic(), 0)
+
+class Poller(object):
+	"""
+	A readiness layer built on :py:mod:`selectors` (epoll on Linux) which can
+	wait for any number of objects to become readable in a single call.
+	Registered objects can be anything with a ``fileno`` method, including
+	:py:class:`~protocon.connection_driver.ConnectionDriver` instances.
+	"""
+	__slots__ = ('_selector',)
+	def __init__(self):
+		self._selector = selectors.DefaultSelector()
+
+	def __contains__(self, fileobj):
+		try:
+			self._selector.get_key(fileobj)
+		except (KeyError, ValueError):
+			return False
+		return True
+
+	def __len__(self):
+		return len(self._selector.get_map() or ())
+
+	def clear(self):
+		"""Unregister all of the registered objects."""
+		for key in tuple(self._selector.get_map().values()):
+			self._selector.unregister(key.fileobj)
+
+	def close(self):
+		self._selector.close()
+
+	def register(self, fileobj, data=None):
+		"""
+		Register *fileobj* to be watched for readability. *data* is returned by
+		:py:meth:`.wait` when the object is ready and defaults to *fileobj*.
+		"""
+		self._selector.register(fileobj, selectors.EVENT_READ, fileobj if data is None else data)
+
+	def unregister(self, fileobj):
+		self._selector.unregister(fileobj)
+
+	def wait(self, timeout=None):
+		"""
+		Wait for up to *timeout* seconds for one or more of the registered
+		objects to become readable. *timeout* may be a number, None or
+		:py:data:`float('inf')` to block indefinitely, or a :py:class:`.Deadline`.
+
+		:return: The data of each of the ready objects.
+		:rtype: list
+		"""
+		if isinstance(timeout, Deadline):
+			timeout = timeout.remaining()
+		if timeout == _inf:
+			timeout = None
+		return [key.data for key, _ in self._selector.select(timeout)]
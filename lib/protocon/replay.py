@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/replay.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import collections
+import socket
+import struct
+
+from . import errors
+
+# see: https://www.tcpdump.org/linktypes.html
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_USER0 = 147
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+_PCAP_MAGICS = {
+	b'\xd4\xc3\xb2\xa1': ('<', 1e-6),
+	b'\xa1\xb2\xc3\xd4': ('>', 1e-6),
+	b'\x4d\x3c\xb2\xa1': ('<', 1e-9),
+	b'\xa1\xb2\x3c\x4d': ('>', 1e-9),
+}
+_PCAPNG_MAGIC = b'\x0a\x0d\x0d\x0a'
+_PCAPNG_DIRECTIONS = {1: 'rx', 2: 'tx'}
+# the number of out of order segments that are held while waiting for the
+# data before them, once exceeded the missing data is assumed to be lost
+_MAX_PENDING_SEGMENTS = 64
+
+Packet = collections.namedtuple('Packet', ('timestamp', 'link_type', 'data', 'direction'))
+Packet.__doc__ = """
+A packet read from a capture file. *direction* is either ``rx``, ``tx`` or
+None when the capture does not record it.
+"""
+
+Step = collections.namedtuple('Step', ('timestamp', 'direction', 'data'))
+Step.__doc__ = """
+A single chunk of application data from a conversation, *direction* is
+``tx`` for data that was sent by the client and ``rx`` for data that was sent
+to it.
+"""
+
+_Segment = collections.namedtuple('_Segment', ('protocol', 'source', 'destination', 'sequence', 'flags', 'payload'))
+
+def _read_exact(file_h, size):
+	data = file_h.read(size)
+	if len(data) != size:
+		raise errors.ProtoconDataError('the capture file is truncated')
+	return data
+
+def _iter_options(data, endian):
+	position = 0
+	while position + 4 <= len(data):
+		code, length = struct.unpack_from(endian + 'HH', data, position)
+		if code == 0:
+			break
+		yield code, data[position + 4:position + 4 + length]
+		position += 4 + length + (-length % 4)
+
+def _read_pcap(file_h, magic):
+	endian, resolution = _PCAP_MAGICS[magic]
+	header = _read_exact(file_h, 20)
+	link_type = struct.unpack(endian + 'I', header[16:20])[0] & 0xffff
+	while True:
+		record = file_h.read(16)
+		if not record:
+			break
+		if len(record) != 16:
+			raise errors.ProtoconDataError('the capture file is truncated')
+		seconds, fraction, captured_length, _ = struct.unpack(endian + 'IIII', record)
+		yield Packet(seconds + fraction * resolution, link_type, _read_exact(file_h, captured_length), None)
+
+def _read_pcapng(file_h):
+	endian = '<'
+	interfaces = []
+	block_type = 0x0a0d0d0a
+	while True:
+		if block_type == 0x0a0d0d0a:
+			# the section header block determines the byte order of the section
+			header = _read_exact(file_h, 8)
+			length, byte_order = header[:4], header[4:]
+			endian = '<' if byte_order == b'\x4d\x3c\x2b\x1a' else '>'
+			length = struct.unpack(endian + 'I', length)[0]
+			_read_exact(file_h, length - 12)
+			interfaces = []
+		else:
+			length = struct.unpack(endian + 'I', _read_exact(file_h, 4))[0]
+			if length < 12:
+				raise errors.ProtoconDataError('the capture file contains an invalid block')
+			body = _read_exact(file_h, length - 12)
+			_read_exact(file_h, 4)
+			packet = _parse_pcapng_block(block_type, body, endian, interfaces)
+			if packet is not None:
+				yield packet
+		header = file_h.read(4)
+		if not header:
+			break
+		if len(header) != 4:
+			raise errors.ProtoconDataError('the capture file is truncated')
+		block_type = struct.unpack(endian + 'I', header)[0]
+
+def _parse_pcapng_block(block_type, body, endian, interfaces):
+	if block_type == 0x00000001:
+		# interface description block
+		link_type = struct.unpack_from(endian + 'H', body)[0]
+		resolution = 1e-6
+		offset = 0
+		for code, value in _iter_options(body[8:], endian):
+			if code == 9 and value:
+				resolution = 2 ** -(value[0] & 0x7f) if value[0] & 0x80 else 10 ** -value[0]
+			elif code == 14 and len(value) == 8:
+				offset = struct.unpack(endian + 'q', value)[0]
+		interfaces.append((link_type, resolution, offset))
+		return None
+	if block_type == 0x00000006:
+		# enhanced packet block
+		interface_id, high, low, captured_length = struct.unpack_from(endian + 'IIII', body)
+		data = body[20:20 + captured_length]
+		options = body[20 + captured_length + (-captured_length % 4):]
+	elif block_type == 0x00000002:
+		# obsolete packet block
+		interface_id, _, high, low, captured_length = struct.unpack_from(endian + 'HHIII', body)
+		data = body[20:20 + captured_length]
+		options = body[20 + captured_length + (-captured_length % 4):]
+	elif block_type == 0x00000003:
+		# simple packet block, these have no timestamp
+		link_type = interfaces[0][0] if interfaces else LINKTYPE_ETHERNET
+		original_length = struct.unpack_from(endian + 'I', body)[0]
+		return Packet(None, link_type, body[4:4 + original_length], None)
+	else:
+		return None
+	if interface_id >= len(interfaces):
+		raise errors.ProtoconDataError('the capture file references an unknown interface')
+	link_type, resolution, offset = interfaces[interface_id]
+	direction = None
+	for code, value in _iter_options(options, endian):
+		if code == 2 and len(value) == 4:
+			direction = _PCAPNG_DIRECTIONS.get(struct.unpack(endian + 'I', value)[0] & 0x03)
+	return Packet(((high << 32) | low) * resolution + offset, link_type, data, direction)
+
+def read_packets(file_h):
+	"""
+	Read the packets from a pcap or pcapng capture, including those written by
+	:py:class:`~protocon.capture.CaptureWriter`. The file is read
+	incrementally so captures of any size can be processed.
+
+	:param file_h: The binary file object to read the capture from.
+	:return: A generator of :py:class:`.Packet` instances.
+	"""
+	magic = file_h.read(4)
+	if magic == _PCAPNG_MAGIC:
+		return _read_pcapng(file_h)
+	if magic in _PCAP_MAGICS:
+		return _read_pcap(file_h, magic)
+	raise errors.ProtoconDataError('the file is not a pcap or pcapng capture')
+
+def _decode_ip(data):
+	if not data:
+		return None
+	version = data[0] >> 4
+	if version == 4:
+		header_length = (data[0] & 0x0f) * 4
+		total_length, fragment, protocol = struct.unpack_from('!H2xHxB', data, 2)
+		if fragment & 0x1fff:
+			return None
+		source, destination = socket.inet_ntop(socket.AF_INET, data[12:16]), socket.inet_ntop(socket.AF_INET, data[16:20])
+		payload = data[header_length:total_length]
+	elif version == 6:
+		payload_length, protocol = struct.unpack_from('!HB', data, 4)
+		source, destination = socket.inet_ntop(socket.AF_INET6, data[8:24]), socket.inet_ntop(socket.AF_INET6, data[24:40])
+		payload = data[40:40 + payload_length]
+		# skip the hop-by-hop, routing and destination options extension headers
+		while protocol in (0, 43, 60) and len(payload) >= 8:
+			protocol = payload[0]
+			payload = payload[(payload[1] + 1) * 8:]
+	else:
+		return None
+	if protocol == socket.IPPROTO_TCP and len(payload) >= 20:
+		source_port, destination_port, sequence, _, offset, flags = struct.unpack_from('!HHIIBB', payload)
+		return _Segment('tcp', (source, source_port), (destination, destination_port), sequence, flags, payload[(offset >> 4) * 4:])
+	if protocol == socket.IPPROTO_UDP and len(payload) >= 8:
+		source_port, destination_port = struct.unpack_from('!HH', payload)
+		return _Segment('udp', (source, source_port), (destination, destination_port), None, 0, payload[8:])
+	return None
+
+def _decode(packet):
+	data = packet.data
+	link_type = packet.link_type
+	if link_type == LINKTYPE_ETHERNET:
+		ether_type, data = struct.unpack_from('!H', data, 12)[0], data[14:]
+		while ether_type in (0x8100, 0x88a8) and len(data) >= 4:
+			ether_type, data = struct.unpack_from('!H', data, 2)[0], data[4:]
+		if ether_type not in (0x0800, 0x86dd):
+			return None
+	elif link_type == LINKTYPE_LINUX_SLL:
+		data = data[16:]
+	elif link_type == LINKTYPE_LINUX_SLL2:
+		data = data[20:]
+	elif link_type == LINKTYPE_NULL:
+		data = data[4:]
+	elif link_type not in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+		return None
+	return _decode_ip(data)
+
+class _Stream(object):
+	"""
+	Reassembles the payloads of the TCP segments sent in one direction,
+	removing retransmitted data and ordering segments that were captured out
+	of order.
+	"""
+	__slots__ = ('expected', 'pending')
+	def __init__(self, expected):
+		self.expected = expected
+		self.pending = {}
+
+	def _offset(self, sequence):
+		# the signed distance of a sequence number from the expected one
+		offset = (sequence - self.expected) & 0xffffffff
+		return offset - 0x100000000 if offset & 0x80000000 else offset
+
+	def _take(self, sequence, payload):
+		# remove the data before the expected sequence number, which has
+		# already been seen, and advance past the rest
+		payload = payload[max(-self._offset(sequence), 0):]
+		self.expected = (self.expected + len(payload)) & 0xffffffff
+		return payload
+
+	def add(self, sequence, payload):
+		"""
+		Add a segment and get the payloads that are now in order.
+
+		:param int sequence: The sequence number of the segment.
+		:param bytes payload: The payload of the segment.
+		:rtype: list
+		"""
+		if self._offset(sequence) > 0:
+			# the segment is ahead of the expected data
+			self.pending[sequence] = payload
+			if len(self.pending) <= _MAX_PENDING_SEGMENTS:
+				return []
+			# give up on the missing data and continue from the next segment
+			self.expected = min(self.pending, key=self._offset)
+			return self.flush(gaps=False)
+		payloads = [self._take(sequence, payload)]
+		payloads.extend(self.flush(gaps=False))
+		return [payload for payload in payloads if payload]
+
+	def flush(self, gaps=True):
+		"""
+		Get the pending payloads that are in order. When *gaps* is True, the
+		pending payloads after missing data are also returned.
+
+		:param bool gaps: Whether to skip over missing data.
+		:rtype: list
+		"""
+		payloads = []
+		while self.pending:
+			sequence = min(self.pending, key=self._offset)
+			if self._offset(sequence) > 0:
+				if not gaps:
+					break
+				self.expected = sequence
+			payload = self._take(sequence, self.pending.pop(sequence))
+			if payload:
+				payloads.append(payload)
+		return payloads
+
+def iter_steps(packets):
+	"""
+	Extract the application data of the first conversation in *packets*. The
+	client is the side that sent the first TCP SYN or the first payload, or
+	the outbound side when the capture records the direction. Retransmitted
+	TCP data is removed and segments that were captured out of order are
+	reordered. Packets that can not be decoded as TCP or UDP are
+	used as-is when their direction is known.
+
+	:param packets: The packets to extract the conversation from.
+	:return: A generator of :py:class:`.Step` instances.
+	"""
+	client = server = protocol = None
+	streams = {}
+	timestamp = None
+	for packet in packets:
+		segment = None
+		try:
+			segment = _decode(packet)
+		except (struct.error, ValueError, IndexError):
+			pass
+		if segment is None:
+			if packet.direction is not None and packet.data and packet.link_type == LINKTYPE_USER0:
+				yield Step(packet.timestamp, packet.direction, packet.data)
+			continue
+
+		if client is None:
+			is_syn = segment.protocol == 'tcp' and segment.flags & 0x12 == 0x02
+			if not (segment.payload or is_syn):
+				continue
+			if is_syn or packet.direction != 'rx':
+				client, server = segment.source, segment.destination
+			else:
+				client, server = segment.destination, segment.source
+			protocol = segment.protocol
+		if segment.protocol != protocol or {segment.source, segment.destination} != {client, server}:
+			continue
+		direction = 'tx' if segment.source == client else 'rx'
+		timestamp = packet.timestamp
+		if protocol != 'tcp':
+			if segment.payload:
+				yield Step(timestamp, direction, bytes(segment.payload))
+			continue
+		if segment.flags & 0x02:
+			# SYN consumes a sequence number
+			streams[direction] = _Stream((segment.sequence + 1) & 0xffffffff)
+			continue
+		if not segment.payload:
+			continue
+		stream = streams.get(direction)
+		if stream is None:
+			stream = streams[direction] = _Stream(segment.sequence)
+		for payload in stream.add(segment.sequence, segment.payload):
+			yield Step(timestamp, direction, bytes(payload))
+	# data that was held waiting for missing segments is used as-is
+	for direction, stream in streams.items():
+		for payload in stream.flush():
+			yield Step(timestamp, direction, bytes(payload))
+
+def open_steps(path):
+	"""
+	Open the capture file at *path* and extract the steps of its first
+	conversation as they are read. See :py:func:`.iter_steps` for details.
+
+	:param str path: The path to the capture file.
+	:return: A generator of :py:class:`.Step` instances.
+	"""
+	with open(path, 'rb') as file_h:
+		yield from iter_steps(read_packets(file_h))
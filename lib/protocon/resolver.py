@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/resolver.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import collections
+import concurrent.futures
+import ipaddress
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from . import utilities
+
+CACHE_VERSION = 1
+DEFAULT_TTL = 300.0
+DEFAULT_NEGATIVE_TTL = 10.0
+_DEFAULT_PROTOCOLS = {socket.SOCK_STREAM: socket.IPPROTO_TCP, socket.SOCK_DGRAM: socket.IPPROTO_UDP}
+
+ResolverStatistics = collections.namedtuple('ResolverStatistics', ('hits', 'misses', 'expired', 'errors', 'entries'))
+
+def _is_literal(host):
+	try:
+		ipaddress.ip_address(host.split('%', 1)[0])
+	except ValueError:
+		return False
+	return True
+
+def _make_sockaddr(family, address, port):
+	if family == socket.AF_INET6:
+		return utilities._SockAddr6(address[0], port, *address[1:])
+	return utilities._SockAddr4(address[0], port)
+
+def parse_hosts(file_h):
+	"""
+	Parse the contents of a hosts file in the format of ``/etc/hosts`` where
+	each line is an address followed by one or more names.
+
+	:param file_h: The open file to parse.
+	:return: A dictionary of each lowercase name and a tuple of its addresses.
+	:rtype: dict
+	"""
+	hosts = collections.OrderedDict()
+	for line in file_h:
+		fields = line.split('#', 1)[0].split()
+		if len(fields) < 2:
+			continue
+		try:
+			address = ipaddress.ip_address(fields[0])
+		except ValueError:
+			continue
+		if address.version == 6:
+			entry = (socket.AF_INET6, (str(address), 0, 0))
+		else:
+			entry = (socket.AF_INET, (str(address),))
+		for name in fields[1:]:
+			addresses = hosts.setdefault(name.lower(), ())
+			if entry not in addresses:
+				hosts[name.lower()] = addresses + (entry,)
+	return hosts
+
+class Resolver(object):
+	"""
+	A caching wrapper around :py:func:`socket.getaddrinfo`. The addresses of
+	each host name are cached for *ttl* seconds (failures for *negative_ttl*
+	seconds) and concurrent lookups of the same name share a single query.
+	Address literals are never cached. Names found in *hosts* take precedence
+	over the system resolver.
+
+	:param float ttl: The number of seconds to cache successful lookups for.
+	:param float negative_ttl: The number of seconds to cache failed lookups for.
+	:param dict hosts: Static addresses as returned by :py:func:`.parse_hosts`.
+	:param str path: An optional file to load the cache from and save it to.
+	:param int max_workers: The number of threads to pre-resolve names with.
+	"""
+	def __init__(self, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL, hosts=None, path=None, max_workers=32):
+		self.ttl = ttl
+		self.negative_ttl = negative_ttl
+		self.hosts = hosts or {}
+		self.path = path
+		self.max_workers = max_workers
+		self.hits = 0
+		self.misses = 0
+		self.expired = 0
+		self.errors = 0
+		self._cache = {}
+		self._executor = None
+		self._lock = threading.Lock()
+		self._pending = {}
+		if path is not None:
+			self.load(path)
+
+	@property
+	def statistics(self):
+		""":py:class:`.ResolverStatistics` describing the use of the cache."""
+		with self._lock:
+			return ResolverStatistics(self.hits, self.misses, self.expired, self.errors, len(self._cache))
+
+	def _query(self, name, future):
+		try:
+			try:
+				results = socket.getaddrinfo(name, None, family=socket.AF_UNSPEC, type=socket.SOCK_STREAM)
+			except OSError as error:
+				with self._lock:
+					self.errors += 1
+					self._cache[name] = (time.time() + self.negative_ttl, error)
+				future.set_exception(error)
+				return
+			addresses = []
+			for family, _, _, _, sockaddr in results:
+				if family not in (socket.AF_INET, socket.AF_INET6):
+					continue
+				address = (family, (sockaddr[0],) + tuple(sockaddr[2:]))
+				if address not in addresses:
+					addresses.append(address)
+			addresses = tuple(addresses)
+			with self._lock:
+				self._cache[name] = (time.time() + self.ttl, addresses)
+			future.set_result(addresses)
+		except BaseException as error:
+			# errors which are not cached, such as UnicodeError for a name that
+			# can not be encoded, are still passed to the waiting threads
+			future.set_exception(error)
+			raise
+		finally:
+			with self._lock:
+				del self._pending[name]
+
+	def lookup(self, host):
+		"""
+		Look up the addresses of *host*, using the cache when possible.
+
+		:param str host: The host name to look up.
+		:return: A tuple of ``(family, address)`` tuples.
+		:rtype: tuple
+		"""
+		name = host.lower()
+		with self._lock:
+			if name in self.hosts:
+				self.hits += 1
+				return self.hosts[name]
+			entry = self._cache.get(name)
+			if entry is not None:
+				expiration, result = entry
+				if expiration > time.time():
+					self.hits += 1
+					if isinstance(result, BaseException):
+						# raise a copy so the cached error does not accumulate tracebacks
+						raise result.__class__(*result.args)
+					return result
+				del self._cache[name]
+				self.expired += 1
+			future = self._pending.get(name)
+			if future is None:
+				# this thread performs the query, any others wait for it
+				self.misses += 1
+				future = self._pending[name] = concurrent.futures.Future()
+				query = True
+			else:
+				self.hits += 1
+				query = False
+		if query:
+			self._query(name, future)
+		return future.result()
+
+	def getaddrinfos(self, host, port=0, family=0, type=0, proto=0, flags=0):
+		"""
+		A cached version of :py:func:`protocon.utilities.getaddrinfos`. Queries
+		that specify *flags* or no socket *type* are not cached.
+
+		:return: A tuple of :py:class:`~protocon.utilities.AddrInfo` objects.
+		:rtype: tuple
+		"""
+		port = port or 0
+		if flags or not type or not isinstance(port, int) or not host or _is_literal(host):
+			return utilities.getaddrinfos(host, port, family=family, type=type, proto=proto, flags=flags)
+		proto = proto or _DEFAULT_PROTOCOLS.get(type, 0)
+		infos = []
+		for address_family, address in self.lookup(host):
+			if family and address_family != family:
+				continue
+			infos.append(utilities.AddrInfo(address_family, type, proto, '', _make_sockaddr(address_family, address, port)))
+		if not infos:
+			raise socket.gaierror(socket.EAI_NONAME, "no addresses found for {0}".format(host))
+		return tuple(infos)
+
+	def _get_executor(self):
+		if self._executor is None:
+			self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='protocon-resolver')
+		return self._executor
+
+	def prefetch(self, host):
+		"""
+		Start looking up *host* in the background so it is cached by the time
+		it is needed. Address literals and cached names are ignored.
+
+		:param str host: The host name to look up.
+		"""
+		if not host or _is_literal(host):
+			return
+		name = host.lower()
+		with self._lock:
+			if name in self.hosts or name in self._pending:
+				return
+			entry = self._cache.get(name)
+			if entry is not None and entry[0] > time.time():
+				return
+		self._get_executor().submit(self._prefetch, host)
+
+	def _prefetch(self, host):
+		try:
+			self.lookup(host)
+		except OSError:
+			pass
+
+	def resolve_all(self, hosts):
+		"""
+		Look up each of the *hosts* in parallel and wait for the results.
+
+		:param hosts: The host names to look up.
+		:return: A dictionary of each host and either its addresses or the error that occurred.
+		:rtype: dict
+		"""
+		futures = collections.OrderedDict()
+		for host in hosts:
+			if host and host not in futures and not _is_literal(host):
+				futures[host] = self._get_executor().submit(self.lookup, host)
+		results = collections.OrderedDict()
+		for host, future in futures.items():
+			try:
+				results[host] = future.result()
+			except OSError as error:
+				results[host] = error
+		return results
+
+	def load(self, path):
+		"""
+		Load the unexpired entries from a cache file written by
+		:py:meth:`.save`. Missing and invalid files are ignored.
+
+		:param str path: The path to the cache file.
+		"""
+		try:
+			with open(path, 'r') as file_h:
+				data = json.load(file_h)
+		except (OSError, ValueError):
+			return
+		if not isinstance(data, dict) or data.get('version') != CACHE_VERSION:
+			return
+		now = time.time()
+		with self._lock:
+			for name, entry in data.get('entries', {}).items():
+				try:
+					expiration = float(entry['expiration'])
+					addresses = tuple((int(family), tuple(address)) for family, address in entry['addresses'])
+				except (KeyError, TypeError, ValueError):
+					continue
+				if expiration > now and name not in self._cache:
+					self._cache[name] = (expiration, addresses)
+
+	def save(self, path=None):
+		"""
+		Save the unexpired, successful entries to a cache file so they can be
+		loaded by another process.
+
+		:param str path: The path to the cache file, defaults to :py:attr:`.path`.
+		"""
+		path = path or self.path
+		now = time.time()
+		with self._lock:
+			entries = {}
+			for name, (expiration, result) in self._cache.items():
+				if expiration > now and not isinstance(result, BaseException):
+					entries[name] = {'expiration': expiration, 'addresses': result}
+		directory = os.path.dirname(os.path.abspath(path))
+		fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+		try:
+			with os.fdopen(fd, 'w') as file_h:
+				json.dump({'version': CACHE_VERSION, 'entries': entries}, file_h)
+			os.replace(temp_path, path)
+		except OSError:
+			os.unlink(temp_path)
+			raise
+
+	def close(self):
+		"""Stop the pre-resolution threads and save the cache if a path was specified."""
+		if self._executor is not None:
+			self._executor.shutdown(wait=True)
+			self._executor = None
+		if self.path is not None:
+			self.save()
+
+_default_resolver = Resolver()
+
+def get_default_resolver():
+	"""
+	Get the resolver used by the connection drivers.
+
+	:rtype: :py:class:`.Resolver`
+	"""
+	return _default_resolver
+
+def set_default_resolver(resolver):
+	"""
+	Set the resolver used by the connection drivers.
+
+	:param resolver: The new default resolver.
+	:type resolver: :py:class:`.Resolver`
+	"""
+	global _default_resolver
+	_default_resolver = resolver
+
+def getaddrinfos(*args, **kwargs):
+	"""Call :py:meth:`.Resolver.getaddrinfos` on the default resolver."""
+	return _default_resolver.getaddrinfos(*args, **kwargs)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/script.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import collections
+import contextlib
+import hashlib
+import io
+import marshal
+import os
+import tempfile
+
+from . import __version__
+from . import commands
+from . import conversion
+from . import errors
+
+FORMAT_VERSION = 2
+# a single compiled script line, arguments is a dictionary of the parsed and
+# pre-decoded arguments for the command or None if the line must be executed as
+# is, for example because it contains variables that are expanded at runtime
+Operation = collections.namedtuple('Operation', ('line', 'command', 'arguments'))
+
+_ARGPARSERS = {
+	'recv_count': commands.recv_count_argparser(),
+	'recv_size': commands.recv_size_argparser(),
+	'recv_time': commands.recv_time_argparser(),
+	'recv_until': commands.recv_until_argparser(),
+	'send': commands.send_argparser(),
+	'send_file': commands.send_file_argparser(),
+}
+_memory_cache = {}
+
+def _compile_arguments(command, arguments, encoding):
+	parser = _ARGPARSERS.get(command)
+	if parser is None:
+		return None
+	# parse errors are reported when the line is executed
+	with contextlib.redirect_stderr(io.StringIO()):
+		try:
+			opts = parser.parse_args(arguments)
+		except SystemExit:
+			return None
+	opts = vars(opts)
+	decode = lambda string: conversion.decode(conversion.expand(string, encoding=encoding), encoding=encoding)
+	try:
+		if command == 'send':
+			opts['data'] = decode(opts['data'])
+		elif command == 'recv_until':
+			opts['data'] = tuple(decode(terminator) for terminator in opts['terminators'])
+			if not all(opts['data']):
+				return None
+		elif command == 'recv_count':
+			opts['count'] = conversion.eval_token(opts['count'])
+			if not isinstance(opts['count'], int):
+				return None
+		elif command == 'recv_size':
+			opts['size'] = conversion.eval_token(opts['size'])
+			if not isinstance(opts['size'], int):
+				return None
+		elif command == 'recv_time':
+			opts['time'] = conversion.eval_token(opts['time'])
+			if not isinstance(opts['time'], (float, int)):
+				return None
+	except (errors.ProtoconDataError, ValueError, UnicodeError):
+		# this includes undefined variables and data that can't be decoded,
+		# both are deferred until the line is executed so they are reported
+		# then
+		return None
+	return opts
+
+def _get_cache_path(path, stat, encoding):
+	cache_directory = get_cache_directory()
+	if cache_directory is None:
+		return None
+	key = repr((FORMAT_VERSION, __version__, path, stat.st_mtime_ns, stat.st_size, encoding))
+	return os.path.join(cache_directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.bin')
+
+def compile_lines(lines, encoding='utf-8'):
+	"""
+	Compile the lines of a protocon script into a tuple of
+	:py:class:`.Operation` instances. Comments are removed, the arguments of
+	the core commands are parsed and their data is decoded. Changes to the
+	``encoding`` setting are tracked so the data following them is decoded
+	correctly.
+
+	:param lines: The lines of the script.
+	:param str encoding: The encoding in use when the script starts.
+	:rtype: tuple
+	"""
+	operations = []
+	for line in lines:
+		if commands.is_comment(line):
+			continue
+		line = line.strip()
+		try:
+			command, arguments = commands.split_line(line)
+		except ValueError:
+			operations.append(Operation(line, None, None))
+			continue
+		if command == 'set' and len(arguments) == 2 and arguments[0] == 'encoding' and arguments[1] in conversion.ENCODINGS:
+			encoding = arguments[1]
+		operations.append(Operation(line, command, _compile_arguments(command, arguments, encoding)))
+	return tuple(operations)
+
+def get_cache_directory():
+	"""
+	Get the directory in which compiled scripts and the plugin manifest are
+	cached. This can be changed with the ``PROTOCON_CACHE_DIR`` environment
+	variable, setting it to an empty value disables the on-disk cache.
+
+	:rtype: str
+	"""
+	cache_directory = os.environ.get('PROTOCON_CACHE_DIR')
+	if cache_directory is not None:
+		return cache_directory or None
+	cache_directory = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+	return os.path.join(cache_directory, 'protocon', 'scripts')
+
+def load(path, encoding='utf-8'):
+	"""
+	Load the compiled form of the protocon script at *path*. Compiled scripts
+	are cached in memory and on disk, keyed by the path, its modification time
+	and the initial *encoding* so repeated runs skip parsing the script.
+
+	:param str path: The path to the script to load.
+	:param str encoding: The encoding in use when the script starts.
+	:return: The compiled operations.
+	:rtype: tuple
+	"""
+	path = os.path.abspath(os.path.expanduser(path))
+	stat = os.stat(path)
+	memory_key = (path, stat.st_mtime_ns, stat.st_size, encoding)
+	operations = _memory_cache.get(memory_key)
+	if operations is not None:
+		return operations
+
+	cache_path = _get_cache_path(path, stat, encoding)
+	if cache_path is not None:
+		try:
+			with open(cache_path, 'rb') as file_h:
+				version, operations = marshal.load(file_h)
+		except (EOFError, OSError, TypeError, ValueError):
+			operations = None
+		else:
+			if version == FORMAT_VERSION:
+				operations = tuple(Operation(*operation) for operation in operations)
+			else:
+				operations = None
+
+	if operations is None:
+		with open(path, 'r') as file_h:
+			operations = compile_lines(file_h.read().splitlines(), encoding=encoding)
+		if cache_path is not None:
+			_store(cache_path, operations)
+	_memory_cache[memory_key] = operations
+	return operations
+
+def _store(cache_path, operations):
+	directory = os.path.dirname(cache_path)
+	try:
+		os.makedirs(directory, exist_ok=True)
+		fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+	except OSError:
+		# the cache is an optimization, failing to write it is not an error
+		return
+	try:
+		with os.fdopen(fd, 'wb') as file_h:
+			marshal.dump((FORMAT_VERSION, tuple(tuple(operation) for operation in operations)), file_h)
+		os.replace(temp_path, cache_path)
+	except OSError:
+		os.unlink(temp_path)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/server.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import hyperlink
+
+from . import async_engine
+from . import errors
+from . import plugin_manager
+
+async def serve(url, scripts, max_clients=None, plugins=None, quiet=False, metrics=None):
+	"""
+	Listen on *url* and run each of the protocon *scripts* for every client
+	that connects, with up to *max_clients* clients being served concurrently
+	on the running event loop. This runs until it is cancelled.
+
+	:param str url: The URL to listen on, this must use the server type.
+	:param tuple scripts: The paths of the scripts to run for each client.
+	:param int max_clients: The maximum number of concurrent clients.
+	:param plugins: The plugins to load the connection driver from.
+	:type plugins: :py:class:`~protocon.plugin_manager.PluginManager`
+	:param bool quiet: The initial quiet setting for each client's engine.
+	:param metrics: The metrics for each client's engine to update.
+	:type metrics: :py:class:`~protocon.metrics.Metrics`
+	"""
+	if plugins is None:
+		plugins = plugin_manager.PluginManager()
+	if isinstance(url, str):
+		url = hyperlink.URL.from_text(url)
+	driver = plugins.get_async_connection_driver(url.scheme)
+	if driver is None:
+		raise errors.ProtoconDriverError('no asynchronous connection driver for scheme: ' + url.scheme)
+	listener = driver(url)
+
+	async def handler(connection):
+		engine = async_engine.AsyncEngine(connection, plugins=plugins, quiet=quiet, metrics=metrics)
+		try:
+			await engine.entry(scripts)
+		except errors.ProtoconError as error:
+			engine.print_error("{0}: {1}".format(error.__class__.__name__, error.message))
+
+	await listener.serve(handler, max_clients=max_clients)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/sink.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import hashlib
+import os
+
+from . import utilities
+
+class FileSink(object):
+	"""
+	A destination for received data which writes each chunk to a file as it
+	arrives and calculates the SHA-256 hash of the data incrementally.
+	Instances are callable so they can be used as a connection driver's
+	``recv_sink``.
+	"""
+	def __init__(self, path, append=False):
+		"""
+		:param str path: The path of the file to write.
+		:param bool append: Whether to append to the file instead of truncating it.
+		"""
+		self.path = path
+		self.sha256 = hashlib.sha256()
+		self.size = 0
+		self._file_h = open(path, 'ab+' if append else 'wb+')
+		self._file_h.seek(0, os.SEEK_END)
+		# the offset in the file of the first byte written by this sink
+		self.offset = self._file_h.tell()
+
+	def __call__(self, data):
+		self._file_h.write(data)
+		self.sha256.update(data)
+		self.size += len(data)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def __repr__(self):
+		return "<{0} path={1!r} size={2} >".format(self.__class__.__name__, self.path, self.size)
+
+	def close(self):
+		"""Close the file."""
+		self._file_h.close()
+
+	def hexdigest(self):
+		"""
+		Get the SHA-256 hash of the data written so far.
+
+		:rtype: str
+		"""
+		return self.sha256.hexdigest()
+
+	def view(self):
+		"""
+		Get a context manager which provides a read-only :py:class:`memoryview`
+		of the data written to the file, see :py:func:`~protocon.utilities.file_view`.
+		"""
+		self._file_h.flush()
+		return utilities.file_view(self._file_h, self.offset, self.size)
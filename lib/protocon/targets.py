@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  protocon/targets.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import asyncio
+import datetime
+import json
+import os
+import sys
+import time
+
+import hyperlink
+
+from . import async_engine
+from . import errors
+from . import plugin_manager
+from . import resolver
+
+def _summarize_io(history, direction):
+	return [{'size': record.size, 'crc': record.crc} for record in history if record.direction == direction]
+
+def _iter_targets(file_h):
+	for line in file_h:
+		line = line.strip()
+		if not line or line.startswith('#'):
+			continue
+		yield line
+
+def _prefetch(target):
+	# start resolving the host while the target waits in the queue, errors are
+	# reported when the target is run
+	try:
+		host = hyperlink.URL.from_text(target).host
+	except (hyperlink.URLParseError, ValueError):
+		return
+	resolver.get_default_resolver().prefetch(host)
+
+class TargetResult(object):
+	__slots__ = ('target', 'error', 'started', 'connect_time', 'duration', 'rx', 'rx_bytes', 'tx', 'tx_bytes')
+	def __init__(self, target):
+		self.target = target
+		self.error = None
+		self.started = datetime.datetime.now(datetime.timezone.utc)
+		self.connect_time = None
+		self.duration = None
+		self.rx = []
+		self.rx_bytes = 0
+		self.tx = []
+		self.tx_bytes = 0
+
+	def to_dict(self):
+		return {
+			'target': self.target,
+			'status': 'error' if self.error else 'ok',
+			'error': self.error,
+			'started': self.started.isoformat(),
+			'connect_time': self.connect_time,
+			'duration': self.duration,
+			'rx_bytes': self.rx_bytes,
+			'tx_bytes': self.tx_bytes,
+			'rx': self.rx,
+			'tx': self.tx,
+		}
+
+async def run_target(target, scripts, plugins, timeout=None, engine_kwargs=None):
+	"""
+	Run each of the protocon *scripts* against a single *target* URL using an
+	:py:class:`~protocon.async_engine.AsyncEngine` and record the results.
+	Errors are recorded in the result instead of being raised.
+
+	:param str target: The target URL.
+	:param tuple scripts: The paths of the scripts to run.
+	:param plugins: The plugins to load the connection driver from.
+	:type plugins: :py:class:`~protocon.plugin_manager.PluginManager`
+	:param float timeout: An optional time limit for the entire target.
+	:param dict engine_kwargs: Additional keyword arguments for the engine.
+	:rtype: :py:class:`.TargetResult`
+	"""
+	result = TargetResult(target)
+	started = time.monotonic()
+	engine = None
+	try:
+		engine = async_engine.AsyncEngine.from_url(hyperlink.URL.from_text(target), plugins=plugins, **(engine_kwargs or {}))
+		engine.print_rx = False
+		engine.print_tx = False
+		await asyncio.wait_for(_run_engine(engine, scripts, result), timeout)
+		# the engine reports errors and continues with the next command, the
+		# target still failed if any of them did
+		if engine.last_error is not None:
+			error = engine.last_error
+			result.error = "{0}: {1}".format(error.__class__.__name__, getattr(error, 'message', None) or error)
+	except asyncio.TimeoutError:
+		result.error = 'timed out'
+	except errors.ProtoconError as error:
+		result.error = "{0}: {1}".format(error.__class__.__name__, error.message)
+	except (OSError, ValueError, hyperlink.URLParseError) as error:
+		result.error = "{0}: {1}".format(error.__class__.__name__, error)
+	finally:
+		if engine is not None:
+			result.rx = _summarize_io(engine.io_history, 'rx')
+			result.rx_bytes = engine.rx_bytes
+			result.tx = _summarize_io(engine.io_history, 'tx')
+			result.tx_bytes = engine.tx_bytes
+			if engine.connection.connected:
+				await engine.connection.close()
+	result.duration = time.monotonic() - started
+	return result
+
+async def _run_engine(engine, scripts, result):
+	started = time.monotonic()
+	await engine.connection.open()
+	result.connect_time = time.monotonic() - started
+	await engine.entry(scripts)
+
+async def run_targets(targets, scripts, concurrency=100, plugins=None, timeout=None, output=None):
+	"""
+	Run each of the protocon *scripts* against each URL in *targets* with up
+	to *concurrency* targets in progress at once. The result of each target is
+	written to *output* as a line of JSON as soon as it completes.
+
+	:param targets: The target URLs, either an iterable or a file object.
+	:param tuple scripts: The paths of the scripts to run.
+	:param int concurrency: The maximum number of targets to run at once.
+	:param plugins: The plugins to load the connection drivers from.
+	:type plugins: :py:class:`~protocon.plugin_manager.PluginManager`
+	:param float timeout: An optional time limit for each target.
+	:param output: The stream to write the results to.
+	:return: The number of targets that completed and the number that failed.
+	:rtype: tuple
+	"""
+	if concurrency < 1:
+		raise ValueError('concurrency must be at least 1')
+	if plugins is None:
+		plugins = plugin_manager.PluginManager()
+	output = output or sys.stdout
+	loop = asyncio.get_running_loop()
+	queue = asyncio.Queue(maxsize=concurrency * 2)
+	counts = {'completed': 0, 'failed': 0}
+
+	async def produce():
+		# read targets in a thread so a slow stream (like a pipe on stdin)
+		# doesn't block the sessions that are already running
+		iterator = _iter_targets(targets)
+		while True:
+			target = await loop.run_in_executor(None, next, iterator, None)
+			if target is None:
+				break
+			_prefetch(target)
+			await queue.put(target)
+		for _ in range(concurrency):
+			await queue.put(None)
+
+	with open(os.devnull, 'w') as devnull:
+		engine_kwargs = {'quiet': True, 'colors': False, 'stdout': devnull}
+		async def consume():
+			while True:
+				target = await queue.get()
+				if target is None:
+					break
+				result = await run_target(target, scripts, plugins, timeout=timeout, engine_kwargs=engine_kwargs)
+				counts['completed'] += 1
+				if result.error:
+					counts['failed'] += 1
+				output.write(json.dumps(result.to_dict()) + '\n')
+				output.flush()
+
+		await asyncio.gather(produce(), *(consume() for _ in range(concurrency)))
+	return counts['completed'], counts['failed']
@@ -32,8 +32,11 @@
 
 import ast
 import collections
+import contextlib
 import functools
 import ipaddress
+import mmap
+import os
 import re
 import socket
 
@@ -41,6 +44,45 @@ AddrInfo = collections.namedtuple('AddrInfo', ('family', 'type', 'proto', 'canon
 _SockAddr4 = collections.namedtuple('_SockAddr4', ('address', 'port'))
 _SockAddr6 = collections.namedtuple('_SockAddr6', ('address', 'port', 'flow_info', 'socpe_id'))
 
+def bool_type(value):
+	"""
+	Parse a boolean setting value such as ``true``, ``false``, ``1`` or ``0``.
+
+	:rtype: bool
+	"""
+	if isinstance(value, bool):
+		return value
+	value = str(value).lower()
+	if value in ('1', 'on', 'true', 'yes'):
+		return True
+	if value in ('0', 'off', 'false', 'no'):
+		return False
+	raise TypeError('value is not a bool')
+
+@contextlib.contextmanager
+def file_view(file_h, offset=0, length=None):
+	"""
+	A context manager which provides a read-only :py:class:`memoryview` of a
+	region of *file_h*. The file is memory-mapped so the region is not read
+	into memory, any views derived from it must be released before the
+	context exits.
+
+	:param file_h: The open file to map.
+	:param int offset: The offset of the start of the region.
+	:param int length: The length of the region, defaults to the rest of the file.
+	"""
+	size = os.fstat(file_h.fileno()).st_size
+	if length is None:
+		length = size - offset
+	if offset < 0 or length < 0 or offset + length > size:
+		raise ValueError('the region is outside of the file')
+	if not length:
+		yield memoryview(b'')
+		return
+	with mmap.mmap(file_h.fileno(), 0, access=mmap.ACCESS_READ) as file_map:
+		with memoryview(file_map) as view, view[offset:offset + length] as region:
+			yield region
+
 def getaddrinfos(host, port=0, family=0, type=0, proto=0, flags=0):
 	"""
 	Return the results from :py:func:`socket.getaddrinfo` but as a tuple of
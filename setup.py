@@ -83,6 +83,8 @@ setup(
 		'pyserial>=3.4',
 		'termcolor>=1.1.0',
 	],
+	# bytes.hex with a separator, used to render hexdumps, requires 3.8
+	python_requires='>=3.8',
 	package_dir={'': 'lib'},
 	packages=find_packages('lib'),
 	classifiers=[
@@ -93,8 +95,6 @@ setup(
 		'Intended Audience :: System Administrators',
 		'License :: OSI Approved :: BSD License',
 		'Operating System :: OS Independent',
-		'Programming Language :: Python :: 3.6',
-		'Programming Language :: Python :: 3.7',
 		'Programming Language :: Python :: 3.8',
 		'Programming Language :: Python :: 3.9',
 		'Programming Language :: Python :: 3.10',
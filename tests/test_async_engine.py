@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  tests/test_async_engine.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import asyncio
+import io
+import os
+import tempfile
+import unittest
+
+import hyperlink
+
+from protocon import async_engine
+from protocon.plugins import driver_null
+
+class _ResetConnectionDriver(driver_null.AsyncConnectionDriver):
+	async def send(self, data):
+		raise ConnectionResetError('connection reset by peer')
+
+class AsyncEngineTests(unittest.TestCase):
+	def _engine(self, driver=driver_null.AsyncConnectionDriver):
+		self.stdout = io.StringIO()
+		engine = async_engine.AsyncEngine(driver(hyperlink.URL.from_text('null://')), colors=False, stdout=self.stdout)
+		asyncio.run(engine.connection.open())
+		return engine
+
+	def _script(self, content):
+		file_h = tempfile.NamedTemporaryFile('w', suffix='.pro', delete=False)
+		self.addCleanup(os.unlink, file_h.name)
+		with file_h:
+			file_h.write(content)
+		return file_h.name
+
+	def test_invalid_sleep(self):
+		engine = self._engine()
+		self.assertFalse(asyncio.run(engine.onecmd('sleep abc')))
+		self.assertIn('ValueError', self.stdout.getvalue())
+		self.assertIsInstance(engine.last_error, ValueError)
+		self.assertFalse(asyncio.run(engine.onecmd('send "def"')))
+		self.assertEqual([bytes(data) for data in engine.io_history.tx], [b'def'])
+
+	def test_malformed_line(self):
+		engine = self._engine()
+		self.assertFalse(asyncio.run(engine.onecmd('send "abc')))
+		self.assertIn('ValueError: No closing quotation', self.stdout.getvalue())
+
+	def test_missing_script(self):
+		engine = self._engine()
+		path = os.path.join(tempfile.gettempdir(), 'protocon-missing-script.pro')
+		self.assertFalse(asyncio.run(engine.run_script(path)))
+		self.assertIn('Problem accessing script', self.stdout.getvalue())
+		self.assertIsInstance(engine.last_error, OSError)
+
+	def test_transport_error(self):
+		engine = self._engine(_ResetConnectionDriver)
+		path = self._script('send "abc"\nsleep 0\nsend "def"\n')
+		self.assertFalse(asyncio.run(engine.run_script(path)))
+		self.assertEqual(self.stdout.getvalue().count('ConnectionResetError: connection reset by peer'), 2)
+		self.assertFalse(asyncio.run(engine.onecmd('send "ghi"')))
+		self.assertEqual(self.stdout.getvalue().count('ConnectionResetError'), 3)
+
+if __name__ == '__main__':
+	unittest.main()
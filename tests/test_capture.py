@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  tests/test_capture.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import os
+import tempfile
+import unittest
+
+from protocon import capture
+from protocon import replay
+
+class CaptureWriterTests(unittest.TestCase):
+	def setUp(self):
+		file_h = tempfile.NamedTemporaryFile(suffix='.pcapng', delete=False)
+		file_h.close()
+		self.addCleanup(os.unlink, file_h.name)
+		self.path = file_h.name
+
+	def _read_packets(self):
+		with open(self.path, 'rb') as file_h:
+			return list(replay.read_packets(file_h))
+
+	def test_large_region_is_chunked(self):
+		data = bytearray(os.urandom(200000))
+		with capture.CaptureWriter(self.path) as writer:
+			with memoryview(data) as view:
+				writer.write('rx', view, timestamp=1)
+		packets = self._read_packets()
+		self.assertEqual(writer.packets, 4)
+		self.assertTrue(all(len(packet.data) <= capture._MAX_SEGMENT for packet in packets))
+		self.assertEqual(b''.join(packet.data for packet in packets), data)
+		# the region's buffer was not exported, so it can be resized again
+		data.clear()
+
+	def _round_trip(self, framer, chunks, background=True):
+		with capture.CaptureWriter(self.path, framer, background=background) as writer:
+			for timestamp, (direction, data) in enumerate(chunks, 1):
+				writer.write(direction, data, timestamp=timestamp * 1000000000 + 1)
+		return writer
+
+	def test_round_trip(self):
+		chunks = [('tx', b'GET / HTTP/1.0\r\n\r\n'), ('rx', b'HTTP/1.0 200 OK\r\n'), ('rx', b'\r\nbody')]
+		for background in (False, True):
+			with self.subTest(background=background):
+				writer = self._round_trip(capture.Framer(), chunks, background=background)
+				packets = self._read_packets()
+				self.assertEqual(writer.packets, 3)
+				self.assertEqual([(packet.direction, packet.data) for packet in packets], chunks)
+				self.assertTrue(all(packet.link_type == capture.LINKTYPE_USER0 for packet in packets))
+				for index, packet in enumerate(packets, 1):
+					self.assertAlmostEqual(packet.timestamp, index + 1e-9)
+				steps = list(replay.open_steps(self.path))
+				self.assertEqual([(step.direction, step.data) for step in steps], chunks)
+
+	def test_round_trip_tcp(self):
+		chunks = [('tx', b'hello'), ('rx', os.urandom(100000)), ('tx', b'bye')]
+		for family, local, remote in (('ipv4', ('192.0.2.1', 40000), ('192.0.2.2', 80)), ('ipv6', ('2001:db8::1', 40000, 0, 0), ('2001:db8::2', 80, 0, 0))):
+			with self.subTest(family=family):
+				self._round_trip(capture.TCPFramer(local, remote), chunks)
+				packets = self._read_packets()
+				self.assertTrue(all(packet.link_type == capture.LINKTYPE_ETHERNET for packet in packets))
+				steps = list(replay.open_steps(self.path))
+				self.assertEqual(b''.join(step.data for step in steps if step.direction == 'rx'), chunks[1][1])
+				self.assertEqual([step.data for step in steps if step.direction == 'tx'], [b'hello', b'bye'])
+
+	def test_round_trip_udp(self):
+		chunks = [('tx', b'query'), ('rx', b'answer')]
+		self._round_trip(capture.UDPFramer(('192.0.2.1', 40000), ('192.0.2.2', 53)), chunks)
+		self.assertEqual([(step.direction, step.data) for step in replay.open_steps(self.path)], chunks)
+
+	def test_set_framer(self):
+		with capture.CaptureWriter(self.path, capture.Framer()) as writer:
+			with self.assertRaises(ValueError):
+				writer.set_framer(capture.TCPFramer(('192.0.2.1', 1), ('192.0.2.2', 2)))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  tests/test_color.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import io
+import unittest
+
+from protocon import color
+
+class HexdumpTests(unittest.TestCase):
+	def _hexdump(self, data, **kwargs):
+		stream = io.StringIO()
+		color.print_hexdump(data, stream=stream, **kwargs)
+		return stream.getvalue().splitlines()
+
+	def test_rows(self):
+		lines = self._hexdump(b'ABCDEFGHIJKLMNOPqrs')
+		self.assertEqual(lines[0], '0000  41 42 43 44 45 46 47 48  49 4a 4b 4c 4d 4e 4f 50  ABCDEFGH IJKLMNOP ')
+		self.assertEqual(lines[1].rstrip(), '0010  71 72 73                                          qrs')
+
+	def test_truncated(self):
+		lines = self._hexdump(bytes(200), max_bytes=32)
+		self.assertIn('... 160 bytes omitted ...', lines)
+		self.assertEqual(len(lines), 4)
+
+	def test_nothing_omitted(self):
+		lines = self._hexdump(bytes(40), max_bytes=32)
+		self.assertFalse(any('omitted' in line for line in lines))
+		self.assertEqual(len(lines), 3)
+
+if __name__ == '__main__':
+	unittest.main()
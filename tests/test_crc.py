@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  tests/test_crc.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import functools
+import os
+import unittest
+
+import crcelk
+
+from protocon import crc
+
+_DATA = b'123456789' + os.urandom(1000)
+
+def _reflected_table(poly_mask):
+	table = []
+	for byte in range(256):
+		value = byte
+		for _ in range(8):
+			value = (value >> 1) ^ poly_mask if value & 1 else value >> 1
+		table.append(value)
+	return tuple(table)
+
+def _unreflected_table(poly_mask, width):
+	table = []
+	for byte in range(256):
+		value = byte << (width - 8)
+		for _ in range(8):
+			value = (value << 1) ^ poly_mask if value & (1 << (width - 1)) else value << 1
+		table.append(value & ((1 << width) - 1))
+	return tuple(table)
+
+class CrcTests(unittest.TestCase):
+	def test_algorithms(self):
+		for name, algorithm in crcelk.algorithms.items():
+			with self.subTest(algorithm=name):
+				for data in (b'', b'\x00', b'123456789', _DATA):
+					self.assertEqual(crc.Crc(name, data).value, algorithm.calc_bytes(data))
+
+	def test_incremental(self):
+		for name in crc.algorithm_names():
+			with self.subTest(algorithm=name):
+				checksum = crc.Crc(name)
+				for position in range(0, len(_DATA), 7):
+					checksum.update(memoryview(_DATA)[position:position + 7])
+				self.assertEqual(checksum.value, crc.Crc(name, _DATA).value)
+				self.assertEqual(checksum.length, len(_DATA))
+
+	def test_copy(self):
+		checksum = crc.Crc('crc-16', b'1234')
+		other = checksum.copy()
+		other.update(b'56789')
+		self.assertEqual(checksum.value, crc.Crc('crc-16', b'1234').value)
+		self.assertEqual(other.value, crc.Crc('crc-16', b'123456789').value)
+
+	def test_fast_paths(self):
+		# the zlib and binascii implementations match the table driven ones
+		update, _ = crc._get_updater('crc-32')
+		self.assertIs(update, crc._update_crc32)
+		table_update = functools.partial(crc._update_reflected, _reflected_table(0xedb88320))
+		self.assertEqual(update(0xffffffff, _DATA), table_update(0xffffffff, _DATA))
+		for name in ('crc-ccitt', 'crc-xmodem'):
+			update, _ = crc._get_updater(name)
+			self.assertIs(update, crc._update_crc_hqx)
+			table_update = functools.partial(crc._update_unreflected, _unreflected_table(0x1021, 16), 8, 0xffff)
+			seed = int(crc._get_algorithm(name).seed)
+			self.assertEqual(update(seed, _DATA), table_update(seed, _DATA))
+
+	def test_known_values(self):
+		self.assertEqual(crc.Crc('crc-32', b'123456789').hexdigest(), '0xcbf43926')
+		self.assertEqual(crc.Crc('CRC-32C', b'123456789').value, 0xe3069283)
+		self.assertEqual(crc.Crc('crc-xmodem', b'123456789').value, 0x31c3)
+
+	def test_unknown_algorithm(self):
+		with self.assertRaises(ValueError):
+			crc.Crc('crc-0')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  tests/test_headless.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import io
+import os
+import struct
+import tempfile
+import unittest
+
+import hyperlink
+
+from protocon import headless
+from protocon import metrics
+from protocon import script
+from protocon.plugins import driver_null
+
+_TIMESTAMPS = (1600000000123456789, 1600000000987654321)
+
+class _RingConnectionDriver(driver_null.ConnectionDriver):
+	# reports kernel timestamps and counters like a driver using a packet ring
+	def recv_count(self, count, timeout=None):
+		self.recv_timestamps[:] = _TIMESTAMPS
+		return [b'abc', b'def']
+
+	def get_statistics(self):
+		return {'ring_received': 2, 'ring_dropped': 1, 'ring_freezes': 0}
+
+def _capture_timestamps(path):
+	# get the timestamps of the enhanced packet blocks in a pcapng file
+	timestamps = []
+	with open(path, 'rb') as file_h:
+		data = file_h.read()
+	offset = 0
+	while offset < len(data):
+		block_type, length = struct.unpack_from('<II', data, offset)
+		if block_type == 6:
+			high, low = struct.unpack_from('<II', data, offset + 12)
+			timestamps.append((high << 32) | low)
+		offset += length
+	return timestamps
+
+class HeadlessEngineTests(unittest.TestCase):
+	def setUp(self):
+		self.stdout = io.StringIO()
+		connection = driver_null.ConnectionDriver(hyperlink.URL.from_text('null://'))
+		self.engine = headless.HeadlessEngine(connection, colors=False, stdout=self.stdout)
+
+	def test_malformed_line(self):
+		self.assertFalse(self.engine.onecmd('send "abc'))
+		self.assertIn('ValueError: No closing quotation', self.stdout.getvalue())
+		self.assertEqual(len(self.engine.io_history), 0)
+
+	def test_malformed_script_line(self):
+		file_h = tempfile.NamedTemporaryFile('w', suffix='.pro', delete=False)
+		self.addCleanup(os.unlink, file_h.name)
+		with file_h:
+			file_h.write('send "abc\nsend "def"\n')
+		self.assertIsNone(script.compile_lines(['send "abc'])[0].arguments)
+		self.assertFalse(self.engine.run_script(file_h.name))
+		self.assertIn('ValueError: No closing quotation', self.stdout.getvalue())
+		# execution continues with the next line
+		self.assertEqual([bytes(data) for data in self.engine.io_history.tx], [b'def'])
+
+class KernelTimestampTests(unittest.TestCase):
+	def setUp(self):
+		self.stdout = io.StringIO()
+		connection = _RingConnectionDriver(hyperlink.URL.from_text('null://'))
+		self.engine = headless.HeadlessEngine(connection, colors=False, stdout=self.stdout)
+
+	def test_recorded_timestamps(self):
+		file_h = tempfile.NamedTemporaryFile(suffix='.pcapng', delete=False)
+		file_h.close()
+		self.addCleanup(os.unlink, file_h.name)
+		self.engine.capture = file_h.name
+		self.engine.onecmd('recv_count 2')
+		self.engine.capture = ''
+		self.assertEqual(_capture_timestamps(file_h.name), list(_TIMESTAMPS))
+		self.assertEqual(self.engine.io_history.rx.records()[-1].timestamp, _TIMESTAMPS[0] / 1e9)
+
+	def test_connection_statistics(self):
+		self.engine.onecmd('stats')
+		self.assertIn('Connection ring_dropped: 1', self.stdout.getvalue())
+		session_metrics = metrics.Metrics()
+		session_metrics.add_engine(self.engine)
+		self.assertEqual(session_metrics.snapshot()['connection']['ring_dropped'], 1)
+		self.assertIn('protocon_connection_ring_dropped 1', metrics.to_prometheus(session_metrics.snapshot()))
+
+if __name__ == '__main__':
+	unittest.main()
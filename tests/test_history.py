@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  tests/test_history.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import unittest
+
+from protocon import history
+
+class IOHistoryTests(unittest.TestCase):
+	def _history(self, **kwargs):
+		io_history = history.IOHistory(**kwargs)
+		self.addCleanup(io_history.close)
+		return io_history
+
+	def test_unbounded(self):
+		io_history = self._history()
+		io_history.append('tx', b'abc', crc='0x01')
+		io_history.append('rx', b'defg')
+		io_history.append('tx', b'')
+		self.assertEqual(len(io_history), 3)
+		self.assertEqual([bytes(data) for data in io_history.tx], [b'abc', b''])
+		self.assertEqual(io_history.rx[-1], b'defg')
+		self.assertEqual([record.crc for record in io_history], ['0x01', None, None])
+		self.assertEqual(io_history.memory_bytes, 7)
+
+	def test_evict_max_bytes(self):
+		io_history = self._history(max_bytes=8)
+		records = [io_history.append('tx', data) for data in (b'aaaa', b'bbbb', b'cccc')]
+		self.assertEqual(list(io_history.tx), [b'bbbb', b'cccc'])
+		self.assertEqual(io_history.memory_bytes, 8)
+		with self.assertRaises(KeyError):
+			io_history.get_data(records[0])
+		self.assertEqual(io_history.get_data(records[2]), b'cccc')
+
+	def test_evict_max_entries(self):
+		io_history = self._history(max_entries=2)
+		for data in (b'a', b'bb', b'ccc'):
+			io_history.append('rx', data)
+		self.assertEqual(list(io_history.rx), [b'bb', b'ccc'])
+		self.assertEqual(len(io_history), 2)
+
+	def test_oversized_entry(self):
+		io_history = self._history(max_bytes=4)
+		io_history.append('rx', b'ab')
+		record = io_history.append('rx', b'0123456789')
+		# data that can never fit is not kept and evicts everything else
+		self.assertEqual(len(io_history), 0)
+		self.assertEqual(io_history.memory_bytes, 0)
+		with self.assertRaises(KeyError):
+			io_history.get_data(record)
+		io_history.append('tx', b'cd')
+		self.assertEqual(list(io_history.tx), [b'cd'])
+
+	def test_spill(self):
+		io_history = self._history(max_bytes=4, spill=True)
+		records = [io_history.append('tx' if index % 2 else 'rx', bytes([0x61 + index]) * 3) for index in range(5)]
+		self.assertEqual(len(io_history), 5)
+		self.assertEqual(io_history.memory_bytes, 3)
+		self.assertEqual(io_history.spilled_bytes, 12)
+		self.assertEqual([io_history.get_data(record) for record in records], [b'aaa', b'bbb', b'ccc', b'ddd', b'eee'])
+		# more data is spilled after the file was mapped to read the first entries
+		records.append(io_history.append('rx', b'ffff'))
+		records.append(io_history.append('rx', b'0123456789'))
+		self.assertEqual(io_history.get_data(records[4]), b'eee')
+		self.assertEqual(io_history.get_data(records[5]), b'ffff')
+		self.assertEqual(io_history.get_data(records[6]), b'0123456789')
+		self.assertEqual(list(io_history.rx), [b'aaa', b'ccc', b'eee', b'ffff', b'0123456789'])
+
+	def test_spill_enabled_later(self):
+		io_history = self._history(max_bytes=4)
+		evicted = io_history.append('rx', b'abc')
+		io_history.append('rx', b'def')
+		io_history.spill = True
+		kept = io_history.append('rx', b'ghi')
+		# only data evicted after spilling was enabled is available
+		with self.assertRaises(KeyError):
+			io_history.get_data(evicted)
+		self.assertEqual(list(io_history.rx), [b'def', b'ghi'])
+		self.assertEqual(io_history.get_data(kept), b'ghi')
+		io_history.spill = False
+		self.assertEqual(list(io_history.rx), [b'ghi'])
+
+	def test_clear(self):
+		io_history = self._history(max_bytes=4, spill=True)
+		for data in (b'abc', b'def', b'ghi'):
+			io_history.append('tx', data)
+		io_history.clear()
+		self.assertEqual(len(io_history), 0)
+		self.assertEqual((io_history.memory_bytes, io_history.spilled_bytes), (0, 0))
+		record = io_history.append('tx', b'jkl')
+		self.assertEqual(io_history.get_data(record), b'jkl')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  tests/test_instrumentation.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import asyncio
+import tempfile
+import unittest
+
+import hyperlink
+
+from protocon import instrumentation
+from protocon.plugins import driver_null
+
+class SessionStatisticsTests(unittest.TestCase):
+	def setUp(self):
+		self.file_h = tempfile.TemporaryFile()
+		self.addCleanup(self.file_h.close)
+		self.file_h.write(b'A' * 100)
+		self.file_h.flush()
+
+	def _assert_sent_once(self, statistics):
+		driver = statistics.to_dict()['driver']
+		self.assertNotIn('send', driver)
+		self.assertEqual(driver['send_batch']['count'], 1)
+		self.assertEqual(driver['send_batch']['bytes'], 4)
+		self.assertEqual(driver['send_file']['count'], 1)
+		self.assertEqual(driver['send_file']['bytes'], 90)
+
+	def test_nested_send_operations(self):
+		connection = driver_null.ConnectionDriver(hyperlink.URL.from_text('null://'))
+		connection.send_file_chunk_size = 16
+		statistics = instrumentation.SessionStatistics()
+		statistics.instrument_connection(connection)
+		connection.send_batch([b'ab', b'cd'])
+		connection.send_file(self.file_h, 10)
+		self._assert_sent_once(statistics)
+
+	def test_nested_async_send_operations(self):
+		connection = driver_null.AsyncConnectionDriver(hyperlink.URL.from_text('null://'))
+		connection.send_file_chunk_size = 16
+		statistics = instrumentation.SessionStatistics()
+		statistics.instrument_connection(connection)
+		async def send():
+			await connection.send_batch([b'ab', b'cd'])
+			await connection.send_file(self.file_h, 10)
+		asyncio.run(send())
+		self._assert_sent_once(statistics)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  tests/test_load.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import asyncio
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+import hyperlink
+
+from protocon import load
+from protocon.plugins import driver_null
+
+class _ResetConnectionDriver(driver_null.AsyncConnectionDriver):
+	async def send(self, data):
+		raise ConnectionResetError('connection reset by peer')
+
+class _TimeoutConnectionDriver(driver_null.AsyncConnectionDriver):
+	async def recv_size(self, size, timeout=None):
+		self.recv_timed_out = True
+		return b'\x00'
+
+class _BrokenConnectionDriver(driver_null.AsyncConnectionDriver):
+	async def send(self, data):
+		raise RuntimeError('unexpected')
+
+class LoadTests(unittest.TestCase):
+	def _script(self, content):
+		file_h = tempfile.NamedTemporaryFile('w', suffix='.pro', delete=False)
+		self.addCleanup(os.unlink, file_h.name)
+		with file_h:
+			file_h.write(content)
+		return file_h.name
+
+	def test_error_ends_iteration(self):
+		path = self._script('send "ab"\nrecv_size 2\nsend "cd"\n')
+		statistics = load.LoadStatistics()
+		with open(os.devnull, 'w') as devnull:
+			engine = load.LoadEngine(_ResetConnectionDriver(hyperlink.URL.from_text('null://')), statistics, stdout=devnull)
+			with self.assertRaises(ConnectionResetError):
+				asyncio.run(engine.iterate((path,)))
+		self.assertEqual(statistics.rx_bytes, 0)
+
+	def test_exchange_labels(self):
+		path = self._script('send "ab"\nrecv_size 2\nsend "cde"\nrecv_size 3\n')
+		statistics = asyncio.run(load.run_load('null://', (path,), 1, iterations=2))
+		self.assertEqual(statistics.iterations, 2)
+		self.assertEqual(list(statistics.exchanges), ['#2 recv_size 2', '#4 recv_size 3'])
+		self.assertEqual([latencies.count for latencies in statistics.exchanges.values()], [2, 2])
+		self.assertEqual(statistics.tx_bytes, 10)
+		self.assertEqual(statistics.rx_bytes, 10)
+
+	def test_timeouts_are_not_latencies(self):
+		path = self._script('send "ab"\nrecv_size 2 -t 1\n')
+		statistics = load.LoadStatistics()
+		with open(os.devnull, 'w') as devnull:
+			engine = load.LoadEngine(_TimeoutConnectionDriver(hyperlink.URL.from_text('null://')), statistics, stdout=devnull)
+			asyncio.run(engine.iterate((path,)))
+		self.assertEqual(statistics.timeouts, 1)
+		self.assertEqual(statistics.requests, 0)
+
+	def test_unexpected_error_is_counted(self):
+		path = self._script('send "ab"\n')
+		url = hyperlink.URL.from_text('null://')
+		with unittest.mock.patch.object(load.LoadEngine, 'from_url', lambda url, **kwargs: load.LoadEngine(_BrokenConnectionDriver(url), **kwargs)):
+			statistics = asyncio.run(load.run_load(url, (path,), 2, iterations=4))
+		self.assertEqual(statistics.iterations, 0)
+		self.assertEqual(statistics.errors, {'RuntimeError: unexpected': 4})
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  tests/test_matcher.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import random
+import unittest
+
+import hyperlink
+
+from protocon import connection_driver
+from protocon import matcher
+
+def _search_chunks(terminators, chunks):
+	# feed the chunks to a matcher one at a time like the receive engine
+	terminator_matcher = matcher.TerminatorMatcher(terminators)
+	data = bytearray()
+	for chunk in chunks:
+		data += chunk
+		end = terminator_matcher.search(data)
+		if end is not None:
+			return end, terminator_matcher.terminator
+	return None, None
+
+def _expected(terminators, data):
+	# the end of the first terminator, preferring the longest one that ends there
+	matches = [(data.find(terminator) + len(terminator), -len(terminator), terminator) for terminator in terminators if terminator in data]
+	if not matches:
+		return None, None
+	end, _, terminator = min(matches)
+	return end, terminator
+
+class _ChunkedConnectionDriver(connection_driver.ConnectionDriver):
+	# receives the chunks one at a time through the shared receive engine
+	def __init__(self, url, chunks):
+		super(_ChunkedConnectionDriver, self).__init__(url)
+		self.chunks = list(chunks)
+		self.connected = True
+
+	def _recv_ready(self, timeout):
+		return bool(self.chunks)
+
+	def _recv_into(self, buffer):
+		chunk = self.chunks.pop(0)
+		buffer[:len(chunk)] = chunk
+		return buffer[:len(chunk)]
+
+class TerminatorMatcherTests(unittest.TestCase):
+	def test_single_split(self):
+		self.assertEqual(_search_chunks(b'\r\n', [b'abc\r', b'\ndef']), (5, b'\r\n'))
+		self.assertEqual(_search_chunks(b'END', [b'xxE', b'N', b'Dyy']), (5, b'END'))
+		self.assertEqual(_search_chunks(b'END', [b'xxE', b'NxD']), (None, None))
+
+	def test_multiple_split(self):
+		terminators = (b'\r\n\r\n', b'\n\n')
+		self.assertEqual(_search_chunks(terminators, [b'GET / HTTP/1.1\r\n', b'Host: x\r', b'\n', b'\r', b'\nbody']), (27, b'\r\n\r\n'))
+		self.assertEqual(_search_chunks(terminators, [b'a\n', b'\nb']), (3, b'\n\n'))
+
+	def test_overlapping(self):
+		# the terminator which ends first wins, even if another started first
+		self.assertEqual(_search_chunks((b'abcd', b'bc'), [b'ab', b'cd']), (3, b'bc'))
+		# when several end at the same position, the longest one wins
+		self.assertEqual(_search_chunks((b'b', b'ab'), [b'a', b'b']), (2, b'ab'))
+		# a partial match that fails must not hide one that starts inside it
+		self.assertEqual(_search_chunks((b'aab', b'xyz'), [b'aa', b'ab']), (4, b'aab'))
+		self.assertEqual(_search_chunks(b'aab', [b'aa', b'ab']), (4, b'aab'))
+
+	def test_random_chunks(self):
+		rng = random.Random(1)
+		for _ in range(300):
+			terminators = tuple(set(bytes(rng.choice(b'abc') for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 4))))
+			data = bytes(rng.choice(b'abcd') for _ in range(rng.randint(0, 40)))
+			chunks = []
+			position = 0
+			while position < len(data):
+				size = rng.randint(1, 5)
+				chunks.append(data[position:position + size])
+				position += size
+			self.assertEqual(_search_chunks(terminators, chunks), _expected(terminators, data), (terminators, chunks))
+
+	def test_empty_terminator(self):
+		with self.assertRaises(ValueError):
+			matcher.TerminatorMatcher((b'ab', b''))
+
+	def test_recv_until(self):
+		url = hyperlink.URL.from_text('null://')
+		connection = _ChunkedConnectionDriver(url, [b'one\r', b'\ntwo\n', b'\nthree'])
+		self.assertEqual(connection.recv_until((b'\r\n', b'\n\n')), b'one\r\n')
+		self.assertEqual(connection.last_terminator, b'\r\n')
+		self.assertEqual(connection.recv_until((b'\r\n', b'\n\n')), b'two\n\n')
+		self.assertEqual(connection.last_terminator, b'\n\n')
+		# the data after the terminator is kept for the next receive
+		self.assertEqual(connection.recv_timeout(0), b'three')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  tests/test_pool.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import asyncio
+import io
+import socket
+import time
+import unittest
+
+import hyperlink
+
+from protocon import headless
+from protocon import pool
+from protocon.plugins import driver_tcp
+
+def _wait_for(predicate, timeout=5.0):
+	deadline = time.monotonic() + timeout
+	while not predicate():
+		if time.monotonic() > deadline:
+			raise AssertionError('timed out waiting for the condition')
+		time.sleep(0.01)
+
+class _PoolTestCase(unittest.TestCase):
+	def setUp(self):
+		self.listener = socket.socket()
+		self.listener.bind(('127.0.0.1', 0))
+		self.listener.listen(8)
+		self.addCleanup(self.listener.close)
+		self.url = hyperlink.URL.from_text("tcp://127.0.0.1:{0}".format(self.listener.getsockname()[1]))
+
+	def _accept(self):
+		peer, _ = self.listener.accept()
+		self.addCleanup(peer.close)
+		return peer
+
+class ConnectionPoolTests(_PoolTestCase):
+	def setUp(self):
+		super(ConnectionPoolTests, self).setUp()
+		self.pool = pool.ConnectionPool(lambda: driver_tcp.ConnectionDriver(self.url), 1)
+		self.addCleanup(self.pool.close)
+		_wait_for(lambda: len(self.pool) == 1)
+
+	def test_warm_connection(self):
+		self._accept()
+		connection = self.pool.get()
+		self.addCleanup(connection.close)
+		self.assertEqual(self.pool.hits, 1)
+		self.assertFalse(connection.is_stale())
+
+	def test_closed_by_peer(self):
+		self._accept().close()
+		_wait_for(lambda: self.pool._idle[0].is_stale())
+		connection = self.pool.get()
+		self.addCleanup(connection.close)
+		self.assertEqual((self.pool.hits, self.pool.misses), (0, 1))
+
+	def test_unexpected_data(self):
+		self._accept().sendall(b'hello')
+		_wait_for(lambda: self.pool._idle[0].is_stale())
+		connection = self.pool.get()
+		self.addCleanup(connection.close)
+		self.assertEqual((self.pool.hits, self.pool.misses), (0, 1))
+
+class AsyncConnectionPoolTests(_PoolTestCase):
+	def test_closed_by_peer(self):
+		async def run():
+			connection_pool = pool.AsyncConnectionPool(lambda: driver_tcp.AsyncConnectionDriver(self.url), 1)
+			# the first connection is opened directly while the pool starts
+			first = await connection_pool.get()
+			while not len(connection_pool):
+				await asyncio.sleep(0.01)
+			# close the remote end of both connections
+			self._accept().close()
+			self._accept().close()
+			while not connection_pool._idle[0].is_stale():
+				await asyncio.sleep(0.01)
+			connection = await connection_pool.get()
+			await connection_pool.close()
+			await connection.close()
+			await first.close()
+			return connection_pool
+		connection_pool = asyncio.run(run())
+		self.assertEqual((connection_pool.hits, connection_pool.misses), (0, 2))
+
+class ReconnectTests(_PoolTestCase):
+	def test_refused_reconnect(self):
+		stdout = io.StringIO()
+		connection = driver_tcp.ConnectionDriver(self.url)
+		engine = headless.HeadlessEngine(connection, colors=False, stdout=stdout)
+		self.listener.close()
+		self.assertFalse(engine.onecmd('reconnect'))
+		self.assertIn('Failed to open the connection', stdout.getvalue())
+		self.assertIsInstance(engine.last_error, ConnectionRefusedError)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  tests/test_replay.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import io
+import struct
+import unittest
+
+from protocon import capture
+from protocon import errors
+from protocon import replay
+
+def _pcap(frames, link_type=capture.LINKTYPE_ETHERNET):
+	# build a little-endian pcap file with microsecond timestamps
+	data = struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 0xffff, link_type)
+	for index, frame in enumerate(frames):
+		data += struct.pack('<IIII', 1000 + index, 500, len(frame), len(frame)) + frame
+	return data
+
+class IterStepsTests(unittest.TestCase):
+	def setUp(self):
+		self.framer = capture.TCPFramer(('192.0.2.1', 40000), ('192.0.2.2', 80))
+
+	def _packets(self, *chunks):
+		# get one packet for each chunk of data in the order they were sent
+		packets = []
+		for timestamp, (direction, data) in enumerate(chunks):
+			for frame in self.framer.frames(direction, data):
+				packets.append(replay.Packet(timestamp, capture.LINKTYPE_ETHERNET, frame, direction))
+		return packets
+
+	def _steps(self, packets):
+		return [(step.direction, step.data) for step in replay.iter_steps(packets)]
+
+	def test_in_order(self):
+		packets = self._packets(('tx', b'abc'), ('tx', b'def'), ('rx', b'ghi'))
+		self.assertEqual(self._steps(packets), [('tx', b'abc'), ('tx', b'def'), ('rx', b'ghi')])
+
+	def test_out_of_order(self):
+		packets = self._packets(('tx', b'abc'), ('tx', b'def'), ('tx', b'ghi'), ('rx', b'jkl'))
+		packets[1], packets[2] = packets[2], packets[1]
+		self.assertEqual(self._steps(packets), [('tx', b'abc'), ('tx', b'def'), ('tx', b'ghi'), ('rx', b'jkl')])
+
+	def test_retransmission(self):
+		packets = self._packets(('tx', b'abc'), ('tx', b'def'))
+		packets.insert(2, packets[1])
+		packets.insert(3, packets[0])
+		self.assertEqual(self._steps(packets), [('tx', b'abc'), ('tx', b'def')])
+
+	def test_missing_segment(self):
+		packets = self._packets(('tx', b'abc'), ('tx', b'def'), ('tx', b'ghi'))
+		del packets[1]
+		# the data after the gap is kept
+		self.assertEqual(self._steps(packets), [('tx', b'abc'), ('tx', b'ghi')])
+
+	def test_too_many_pending_segments(self):
+		chunks = [('tx', bytes([index])) for index in range(replay._MAX_PENDING_SEGMENTS + 3)]
+		chunks.append(('rx', b'end'))
+		packets = self._packets(*chunks)
+		del packets[1]
+		steps = self._steps(packets)
+		self.assertEqual([data for _, data in steps[:-1]], [data for _, data in chunks[:1] + chunks[2:-1]])
+		# the gap is skipped before the response is reached
+		self.assertEqual(steps[-1], ('rx', b'end'))
+
+class ReadPacketsTests(unittest.TestCase):
+	def setUp(self):
+		self.framer = capture.TCPFramer(('192.0.2.1', 40000), ('192.0.2.2', 80))
+
+	def test_pcap(self):
+		frames = self.framer.frames('tx', b'request') + self.framer.frames('rx', b'response')
+		packets = list(replay.read_packets(io.BytesIO(_pcap(frames))))
+		self.assertEqual([packet.data for packet in packets], frames)
+		self.assertAlmostEqual(packets[1].timestamp, 1001.0005)
+		self.assertTrue(all(packet.direction is None for packet in packets))
+		# without directions, the side that sent the first payload is the client
+		steps = list(replay.iter_steps(packets))
+		self.assertEqual([(step.direction, step.data) for step in steps], [('tx', b'request'), ('rx', b'response')])
+
+	def test_server_first(self):
+		# the client is found from the SYN even when the server sends first
+		syn = self.framer._ip_packet(*self.framer._endpoints['tx'][:3], struct.pack('!HHIIBBHHH', 40000, 80, 0xffffffff, 0, 5 << 4, 0x02, 0xffff, 0, 0))
+		frames = [syn] + self.framer.frames('rx', b'banner') + self.framer.frames('tx', b'hello')
+		steps = list(replay.iter_steps(replay.read_packets(io.BytesIO(_pcap(frames)))))
+		self.assertEqual([(step.direction, step.data) for step in steps], [('rx', b'banner'), ('tx', b'hello')])
+
+	def test_invalid(self):
+		with self.assertRaises(errors.ProtoconDataError):
+			replay.read_packets(io.BytesIO(b'not a capture'))
+		data = _pcap(self.framer.frames('tx', b'request'))
+		with self.assertRaises(errors.ProtoconDataError):
+			list(replay.read_packets(io.BytesIO(data[:-4])))
+
+if __name__ == '__main__':
+	unittest.main()
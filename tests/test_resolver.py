@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  tests/test_resolver.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import io
+import socket
+import unittest
+import unittest.mock
+
+from protocon import resolver
+
+class ResolverTests(unittest.TestCase):
+	def test_unexpected_error_clears_pending(self):
+		caching_resolver = resolver.Resolver()
+		with unittest.mock.patch('socket.getaddrinfo', side_effect=UnicodeError('label too long')):
+			with self.assertRaises(UnicodeError):
+				caching_resolver.lookup('example.invalid')
+		self.assertEqual(caching_resolver._pending, {})
+		results = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('192.0.2.1', 0))]
+		with unittest.mock.patch('socket.getaddrinfo', return_value=results):
+			self.assertEqual(caching_resolver.lookup('example.invalid'), ((socket.AF_INET, ('192.0.2.1',)),))
+
+class ParseHostsTests(unittest.TestCase):
+	def test_parse_hosts(self):
+		hosts = resolver.parse_hosts(io.StringIO(
+			'# comment line\n'
+			'\n'
+			'127.0.0.1\tlocalhost Localhost.localdomain  # trailing comment\n'
+			'::1 localhost ip6-localhost\n'
+			'192.0.2.1 example.test\n'
+			'192.0.2.1 EXAMPLE.test\n'
+			'2001:db8:0:0::1 example.test\n'
+			'not-an-address bogus.test\n'
+			'192.0.2.9\n'
+			'#192.0.2.10 commented.test\n'
+		))
+		self.assertEqual(list(hosts), ['localhost', 'localhost.localdomain', 'ip6-localhost', 'example.test'])
+		self.assertEqual(hosts['localhost'], ((socket.AF_INET, ('127.0.0.1',)), (socket.AF_INET6, ('::1', 0, 0))))
+		# duplicate entries are merged and IPv6 addresses are normalized
+		self.assertEqual(hosts['example.test'], ((socket.AF_INET, ('192.0.2.1',)), (socket.AF_INET6, ('2001:db8::1', 0, 0))))
+
+	def test_hosts_take_precedence(self):
+		hosts = resolver.parse_hosts(io.StringIO('192.0.2.1 Example.test\n'))
+		caching_resolver = resolver.Resolver(hosts=hosts)
+		with unittest.mock.patch('socket.getaddrinfo', side_effect=AssertionError('the system resolver was used')):
+			self.assertEqual(caching_resolver.lookup('EXAMPLE.TEST'), ((socket.AF_INET, ('192.0.2.1',)),))
+		self.assertEqual(caching_resolver.hits, 1)
+
+if __name__ == '__main__':
+	unittest.main()
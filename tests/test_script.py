@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  tests/test_script.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import io
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+import hyperlink
+
+from protocon import headless
+from protocon import script
+from protocon.plugins import driver_null
+
+class CompileTests(unittest.TestCase):
+	def test_undecodable_line(self):
+		operations = script.compile_lines(['set encoding base64', 'send "a"', 'send "YWJj"'])
+		self.assertIsNone(operations[1].arguments)
+		self.assertEqual(operations[2].arguments['data'], b'abc')
+
+	def test_undecodable_script_line(self):
+		file_h = tempfile.NamedTemporaryFile('w', suffix='.pro', delete=False)
+		self.addCleanup(os.unlink, file_h.name)
+		with file_h:
+			file_h.write('set encoding base64\nsend "a"\nsend "YWJj"\n')
+		stdout = io.StringIO()
+		connection = driver_null.ConnectionDriver(hyperlink.URL.from_text('null://'))
+		engine = headless.HeadlessEngine(connection, colors=False, stdout=stdout)
+		self.assertFalse(engine.run_script(file_h.name))
+		# the error is reported when the line is executed and the script continues
+		self.assertIn('Invalid base64-encoded string', stdout.getvalue())
+		self.assertEqual([bytes(data) for data in engine.io_history.tx], [b'abc'])
+
+class CacheTests(unittest.TestCase):
+	def setUp(self):
+		cache_directory = tempfile.TemporaryDirectory()
+		self.addCleanup(cache_directory.cleanup)
+		self.cache_directory = cache_directory.name
+		environ = unittest.mock.patch.dict(os.environ, {'PROTOCON_CACHE_DIR': self.cache_directory})
+		environ.start()
+		self.addCleanup(environ.stop)
+		self.addCleanup(script._memory_cache.clear)
+		script._memory_cache.clear()
+		self.path = os.path.join(self.cache_directory, 'test.pro')
+		self._write('send "abc"\n')
+
+	def _write(self, content, mtime_ns=None):
+		with open(self.path, 'w') as file_h:
+			file_h.write(content)
+		if mtime_ns is not None:
+			os.utime(self.path, ns=(mtime_ns, mtime_ns))
+
+	def _load_from_cache(self):
+		# load the script, failing if it has to be compiled
+		with unittest.mock.patch.object(script, 'compile_lines', side_effect=AssertionError('the script was compiled')):
+			return script.load(self.path)
+
+	def test_memory_cache(self):
+		operations = script.load(self.path)
+		self.assertIs(self._load_from_cache(), operations)
+
+	def test_disk_cache(self):
+		operations = script.load(self.path)
+		self.assertEqual(len([name for name in os.listdir(self.cache_directory) if name.endswith('.bin')]), 1)
+		script._memory_cache.clear()
+		self.assertEqual(self._load_from_cache(), operations)
+
+	def test_size_changed(self):
+		self._write('send "abc"\n', mtime_ns=1000000000)
+		script.load(self.path)
+		self._write('send "abcd"\n', mtime_ns=1000000000)
+		self.assertEqual(script.load(self.path)[0].arguments['data'], b'abcd')
+
+	def test_mtime_changed(self):
+		self._write('send "abc"\n', mtime_ns=1000000000)
+		script.load(self.path)
+		self._write('send "xyz"\n', mtime_ns=2000000000)
+		self.assertEqual(script.load(self.path)[0].arguments['data'], b'xyz')
+		script._memory_cache.clear()
+		self.assertEqual(self._load_from_cache()[0].arguments['data'], b'xyz')
+
+	def test_version_changed(self):
+		script.load(self.path)
+		script._memory_cache.clear()
+		with unittest.mock.patch.object(script, '__version__', '0.0.0-test'):
+			with self.assertRaises(AssertionError):
+				self._load_from_cache()
+
+	def test_encoding(self):
+		# the same script is compiled separately for each initial encoding
+		self._write('send "YWJj"\n')
+		self.assertEqual(script.load(self.path)[0].arguments['data'], b'YWJj')
+		self.assertEqual(script.load(self.path, encoding='base64')[0].arguments['data'], b'abc')
+
+	def test_corrupt_cache(self):
+		operations = script.load(self.path)
+		script._memory_cache.clear()
+		for name in os.listdir(self.cache_directory):
+			if name.endswith('.bin'):
+				with open(os.path.join(self.cache_directory, name), 'wb') as file_h:
+					file_h.write(b'corrupt')
+		self.assertEqual(script.load(self.path), operations)
+
+	def test_disabled(self):
+		with unittest.mock.patch.dict(os.environ, {'PROTOCON_CACHE_DIR': ''}):
+			script.load(self.path)
+		self.assertEqual(os.listdir(self.cache_directory), ['test.pro'])
+
+if __name__ == '__main__':
+	unittest.main()
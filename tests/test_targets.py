@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  tests/test_targets.py
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following disclaimer
+#    in the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of the project nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+from protocon import plugin_manager
+from protocon import targets
+
+class TargetsTests(unittest.TestCase):
+	def _script(self, content):
+		file_h = tempfile.NamedTemporaryFile('w', suffix='.pro', delete=False)
+		self.addCleanup(os.unlink, file_h.name)
+		with file_h:
+			file_h.write(content)
+		return file_h.name
+
+	def test_byte_totals_exceed_history(self):
+		path = self._script('set history_max_bytes 8\nsend "abcdef"\nsend "ghijkl"\nrecv_size 10\n')
+		with open(os.devnull, 'w') as devnull:
+			engine_kwargs = {'quiet': True, 'colors': False, 'stdout': devnull}
+			result = asyncio.run(targets.run_target('null://', (path,), plugin_manager.PluginManager(), engine_kwargs=engine_kwargs))
+		result = result.to_dict()
+		self.assertEqual(result['status'], 'ok')
+		# the sent data has been evicted from the history
+		self.assertEqual(result['tx'], [])
+		self.assertEqual(result['tx_bytes'], 12)
+		self.assertEqual(result['rx_bytes'], 10)
+
+if __name__ == '__main__':
+	unittest.main()